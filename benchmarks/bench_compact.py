@@ -0,0 +1,66 @@
+"""
+Benchmarks for fetching rows in the standard and compact schema profiles.
+
+The table has the shape of the most fetched header columns: sky coordinates
+and measured values, and the instrument, filter and disperser names.  In the
+standard profile those are `Numeric` and `Text`, in the compact profile they
+are floats and :class:`~gemini_obs_db.orm.compact.CodedText` codes.
+"""
+import os
+import tempfile
+
+from sqlalchemy import Column, Float, Integer, MetaData, Numeric, Table, Text, create_engine, select
+
+from gemini_obs_db.orm.compact import TEXT_CODES, CodedText, TextCode
+
+
+FILTERS = ['r_G0303', 'g_G0301', 'i_G0302', 'z_G0304', 'Ha_G0310', 'open', 'J', 'H', 'K', 'Kshort']
+DISPERSERS = ['MIRROR', 'B600_G5307', 'R400_G5305', 'R831_G5302', '32_mm', '111_mm']
+INSTRUMENTS = ['GMOS-N', 'GMOS-S', 'NIRI', 'F2', 'GNIRS', 'NIFS', 'GSAOI']
+
+
+def _table(metadata, compact):
+    coordinate = Float(precision=53, asdecimal=False) if compact else Numeric(precision=16, scale=12)
+    measurement = Float(precision=53, asdecimal=False) if compact else Numeric(precision=8, scale=4)
+    return Table('header', metadata, Column('id', Integer, primary_key=True),
+                 Column('instrument', CodedText('instrument') if compact else Text),
+                 Column('filter_name', CodedText('filter_name') if compact else Text),
+                 Column('disperser', CodedText('disperser') if compact else Text),
+                 Column('ra', coordinate), Column('dec', coordinate), Column('azimuth', coordinate),
+                 Column('elevation', coordinate), Column('airmass', measurement),
+                 Column('exposure_time', measurement))
+
+
+class TimeFetch:
+    """
+    Time fetching a listing's worth of rows.
+    """
+    params = [['standard', 'compact'], [10000]]
+    param_names = ['profile', 'rows']
+
+    def setup(self, profile, rows):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine('sqlite:///' + os.path.join(self.directory.name, 'bench.db'))
+        TextCode.__table__.create(bind=self.engine)
+        TEXT_CODES.bind(self.engine)
+        self.table = _table(MetaData(), profile == 'compact')
+        self.table.create(bind=self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(self.table.insert(), [
+                dict(instrument=INSTRUMENTS[i % len(INSTRUMENTS)], filter_name=FILTERS[i % len(FILTERS)],
+                     disperser=DISPERSERS[i % len(DISPERSERS)], ra=(0.37 * i) % 360.0,
+                     dec=-60.0 + (0.11 * i) % 120.0, azimuth=(0.7 * i) % 360.0, elevation=30.0 + i % 60,
+                     airmass=1.0 + (i % 100) / 100.0, exposure_time=30.0) for i in range(rows)])
+
+    def teardown(self, profile, rows):
+        TEXT_CODES.bind(None)
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def time_fetch_all(self, profile, rows):
+        with self.engine.connect() as connection:
+            connection.execute(select([self.table])).fetchall()
+
+    def time_filter_instrument(self, profile, rows):
+        with self.engine.connect() as connection:
+            connection.execute(select([self.table]).where(self.table.c.instrument == 'NIRI')).fetchall()
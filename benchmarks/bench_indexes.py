@@ -0,0 +1,134 @@
+"""
+Benchmarks for the old and the curated header and diskfile indexes.
+
+Each benchmark runs against an in-memory SQLite database with the curated
+indexes, as created by `create_tables`, and against one taken back to the old
+single column indexes with :func:`~gemini_obs_db.utils.indexes.migrate_indexes`,
+so the two sets can be compared on insert throughput and on the latency of
+the usual searches.  The rows are made up, with a spread of instruments,
+observation types, programs and dates.
+"""
+import datetime
+
+from sqlalchemy import and_, create_engine, func, select
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.utils.gemini_metadata_utils import ut_datetime_secs_array
+from gemini_obs_db.utils.indexes import migrate_indexes
+
+
+INSTRUMENTS = ['GMOS-N', 'GMOS-S', 'NIRI', 'F2', 'GNIRS', 'NIFS', 'GSAOI', 'michelle']
+OBSERVATION_TYPES = [('OBJECT', 'science'), ('OBJECT', 'partnerCal'), ('FLAT', 'dayCal'), ('BIAS', 'dayCal'),
+                     ('ARC', 'progCal'), ('DARK', 'dayCal')]
+START = datetime.datetime(2019, 1, 1)
+
+
+def _rows(first: int, count: int) -> list:
+    rows = list()
+    for i in range(first, first + count):
+        observation_type, observation_class = OBSERVATION_TYPES[i % len(OBSERVATION_TYPES)]
+        program = 'GN-2019B-Q-%d' % (100 + i % 200)
+        rows.append(dict(
+            filename='N%08dS%04d.fits' % (i // 1000, i % 1000), instrument=INSTRUMENTS[i % len(INSTRUMENTS)],
+            ut_datetime=START + datetime.timedelta(seconds=300 * i), program_id=program,
+            observation_id='%s-%d' % (program, i % 7 + 1), data_label='%s-%d-%03d' % (program, i % 7 + 1, i % 300),
+            telescope='Gemini-North', observation_type=observation_type, observation_class=observation_class,
+            object='Target %d' % (i % 1000), ra=(0.37 * i) % 360.0, dec=-60.0 + (0.11 * i) % 120.0,
+            filter_name='r_G0303', disperser='MIRROR', camera='f/6', central_wavelength=0.6,
+            focal_plane_mask='Imaging', pupil_mask='None', spectroscopy=False, mode='imaging', qa_state='Pass',
+            reduction='RAW', engineering=False, science_verification=False, calibration_program=False))
+    for row, secs in zip(rows, ut_datetime_secs_array([r['ut_datetime'] for r in rows]).tolist()):
+        row['ut_datetime_secs'] = secs
+    return rows
+
+
+def _insert(connection, rows: list):
+    file_table = File.__table__
+    diskfile_table = DiskFile.__table__
+    header_table = Header.__table__
+    first = connection.execute(select([func.coalesce(func.max(file_table.c.id), 0)])).scalar() + 1
+    connection.execute(file_table.insert(), [dict(id=first + i, name=r['filename']) for i, r in enumerate(rows)])
+    connection.execute(diskfile_table.insert(), [
+        dict(id=first + i, file_id=first + i, filename=r['filename'], path='', present=i % 10 != 0,
+             canonical=i % 20 != 0, datafile_timestamp=r['ut_datetime']) for i, r in enumerate(rows)])
+    connection.execute(header_table.insert(), [
+        dict({k: v for k, v in r.items() if k != 'filename'}, diskfile_id=first + i) for i, r in enumerate(rows)])
+
+
+class _Database:
+    params = [['old', 'curated'], [20000]]
+    param_names = ['indexes', 'rows']
+
+    def setup(self, indexes, rows):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=self.engine)
+        if indexes == 'old':
+            migrate_indexes(self.engine, reverse=True)
+        self.connection = self.engine.connect()
+        with self.connection.begin():
+            _insert(self.connection, _rows(0, rows))
+        self.rows = rows
+
+    def teardown(self, indexes, rows):
+        self.connection.close()
+        self.engine.dispose()
+
+
+class TimeInsert(_Database):
+    """
+    Time inserting a batch of file, diskfile and header rows into a populated database.
+    """
+    def setup(self, indexes, rows):
+        super().setup(indexes, rows)
+        self.batch = _rows(rows, 1000)
+
+    def time_insert_batch(self, indexes, rows):
+        transaction = self.connection.begin()
+        _insert(self.connection, self.batch)
+        # Roll back, so each sample inserts into the same database
+        transaction.rollback()
+
+
+class TimeSearch(_Database):
+    """
+    Time the usual searches, on the present, canonical headers.
+    """
+    def setup(self, indexes, rows):
+        super().setup(indexes, rows)
+        header = Header.__table__
+        diskfile = DiskFile.__table__
+        self.start_secs = ut_datetime_secs_array([START + datetime.timedelta(days=10)]).tolist()[0]
+        self.end_secs = ut_datetime_secs_array([START + datetime.timedelta(days=13)]).tolist()[0]
+        self.joined = header.join(diskfile, header.c.diskfile_id == diskfile.c.id)
+        self.canonical = and_(diskfile.c.canonical == True, diskfile.c.present == True)
+
+    def _count(self, condition):
+        header = Header.__table__
+        return self.connection.execute(select([func.count(header.c.id)]).select_from(self.joined)
+                                       .where(and_(self.canonical, condition))).scalar()
+
+    def time_instrument_date_range(self, indexes, rows):
+        header = Header.__table__
+        self._count(and_(header.c.instrument == 'NIRI', header.c.ut_datetime_secs >= self.start_secs,
+                         header.c.ut_datetime_secs < self.end_secs))
+
+    def time_calibrations(self, indexes, rows):
+        header = Header.__table__
+        self._count(and_(header.c.observation_type == 'ARC', header.c.observation_class == 'progCal',
+                         header.c.instrument == 'GNIRS'))
+
+    def time_program_latest(self, indexes, rows):
+        header = Header.__table__
+        self.connection.execute(select([header.c.data_label]).select_from(self.joined)
+                                .where(and_(self.canonical, header.c.program_id == 'GN-2019B-Q-150'))
+                                .order_by(header.c.ut_datetime.desc()).limit(10)).fetchall()
+
+    def time_file_lookup(self, indexes, rows):
+        file_table = File.__table__
+        diskfile = DiskFile.__table__
+        self.connection.execute(select([diskfile.c.id]).select_from(
+            file_table.join(diskfile, diskfile.c.file_id == file_table.c.id))
+            .where(and_(self.canonical, file_table.c.name == 'N00000012S0345.fits'))).fetchall()
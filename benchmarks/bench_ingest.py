@@ -0,0 +1,180 @@
+"""
+Benchmarks for the ingest path, on synthetic files.
+
+These time the steps an ingest goes through for each file: checksumming it,
+building the :class:`~gemini_obs_db.orm.diskfile.DiskFile`, populating the
+:class:`~gemini_obs_db.orm.header.Header` and the instrument table from
+AstroData, working out the footprints, and writing the rows to the database.
+The files come from :mod:`benchmarks.synthetic`, and the database is an
+in-memory SQLite, so nothing needs a network or a database server.
+"""
+import datetime
+import os
+
+import astrodata
+import gemini_instruments  # noqa: F401, registers the Gemini instruments with astrodata
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db import db_config
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.orm.f2 import F2
+from gemini_obs_db.orm.gmos import Gmos
+from gemini_obs_db.orm.gnirs import Gnirs
+from gemini_obs_db.orm.michelle import Michelle
+from gemini_obs_db.orm.nifs import Nifs
+from gemini_obs_db.orm.niri import Niri
+from gemini_obs_db.utils.hashes import md5sum, md5sum_size_bz2
+
+from .synthetic import INSTRUMENTS, make_corpus
+
+
+INSTRUMENT_TABLES = {
+    'GMOS-N': Gmos,
+    'NIRI': Niri,
+    'F2': F2,
+    'GNIRS': Gnirs,
+    'NIFS': Nifs,
+    'michelle': Michelle,
+}
+
+INSTRUMENT_NAMES = list(INSTRUMENTS.keys())
+
+
+def _corpus_dir():
+    return os.path.join(os.getcwd(), 'synthetic')
+
+
+def _setup_storage(directory):
+    db_config.storage_root = directory
+    db_config.z_staging_area = os.path.join(directory, 'z_staging')
+    os.makedirs(db_config.z_staging_area, exist_ok=True)
+
+
+class _Corpus:
+    """
+    Write the corpus once per benchmark run, and share it between the benchmarks.
+    """
+    timeout = 300
+
+    def setup_cache(self):
+        return make_corpus(_corpus_dir())
+
+
+class TimeChecksums(_Corpus):
+    """
+    Time checksumming the files, uncompressed and compressed.
+    """
+    params = [INSTRUMENT_NAMES, [False, True]]
+    param_names = ['instrument', 'compressed']
+
+    def time_md5sum(self, corpus, instrument, compressed):
+        path = os.path.join(_corpus_dir(), corpus[(instrument, compressed)][0])
+        if compressed:
+            md5sum_size_bz2(path)
+        else:
+            md5sum(path)
+
+
+class TimeDiskFile(_Corpus):
+    """
+    Time building a DiskFile, which checksums the file and, when compressed, unpacks it.
+    """
+    params = [INSTRUMENT_NAMES, [False, True]]
+    param_names = ['instrument', 'compressed']
+
+    def setup(self, corpus, instrument, compressed):
+        _setup_storage(_corpus_dir())
+        self.filename = corpus[(instrument, compressed)][0]
+        self.file = File(self.filename)
+
+    def time_diskfile(self, corpus, instrument, compressed):
+        DiskFile(self.file, self.filename, '')
+
+
+class TimePopulate(_Corpus):
+    """
+    Time reading the metadata of an open file into the header and instrument tables.
+    """
+    params = [INSTRUMENT_NAMES]
+    param_names = ['instrument']
+
+    def setup(self, corpus, instrument):
+        _setup_storage(_corpus_dir())
+        filename = corpus[(instrument, False)][0]
+        self.ad = astrodata.open(os.path.join(_corpus_dir(), filename))
+        self.diskfile = DiskFile(File(filename), filename, '')
+        self.diskfile.ad_object = self.ad
+        self.header = Header(self.diskfile)
+
+    def time_header(self, corpus, instrument):
+        Header(self.diskfile)
+
+    def time_instrument(self, corpus, instrument):
+        INSTRUMENT_TABLES[instrument](self.header, self.ad)
+
+    def time_footprints(self, corpus, instrument):
+        self.header.footprints(self.ad)
+
+
+class TimeBulkInsert:
+    """
+    Time writing a night's worth of file, diskfile and header rows to SQLite.
+    """
+    params = [[100, 1000]]
+    param_names = ['rows']
+    # Each sample needs a fresh database
+    number = 1
+    warmup_time = 0
+
+    def setup(self, rows):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        start = datetime.datetime(2020, 1, 1, 5, 0, 0)
+        self.rows = list()
+        for i in range(rows):
+            ut = start + datetime.timedelta(seconds=60 * i)
+            self.rows.append(dict(
+                filename='N20200101S%04d.fits' % (i + 1), ut_datetime=ut,
+                program_id='GN-2019B-Q-%d' % (100 + i % 50), observation_id='GN-2019B-Q-%d-1' % (100 + i % 50),
+                data_label='GN-2019B-Q-%d-1-%03d' % (100 + i % 50, i % 100 + 1), instrument='GMOS-N',
+                telescope='Gemini-North', observation_type='OBJECT', observation_class='science',
+                ra=15.0 * i % 360.0, dec=-30.0 + i % 60, exposure_time=30.0, filter_name='r_G0303'))
+
+    def teardown(self, rows):
+        self.session.close()
+        self.engine.dispose()
+
+    def _file_rows(self):
+        file_table = File.__table__
+        diskfile_table = DiskFile.__table__
+        self.session.execute(file_table.insert(), [dict(name=r['filename']) for r in self.rows])
+        file_ids = dict(self.session.execute(file_table.select().with_only_columns(
+            [file_table.c.name, file_table.c.id])).fetchall())
+        now = datetime.datetime.now()
+        self.session.execute(diskfile_table.insert(), [
+            dict(file_id=file_ids[r['filename']], filename=r['filename'], path='', present=True, canonical=True,
+                 file_size=1000000, file_md5='0' * 32, data_md5='0' * 32, data_size=1000000, lastmod=now,
+                 entrytime=now, compressed=False, datafile_timestamp=r['ut_datetime']) for r in self.rows])
+        return dict(self.session.execute(diskfile_table.select().with_only_columns(
+            [diskfile_table.c.filename, diskfile_table.c.id])).fetchall())
+
+    def time_core_executemany(self, rows):
+        diskfile_ids = self._file_rows()
+        header_table = Header.__table__
+        self.session.execute(header_table.insert(), [
+            dict(diskfile_id=diskfile_ids[r['filename']],
+                 **{k: v for k, v in r.items() if k != 'filename'}) for r in self.rows])
+        self.session.commit()
+
+    def time_orm_bulk_insert_mappings(self, rows):
+        diskfile_ids = self._file_rows()
+        self.session.bulk_insert_mappings(Header, [
+            dict(diskfile_id=diskfile_ids[r['filename']],
+                 **{k: v for k, v in r.items() if k != 'filename'}) for r in self.rows])
+        self.session.commit()
@@ -0,0 +1,137 @@
+"""
+Benchmarks for the program ID, observation ID and datalabel parsers.
+
+The corpus mixes the program ID styles seen in the archive: old style science
+programs, the newer G- form, CAL/ENG programs in both their old dated form and
+their semester form, and some made up engineering IDs that do not parse.
+Parsing the corpus repeats IDs, as ingesting a night of data does.
+"""
+import numpy as np
+
+from gemini_obs_db.utils.gemini_metadata_utils import GeminiProgram, GeminiObservation, GeminiDataLabel, \
+    clear_parser_caches, parse_datalabels, parse_program_ids, ratodeg, dectodeg, ratodeg_array, dectodeg_array, \
+    gemini_date, get_date_offset, get_time_period
+
+
+PROGRAM_IDS = [
+    'GN-2019B-Q-123', 'GS-2019B-Q-204', 'GN-2020A-FT-107', 'GS-2020A-DD-103', 'GN-2020B-LP-8',
+    'GS-2021A-SV-102', 'GN-2021B-DS-201', 'GS-2022A-C-4', 'GN-2022A-ENG-51', 'GS-2022B-CAL-140',
+    'GN-2015A-Q-007', 'GS-2012B-QS-03', 'G-2024A-0123-Q', 'G-2024B-ENG-GMOSN-01', 'G-2025A-1042-F',
+    'GN-CAL20200123', 'GS-CAL20210704', 'GN-ENG20190915', 'GS-ENG20221231', 'GS-2023A-CAL-GMOSS-5',
+    'GN-2023B-ENG-SUBSYS-12', 'engineering', 'GN-2022A-ENG-51-152', 'GS-TEST-ALTAIR', 'G-2024A-CAL-1',
+]
+
+OBSERVATION_IDS = ['%s-%d' % (p, n) for p in PROGRAM_IDS for n in (1, 12, 103)]
+
+DATALABELS = ['%s-%03d' % (o, n) for o in OBSERVATION_IDS for n in (1, 2, 15)] + \
+             ['%s-%03d-BIAS' % (o, 1) for o in OBSERVATION_IDS]
+
+
+class TimeParsers:
+    """
+    Time parsing the corpus with a warm cache, as during a long running ingest.
+    """
+    repeat = 20
+
+    def setup(self):
+        for dl in DATALABELS:
+            GeminiDataLabel(dl)
+
+    def time_program_ids(self):
+        for _ in range(40):
+            for p in PROGRAM_IDS:
+                GeminiProgram(p)
+
+    def time_observation_ids(self):
+        for _ in range(10):
+            for o in OBSERVATION_IDS:
+                GeminiObservation(o)
+
+    def time_datalabels(self):
+        for _ in range(4):
+            for dl in DATALABELS:
+                GeminiDataLabel(dl)
+
+
+class TimeParsersCold:
+    """
+    Time parsing the corpus with empty caches, which measures the compiled patterns.
+    """
+    def setup(self):
+        clear_parser_caches()
+
+    def time_program_ids(self):
+        for p in PROGRAM_IDS:
+            GeminiProgram(p)
+
+    def time_datalabels(self):
+        for dl in DATALABELS:
+            GeminiDataLabel(dl)
+
+
+class TimeBatchParsers:
+    """
+    Time parsing a column of values at once, as an archive audit does.
+    """
+    params = [10000, 100000]
+    param_names = ['rows']
+
+    def setup(self, rows):
+        rng = np.random.RandomState(0)
+        self.datalabels = np.array(DATALABELS, dtype=object)[rng.randint(0, len(DATALABELS), rows)]
+        self.program_ids = np.array(PROGRAM_IDS, dtype=object)[rng.randint(0, len(PROGRAM_IDS), rows)]
+
+    def time_parse_program_ids(self, rows):
+        parse_program_ids(self.program_ids)
+
+    def time_parse_datalabels(self, rows):
+        parse_datalabels(self.datalabels)
+
+
+class TimeCoordinates:
+    """
+    Time converting sexagesimal RA and Dec strings to degrees.
+    """
+    def setup(self):
+        rng = np.random.RandomState(0)
+        n = 10000
+        self.ras = ['%02d:%02d:%06.3f' % v for v in zip(rng.randint(0, 24, n), rng.randint(0, 60, n),
+                                                         rng.uniform(0, 60, n).clip(0, 59.999))]
+        self.decs = ['%+03d:%02d:%05.2f' % v for v in zip(rng.randint(-89, 90, n), rng.randint(0, 60, n),
+                                                           rng.uniform(0, 60, n).clip(0, 59.99))]
+
+    def time_ratodeg(self):
+        for ra in self.ras:
+            ratodeg(ra)
+
+    def time_dectodeg(self):
+        for dec in self.decs:
+            dectodeg(dec)
+
+    def time_ratodeg_array(self):
+        ratodeg_array(self.ras)
+
+    def time_dectodeg_array(self):
+        dectodeg_array(self.decs)
+
+
+class TimeDates:
+    """
+    Time the date parsing done for every search URL.
+    """
+    def setup(self):
+        self.days = ['2019%02d%02d' % (m, d) for m in range(1, 13) for d in range(1, 29)]
+        self.times = ['2019-%02d-%02dT12:34:56' % (m, d) for m in range(1, 13) for d in range(1, 29)]
+
+    def time_gemini_date(self):
+        offset = get_date_offset()
+        for day in self.days:
+            gemini_date(day, offset=offset, as_datetime=True)
+
+    def time_get_time_period(self):
+        for start, end in zip(self.times, self.times[1:]):
+            get_time_period(start, end)
+
+    def time_today(self):
+        for _ in range(100):
+            gemini_date('today')
@@ -0,0 +1,41 @@
+"""
+Benchmarks for normalizing the enumerated header values.
+
+Each header goes through the instrument, observation type, observation class,
+reduction state and calibration type checks, and the instrument tables check
+their own enumerated values on top.  The corpus mimics the values AstroData
+returns, including ones that are not in the vocabularies.
+"""
+from gemini_obs_db.orm import michelle
+from gemini_obs_db.utils.gemini_metadata_utils import gemini_instrument, gemini_observation_type, \
+    gemini_observation_class, gemini_reduction_state, gemini_caltype
+
+
+HEADERS = [
+    ('GMOS-N', 'OBJECT', 'science', 'RAW', 'specphot', 'I79B10'),
+    ('gmos-s', 'BIAS', 'dayCal', 'RAW', 'bias', 'No Value'),
+    ('NIRI', 'FLAT', 'partnerCal', 'PREPARED', 'lampoff_flat', 'Clear'),
+    ('michelle', 'OBJECT', 'acq', 'RAW', None, 'F116B9'),
+    ('GNIRS', 'ARC', 'progCal', 'PROCESSED_ARC', 'processed_arc', 'QBlock'),
+    ('Hokupaa+QUIRC', 'DARK', 'dayCal', 'RAW', 'dark', 'blank'),
+    ('F2', 'OBJECT', 'science', 'PROCESSED_SCIENCE', None, 'unknown filter'),
+    ('unknown', 'junk', None, 'RAW', 'not a caltype', None),
+] * 125
+
+
+class TimeNormalization:
+    """
+    Time normalizing the enumerated values of a thousand headers.
+    """
+    def time_header_values(self):
+        for instrument, obstype, obsclass, state, caltype, filter_name in HEADERS:
+            gemini_instrument(instrument, gmos=True)
+            gemini_observation_type(obstype)
+            gemini_observation_class(obsclass)
+            gemini_reduction_state(state)
+            gemini_caltype(caltype)
+            filter_name in michelle.FILTERS
+
+    def time_codes(self):
+        for instrument, obstype, obsclass, state, caltype, filter_name in HEADERS:
+            michelle.FILTERS.code(filter_name)
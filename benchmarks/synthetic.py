@@ -0,0 +1,197 @@
+"""
+Generator of synthetic Gemini-like FITS files for the benchmarks.
+
+The files have the layout and the main header keywords of raw data from
+each instrument: a primary header with no data, one or more image extensions
+with a TAN WCS, and for the instruments whose footprint comes from the
+primary header, a WCS there too.  The pixel values are noise, so the files
+compress about as well as real data.  Everything is generated locally from a
+fixed seed, so the benchmarks need no network access and time the same bytes
+on every run.
+"""
+import bz2
+import datetime
+import os
+import shutil
+
+import numpy as np
+from astropy.io import fits
+
+
+__all__ = ["INSTRUMENTS", "make_fits", "make_corpus"]
+
+
+# Instrument layouts: primary header keywords, number and shape of the
+# extensions in NumPy order, and whether the primary header carries the WCS
+INSTRUMENTS = {
+    'GMOS-N': dict(
+        prefix='N', telescope='Gemini-North', extensions=12, shape=(2112, 288), phu_wcs=False,
+        keywords=dict(FILTER1='r_G0303', FILTER2='open2-8', GRATING='MIRROR', MASKNAME='None',
+                      MASKTYP=0, DETECTOR='GMOS + Hamamatsu_new', DETTYPE='S10892-N',
+                      GAINSET='low', AMPINTEG=5000)),
+    'NIRI': dict(
+        prefix='N', telescope='Gemini-North', extensions=1, shape=(1024, 1024), phu_wcs=False,
+        keywords=dict(FILTER1='H_G0203', FILTER2='pupil38', FILTER3='f6-cam', BEAMSPLT='f6',
+                      CAMERA='f6', FPMASK='f6-cam_G5208', LNRS=1, NDAVGS=16, A_VDDUC=-2.4, A_VDET=-0.2,
+                      COADDS=1)),
+    'F2': dict(
+        prefix='S', telescope='Gemini-South', extensions=1, shape=(1, 2048, 2048), phu_wcs=False,
+        keywords=dict(FILTER='J_G0802', GRISM='Open', MOSPOS='Open', LYOT='f/16_G5830', LNRS=8,
+                      READMODE='Faint', COADDS=1)),
+    'GNIRS': dict(
+        prefix='N', telescope='Gemini-North', extensions=1, shape=(1022, 1024), phu_wcs=True,
+        keywords=dict(FILTER1='Open', FILTER2='XD_G0518', GRATING='32/mm_G5533', PRISM='SXD_G5536',
+                      SLIT='0.30arcsec', DECKER='SCXD_G5531', CAMERA='ShortBlue_G5540',
+                      LNRS=32, NDAVGS=16, BIASVOLT=0.3, COADDS=1)),
+    'NIFS': dict(
+        prefix='N', telescope='Gemini-North', extensions=1, shape=(2048, 2048), phu_wcs=True,
+        keywords=dict(FILTER='HK_G0603', GRATING='K_G5605', APERTURE='Blocked', LNRS=16, COADDS=1)),
+    'michelle': dict(
+        prefix='N', telescope='Gemini-North', extensions=1, shape=(1, 240, 320), phu_wcs=True,
+        keywords=dict(FILTER='I79B10', GRATING='Echelle', SLIT='2_pixels', MODE='stare')),
+}
+
+
+def _wcs(hdr: fits.Header, ra: float, dec: float, shape: tuple, rotation: float = 0.0,
+         scale: float = 0.08 / 3600.0):
+    """
+    Add a plain TAN WCS centred on (ra, dec) to a header.
+    """
+    theta = np.radians(rotation)
+    hdr['CTYPE1'] = 'RA---TAN'
+    hdr['CTYPE2'] = 'DEC--TAN'
+    hdr['CRVAL1'] = ra
+    hdr['CRVAL2'] = dec
+    hdr['CRPIX1'] = shape[-1] / 2.0
+    hdr['CRPIX2'] = shape[-2] / 2.0
+    hdr['CD1_1'] = -scale * np.cos(theta)
+    hdr['CD1_2'] = scale * np.sin(theta)
+    hdr['CD2_1'] = scale * np.sin(theta)
+    hdr['CD2_2'] = scale * np.cos(theta)
+
+
+def make_fits(directory: str, instrument: str, index: int = 1, compressed: bool = False,
+              date: datetime.date = datetime.date(2020, 1, 1), seed: int = 0) -> str:
+    """
+    Write a synthetic raw data file for an instrument.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to write the file to
+    instrument : str
+        Instrument to mimic, one of the keys of :data:`INSTRUMENTS`
+    index : int
+        Number of the file within the night, used in the filename, datalabel and coordinates
+    compressed : bool
+        If True, write a bzip2 compressed `.fits.bz2` file
+    date : :class:`datetime.date`
+        UT date of the observation, used in the filename and headers
+    seed : int
+        Seed for the pixel noise
+
+    Returns
+    -------
+    str
+        Name of the file written, without the directory
+    """
+    layout = INSTRUMENTS[instrument]
+    filename = '%s%sS%04d.fits' % (layout['prefix'], date.strftime('%Y%m%d'), index)
+    semester = '%d%s' % (date.year if date.month > 1 else date.year - 1, 'A' if 2 <= date.month <= 7 else 'B')
+    site = 'GN' if layout['prefix'] == 'N' else 'GS'
+    obsid = '%s-%s-Q-%d-%d' % (site, semester, 100 + index % 50, 1 + index % 7)
+    ra = (15.0 * index) % 360.0
+    dec = -30.0 + (index % 60)
+
+    phu = fits.PrimaryHDU()
+    hdr = phu.header
+    hdr['INSTRUME'] = instrument
+    hdr['TELESCOP'] = layout['telescope']
+    hdr['OBSERVAT'] = layout['telescope']
+    hdr['OBSTYPE'] = 'OBJECT'
+    hdr['OBSCLASS'] = 'science'
+    hdr['GEMPRGID'] = '%s-%s-Q-%d' % (site, semester, 100 + index % 50)
+    hdr['OBSID'] = obsid
+    hdr['DATALAB'] = '%s-%03d' % (obsid, 1 + index % 100)
+    hdr['OBJECT'] = 'Synthetic target %d' % index
+    hdr['DATE-OBS'] = date.isoformat()
+    hdr['TIME-OBS'] = '%02d:%02d:%06.3f' % (index % 24, index % 60, (index * 7.3) % 60)
+    hdr['UT'] = hdr['TIME-OBS']
+    hdr['DATE'] = date.isoformat()
+    hdr['LT'] = hdr['TIME-OBS']
+    hdr['RA'] = ra
+    hdr['DEC'] = dec
+    hdr['AZIMUTH'] = 120.0
+    hdr['ELEVATIO'] = 60.0
+    hdr['CRPA'] = 30.0
+    hdr['AIRMASS'] = 1.15
+    hdr['EXPTIME'] = 30.0
+    hdr['RAWIQ'] = '70-percentile'
+    hdr['RAWCC'] = '50-percentile'
+    hdr['RAWWV'] = 'Any'
+    hdr['RAWBG'] = '80-percentile'
+    hdr['REQIQ'] = '85-percentile'
+    hdr['REQCC'] = '70-percentile'
+    hdr['REQWV'] = 'Any'
+    hdr['REQBG'] = 'Any'
+    hdr['RAWGEMQA'] = 'USABLE'
+    hdr['RAWPIREQ'] = 'YES'
+    hdr['RELEASE'] = (date + datetime.timedelta(days=365)).isoformat()
+    for key, value in layout['keywords'].items():
+        hdr[key] = value
+    if layout['phu_wcs']:
+        _wcs(hdr, ra, dec, layout['shape'])
+
+    rng = np.random.default_rng(seed + index)
+    hdus = [phu]
+    for extver in range(1, layout['extensions'] + 1):
+        data = rng.poisson(1000, size=layout['shape']).astype(np.uint16)
+        ext = fits.ImageHDU(data=data, name='SCI', ver=extver)
+        ext.header['CCDSUM'] = '1 1'
+        ext.header['DATASEC'] = '[1:%d,1:%d]' % (layout['shape'][-1], layout['shape'][-2])
+        ext.header['GAIN'] = 1.5
+        ext.header['RDNOISE'] = 4.0
+        _wcs(ext.header, ra + 0.001 * (extver - 1), dec, layout['shape'], rotation=0.5)
+        hdus.append(ext)
+
+    path = os.path.join(directory, filename)
+    fits.HDUList(hdus).writeto(path, overwrite=True)
+    if compressed:
+        with open(path, 'rb') as infile, bz2.BZ2File(path + '.bz2', 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+        os.unlink(path)
+        filename += '.bz2'
+    return filename
+
+
+def make_corpus(directory: str, instruments=None, compressed=(False, True), count: int = 1) -> dict:
+    """
+    Write a set of synthetic files, some of each instrument and compression.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to write the files to, created if need be
+    instruments : iterable of str
+        Instruments to write files for, defaults to all of :data:`INSTRUMENTS`
+    compressed : iterable of bool
+        Which compression states to write
+    count : int
+        Number of files of each instrument and compression state
+
+    Returns
+    -------
+    dict
+        Lists of filenames keyed by (instrument, compressed)
+    """
+    os.makedirs(directory, exist_ok=True)
+    if instruments is None:
+        instruments = INSTRUMENTS.keys()
+    corpus = dict()
+    index = 1
+    for instrument in instruments:
+        for compress in compressed:
+            corpus[(instrument, compress)] = [make_fits(directory, instrument, index=index + i, compressed=compress)
+                                              for i in range(count)]
+            index += count
+    return corpus
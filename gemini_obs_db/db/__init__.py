@@ -1,3 +1,4 @@
+import logging
 from contextlib import contextmanager
 from datetime import date, datetime
 
@@ -9,6 +10,17 @@ from sqlalchemy.sql.sqltypes import NullType
 
 # from gemini_obs_db.db_config import database_url, postgres_database_pool_size, postgres_database_max_overflow
 from gemini_obs_db import db_config as dbc
+from gemini_obs_db.db.query_stats import QUERY_STATS
+
+
+def _attach_query_stats(engine):
+    """
+    Collect query statistics on an engine, if turned on in :mod:`~gemini_obs_db.db_config`.
+    """
+    if dbc.query_stats:
+        QUERY_STATS.attach(engine)
+        if dbc.query_stats_log_interval:
+            QUERY_STATS.start_periodic_dump(logging.getLogger(__name__), interval=dbc.query_stats_log_interval)
 
 if dbc.database_url.startswith('postgresql://'):
     args = {'pool_size': dbc.postgres_database_pool_size, 'max_overflow': dbc.postgres_database_max_overflow,
@@ -16,6 +28,7 @@ if dbc.database_url.startswith('postgresql://'):
 else:
     args = {'echo': dbc.database_debug}
 pg_db = create_engine(dbc.database_url, **args)
+_attach_query_stats(pg_db)
 sessionfactory = sessionmaker(pg_db)
 
 
@@ -45,6 +58,7 @@ def sessionfactory():
         else:
             args = {'echo': dbc.database_debug}
         pg_db = create_engine(dbc.database_url, **args)
+        _attach_query_stats(pg_db)
         _saved_sessionfactory = sessionmaker(pg_db)
     return _saved_sessionfactory()
 
@@ -0,0 +1,295 @@
+"""
+This module collects statistics on the SQL run through an engine.
+
+Turning on `database_debug` logs every statement, which is too much to read,
+and too slow to leave on, under production load.  :class:`QueryStats` instead
+listens to the cursor execute events of an engine and keeps, for each
+statement with its literals and parameters taken out, the number of
+executions, the total time, the latency percentiles and the number of rows.
+
+It also looks for the N+1 pattern, where one SELECT is run again and again
+with different parameters during a single use of a connection, as when a
+lazy loaded relationship such as `DiskFile.previews` is read for each row of
+a listing.  Statements that repeat like this are flagged in the snapshot.
+
+Set `query_stats` in :mod:`~gemini_obs_db.db_config` to have the engines built
+in :mod:`gemini_obs_db.db` report to the shared :data:`QUERY_STATS`, or attach
+a :class:`QueryStats` to any engine yourself.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from gemini_obs_db.utils.profiling import LatencyHistogram
+
+
+__all__ = ["QueryStats", "QUERY_STATS", "normalize_statement"]
+
+
+# Placeholders for the various DBAPI parameter styles, and SQL literals
+_param_re = re.compile(r"%\(\w+\)s|%s|\?|(?<!:):[A-Za-z_]\w*|\$\d+")
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.])")
+_in_list_re = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_space_re = re.compile(r"\s+")
+
+# Name of the statement that stands for all those seen after the table of statements is full
+OTHER_STATEMENTS = '<other>'
+
+_BURST_KEY = 'gemini_obs_db_query_stats'
+_START_KEY = 'gemini_obs_db_query_stats_start'
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Normalize an SQL statement, so that runs with different values count as the same statement.
+
+    Parameters and literals become `?`, lists of them in an IN clause become a
+    single `(?...)`, and whitespace is collapsed.
+
+    Parameters
+    ----------
+    statement : str
+        SQL as sent to the database
+
+    Returns
+    -------
+    str
+        Normalized SQL
+    """
+    statement = _string_re.sub('?', statement)
+    statement = _param_re.sub('?', statement)
+    statement = _number_re.sub('?', statement)
+    statement = _in_list_re.sub('(?...)', statement)
+    return _space_re.sub(' ', statement).strip()
+
+
+class _StatementStats:
+    """
+    Statistics for one normalized statement.
+    """
+    __slots__ = ('latency', 'rows', 'n_plus_one', 'max_repeats')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.n_plus_one = 0
+        self.max_repeats = 0
+
+
+class QueryStats:
+    """
+    Collects statistics on the statements run through one or more engines.
+
+    Parameters
+    ----------
+    n_plus_one_threshold : int
+        Number of times a SELECT must run during one checkout of a connection to be flagged as N+1
+    max_statements : int
+        Most distinct statements to keep, after which new ones are counted under `<other>`
+    """
+    def __init__(self, n_plus_one_threshold: int = 10, max_statements: int = 1000):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._stats = dict()
+        self._normalized = dict()
+        self._engines = list()
+        self._stop_dump = None
+
+    def attach(self, engine: Engine):
+        """
+        Start collecting statistics on an engine.
+
+        Parameters
+        ----------
+        engine : :class:`~sqlalchemy.engine.Engine`
+            Engine to listen to
+        """
+        if engine in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+        event.listen(engine.pool, 'checkout', self._checkout)
+        self._engines.append(engine)
+
+    def detach(self, engine: Engine):
+        """
+        Stop collecting statistics on an engine.
+
+        Parameters
+        ----------
+        engine : :class:`~sqlalchemy.engine.Engine`
+            Engine to stop listening to
+        """
+        if engine not in self._engines:
+            return
+        event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.remove(engine, 'handle_error', self._handle_error)
+        event.remove(engine.pool, 'checkout', self._checkout)
+        self._engines.remove(engine)
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        # Each checkout is one unit of work, so start counting repeats again
+        connection_record.info[_BURST_KEY] = Counter()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        # The statement failed, so there is no after event to take its start time off
+        conn = exception_context.connection
+        starts = conn.info.get(_START_KEY) if conn is not None else None
+        if starts:
+            starts.pop()
+
+    def _normalize(self, statement: str) -> str:
+        normalized = self._normalized.get(statement)
+        if normalized is None:
+            normalized = normalize_statement(statement)
+            if len(self._normalized) < 10 * self.max_statements:
+                self._normalized[statement] = normalized
+        return normalized
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get(_START_KEY)
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        normalized = self._normalize(statement)
+        rowcount = getattr(cursor, 'rowcount', -1)
+        burst = conn.info.get(_BURST_KEY)
+        if burst is None:
+            burst = conn.info[_BURST_KEY] = Counter()
+        burst[normalized] += 1
+        repeats = burst[normalized]
+
+        with self._lock:
+            stats = self._stats.get(normalized)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    normalized = OTHER_STATEMENTS
+                    stats = self._stats.get(normalized)
+                if stats is None:
+                    stats = self._stats[normalized] = _StatementStats()
+            stats.latency.record(seconds)
+            if rowcount is not None and rowcount >= 0:
+                stats.rows += rowcount
+            if repeats > stats.max_repeats:
+                stats.max_repeats = repeats
+            if repeats == self.n_plus_one_threshold and normalized.upper().startswith('SELECT'):
+                stats.n_plus_one += 1
+
+    def reset(self):
+        """
+        Forget all the statistics collected so far.
+        """
+        with self._lock:
+            self._stats = dict()
+
+    def snapshot(self, order_by: str = 'total', limit: int = None) -> List[dict]:
+        """
+        Get the statistics collected so far.
+
+        Parameters
+        ----------
+        order_by : str
+            Field to sort by, largest first, such as `total`, `count`, `p95` or `n_plus_one`
+        limit : int
+            Number of statements to return, defaults to all of them
+
+        Returns
+        -------
+        list of dict
+            One dict per statement, with the `statement`, execution `count`,
+            `total` and `mean` seconds, `p50`, `p95` and `p99` seconds, the
+            number of `rows`, the number of times it was flagged as `n_plus_one`
+            and the most times it ran during one checkout, `max_repeats`
+        """
+        with self._lock:
+            items = [(statement, stats.latency.count, stats.latency.total, stats.latency.mean,
+                      stats.latency.percentile(50), stats.latency.percentile(95), stats.latency.percentile(99),
+                      stats.rows, stats.n_plus_one, stats.max_repeats)
+                     for statement, stats in self._stats.items()]
+        rows = [dict(statement=s, count=c, total=t, mean=m, p50=p50, p95=p95, p99=p99, rows=r, n_plus_one=n,
+                     max_repeats=x)
+                for s, c, t, m, p50, p95, p99, r, n, x in items]
+        rows.sort(key=lambda r: -(r[order_by] or 0))
+        return rows[:limit] if limit is not None else rows
+
+    def n_plus_one(self) -> List[dict]:
+        """
+        Get the statements flagged as N+1 queries.
+
+        Returns
+        -------
+        list of dict
+            Snapshot entries of the flagged statements, most often flagged first
+        """
+        return [r for r in self.snapshot(order_by='n_plus_one') if r['n_plus_one']]
+
+    def report(self, limit: int = 20) -> str:
+        """
+        Format the slowest statements as a table.
+
+        Parameters
+        ----------
+        limit : int
+            Number of statements to include
+
+        Returns
+        -------
+        str
+            The report
+        """
+        lines = ['%8s %10s %9s %9s %9s %8s %6s  %s'
+                 % ('count', 'total ms', 'p50 ms', 'p95 ms', 'p99 ms', 'rows', 'N+1', 'statement')]
+        for r in self.snapshot(limit=limit):
+            lines.append('%8d %10.2f %9.3f %9.3f %9.3f %8d %6s  %s'
+                         % (r['count'], r['total'] * 1000.0, r['p50'] * 1000.0, r['p95'] * 1000.0,
+                            r['p99'] * 1000.0, r['rows'], r['n_plus_one'] or '', r['statement'][:200]))
+        return '\n'.join(lines)
+
+    def start_periodic_dump(self, log, interval: float = 300.0, limit: int = 20):
+        """
+        Log the report every so often, from a background thread.
+
+        Parameters
+        ----------
+        log : :class:`logging.Logger`
+            Logger to write the report to
+        interval : float
+            Seconds between reports
+        limit : int
+            Number of statements in each report
+        """
+        self.stop_periodic_dump()
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                if self._stats:
+                    log.info("Query statistics:\n%s" % self.report(limit=limit))
+
+        thread = threading.Thread(target=dump, name='query_stats_dump', daemon=True)
+        self._stop_dump = stop
+        thread.start()
+
+    def stop_periodic_dump(self):
+        """
+        Stop logging the report.
+        """
+        if self._stop_dump is not None:
+            self._stop_dump.set()
+            self._stop_dump = None
+
+
+# Shared statistics for the engines built in gemini_obs_db.db
+QUERY_STATS = QueryStats()
@@ -12,6 +12,11 @@ __all__ = [
     "database_url",
     "postgres_database_pool_size",
     "postgres_database_max_overflow",
+    "query_stats",
+    "query_stats_log_interval",
+    "partitioning",
+    "partitions_ahead",
+    "compact_schema",
 ]
 
 
@@ -26,6 +31,23 @@ sqlite_db_path = join(storage_root, 'gemini_obs_db.db')
 database_url = os.getenv('GEMINI_OBS_DB_URL', 'sqlite:///' + sqlite_db_path)
 database_debug = False  # set to True to enable SQLAlchemy debugging
 
+# Set query_stats to True to collect statistics on the SQL run through the engines in
+# gemini_obs_db.db, see gemini_obs_db.db.query_stats.  If the interval is set, in seconds,
+# the slowest statements are logged that often
+query_stats = False
+query_stats_log_interval = None
+
+# Set partitioning to 'semester' or 'month' to have create_tables partition the header and
+# diskfile tables by date on PostgreSQL, see gemini_obs_db.utils.partitioning.  Partitions
+# are created this many semesters or months ahead
+partitioning = None
+partitions_ahead = 2
+
+# Set compact_schema to True, before importing any of the ORM classes, to store coordinates as
+# floats and the instrument, filter and disperser names as small integer codes, see
+# gemini_obs_db.orm.compact
+compact_schema = False
+
 # These two are only used if we are using a Postgres database
 # However, we define them anyway so they are available for import
 postgres_database_pool_size = 30
@@ -1,15 +1,15 @@
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy import Integer, BigInteger, SmallInteger, Enum
+from sqlalchemy import Integer, BigInteger, SmallInteger
 
 from gemini_obs_db.orm import Base
 
-from gemini_obs_db.utils.gemini_metadata_utils import cal_types
+from gemini_obs_db.utils.gemini_metadata_utils import CALIBRATION_TYPES
 
 
 __all__ = ["CalCache"]
 
 
-CALTYPE_ENUM = Enum(*cal_types, name='caltype')
+CALTYPE_ENUM = CALIBRATION_TYPES.enum()
 
 
 class CalCache(Base):
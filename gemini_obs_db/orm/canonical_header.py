@@ -0,0 +1,294 @@
+"""
+This module holds the canonical header view, a narrow denormalized table for searches.
+
+Nearly every search of the archive wants the headers of files that are
+present and canonical, and so joins :class:`~gemini_obs_db.orm.header.Header`
+to :class:`~gemini_obs_db.orm.diskfile.DiskFile` to
+:class:`~gemini_obs_db.orm.file.File` and filters on the two booleans.  The
+canonical header view is that join done ahead of time: one row per canonical
+present header, with the file name and the most searched header columns, and
+composite indexes for the usual combinations of filters.
+
+On PostgreSQL it is a materialized view, brought up to date with
+:func:`refresh_canonical_header`.  Other databases, such as the SQLite used in
+testing, get a plain table of the same shape.  There, ingest can also keep it
+up to date file by file with :func:`update_canonical_header`, or have it
+done on every flush of an ingest session with
+:func:`maintain_canonical_header`.  On PostgreSQL those do nothing, since a materialized view can only be refreshed
+whole, and the view should be refreshed on a schedule instead.
+"""
+from typing import Iterable
+
+from sqlalchemy import Column, Index, Integer, Text, and_, event, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from .diskfile import DiskFile
+from .file import File
+from .header import Header
+
+
+__all__ = ["CanonicalHeader", "CANONICAL_HEADER_COLUMNS", "canonical_header_select", "create_canonical_header",
+           "drop_canonical_header", "refresh_canonical_header", "update_canonical_header",
+           "maintain_canonical_header"]
+
+
+# Kept out of the main metadata, as on PostgreSQL this is a materialized view and not a table
+ViewBase = declarative_base()
+
+# Header columns copied into the view
+CANONICAL_HEADER_COLUMNS = (
+    'program_id', 'observation_id', 'data_label', 'telescope', 'instrument', 'ut_datetime', 'ut_datetime_secs',
+    'observation_type', 'observation_class', 'object', 'ra', 'dec', 'healpix', 'filter_name', 'disperser',
+    'camera', 'central_wavelength', 'focal_plane_mask', 'spectroscopy', 'mode', 'qa_state', 'reduction',
+    'engineering', 'science_verification', 'calibration_program', 'procmode', 'release',
+)
+
+
+def _header_column(name: str) -> Column:
+    return Column(name, Header.__table__.c[name].type)
+
+
+class CanonicalHeader(ViewBase):
+    """
+    This is the ORM class for the canonical_header view.  Each row is a
+    :class:`~gemini_obs_db.orm.header.Header` of a present and canonical
+    :class:`~gemini_obs_db.orm.diskfile.DiskFile`, with the name of its
+    :class:`~gemini_obs_db.orm.file.File`.
+
+    The rows are read only, they are written by :func:`refresh_canonical_header`
+    and :func:`update_canonical_header`.
+    """
+    __tablename__ = 'canonical_header'
+    __table_args__ = (
+        Index('ix_canonical_header_instrument_ut', 'instrument', 'ut_datetime_secs'),
+        Index('ix_canonical_header_obstype_obsclass_instrument',
+              'observation_type', 'observation_class', 'instrument'),
+        Index('ix_canonical_header_program_ut', 'program_id', 'ut_datetime'),
+        Index('ix_canonical_header_ut_datetime', 'ut_datetime'),
+        Index('ix_canonical_header_data_label', 'data_label'),
+        Index('ix_canonical_header_filename', 'filename'),
+        Index('ix_canonical_header_healpix', 'healpix'),
+        Index('ix_canonical_header_diskfile_id', 'diskfile_id'),
+        Index('ix_canonical_header_file_id', 'file_id'),
+    )
+
+    header_id = Column(Integer, primary_key=True, autoincrement=False)
+    diskfile_id = Column(Integer, nullable=False)
+    file_id = Column(Integer, nullable=False)
+    filename = Column(Text)
+    # Same types as in the header table
+    program_id = _header_column('program_id')
+    observation_id = _header_column('observation_id')
+    data_label = _header_column('data_label')
+    telescope = _header_column('telescope')
+    instrument = _header_column('instrument')
+    ut_datetime = _header_column('ut_datetime')
+    ut_datetime_secs = _header_column('ut_datetime_secs')
+    observation_type = _header_column('observation_type')
+    observation_class = _header_column('observation_class')
+    object = _header_column('object')
+    ra = _header_column('ra')
+    dec = _header_column('dec')
+    healpix = _header_column('healpix')
+    filter_name = _header_column('filter_name')
+    disperser = _header_column('disperser')
+    camera = _header_column('camera')
+    central_wavelength = _header_column('central_wavelength')
+    focal_plane_mask = _header_column('focal_plane_mask')
+    spectroscopy = _header_column('spectroscopy')
+    mode = _header_column('mode')
+    qa_state = _header_column('qa_state')
+    reduction = _header_column('reduction')
+    engineering = _header_column('engineering')
+    science_verification = _header_column('science_verification')
+    calibration_program = _header_column('calibration_program')
+    procmode = _header_column('procmode')
+    release = _header_column('release')
+
+    def __repr__(self):
+        return "<CanonicalHeader('%s', '%s')>" % (self.header_id, self.filename)
+
+
+def canonical_header_select(file_ids: Iterable[int] = None):
+    """
+    Build the query that defines the view.
+
+    Parameters
+    ----------
+    file_ids : iterable of int
+        Only select the headers of these files, defaults to all of them
+
+    Returns
+    -------
+    :class:`~sqlalchemy.sql.expression.Select`
+        Query with the columns of :class:`CanonicalHeader`, in order
+    """
+    header = Header.__table__
+    diskfile = DiskFile.__table__
+    file = File.__table__
+    columns = [header.c.id.label('header_id'), diskfile.c.id.label('diskfile_id'), file.c.id.label('file_id'),
+               file.c.name.label('filename')] + [header.c[name] for name in CANONICAL_HEADER_COLUMNS]
+    condition = and_(diskfile.c.canonical == True, diskfile.c.present == True)
+    if file_ids is not None:
+        condition = and_(condition, file.c.id.in_(list(file_ids)))
+    return select(columns) \
+        .select_from(header.join(diskfile, header.c.diskfile_id == diskfile.c.id)
+                     .join(file, diskfile.c.file_id == file.c.id)) \
+        .where(condition)
+
+
+def _run(session_or_engine, fn):
+    """
+    Run a function with a connection, in its own transaction if given an engine.
+    """
+    if isinstance(session_or_engine, Engine):
+        with session_or_engine.begin() as connection:
+            fn(connection)
+    else:
+        fn(session_or_engine.connection())
+
+
+def _is_postgres(bind) -> bool:
+    return bind.dialect.name == 'postgresql'
+
+
+def _fill(connection, file_ids: Iterable[int] = None):
+    query = canonical_header_select(file_ids)
+    return connection.execute(CanonicalHeader.__table__.insert().from_select([c.name for c in query.c], query))
+
+
+def create_canonical_header(session_or_engine):
+    """
+    Create the canonical header view, and fill it.
+
+    Parameters
+    ----------
+    session_or_engine : :class:`~sqlalchemy.orm.Session` or :class:`~sqlalchemy.engine.Engine`
+        Where to create the view
+    """
+    table = CanonicalHeader.__table__
+
+    def create(connection):
+        if _is_postgres(connection):
+            query = canonical_header_select().compile(dialect=connection.dialect,
+                                                      compile_kwargs={'literal_binds': True})
+            connection.execute(text('CREATE MATERIALIZED VIEW IF NOT EXISTS canonical_header AS %s' % query))
+            # A unique index lets the view be refreshed concurrently
+            connection.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_canonical_header_header_id '
+                                    'ON canonical_header (header_id)'))
+            for index in table.indexes:
+                ddl = str(CreateIndex(index).compile(dialect=connection.dialect))
+                connection.execute(text(ddl.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1)))
+        elif not connection.dialect.has_table(connection, table.name):
+            table.create(bind=connection)
+            _fill(connection)
+
+    _run(session_or_engine, create)
+
+
+def drop_canonical_header(session_or_engine):
+    """
+    Drop the canonical header view.
+
+    Parameters
+    ----------
+    session_or_engine : :class:`~sqlalchemy.orm.Session` or :class:`~sqlalchemy.engine.Engine`
+        Where to drop the view from
+    """
+    def drop(connection):
+        if _is_postgres(connection):
+            connection.execute(text('DROP MATERIALIZED VIEW IF EXISTS canonical_header'))
+        else:
+            CanonicalHeader.__table__.drop(bind=connection, checkfirst=True)
+
+    _run(session_or_engine, drop)
+
+
+def refresh_canonical_header(session: Session, concurrently: bool = True):
+    """
+    Bring the whole canonical header view up to date.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to refresh with
+    concurrently : bool
+        On PostgreSQL, refresh without locking out readers.  This is slower,
+        and can not be done inside a transaction block on older servers
+    """
+    connection = session.connection()
+    if _is_postgres(connection):
+        connection.execute(text('REFRESH MATERIALIZED VIEW %scanonical_header'
+                                % ('CONCURRENTLY ' if concurrently else '')))
+    else:
+        connection.execute(CanonicalHeader.__table__.delete())
+        _fill(connection)
+
+
+def update_canonical_header(session: Session, diskfiles: Iterable) -> int:
+    """
+    Update the canonical header view for the files of some diskfiles, as they are ingested.
+
+    All the rows for the files of the diskfiles are replaced, so that a new
+    diskfile taking over as the canonical one also removes the old one's row.
+    Call this once the headers are flushed.  On PostgreSQL this does nothing,
+    and the view is brought up to date by :func:`refresh_canonical_header`.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to update with
+    diskfiles : iterable of :class:`~gemini_obs_db.orm.diskfile.DiskFile`
+        Diskfiles that were added or changed
+
+    Returns
+    -------
+    int
+        Number of rows written
+    """
+    connection = session.connection()
+    if _is_postgres(connection):
+        return 0
+    file_ids = sorted(set(df.file_id for df in diskfiles if df.file_id is not None))
+    if not file_ids:
+        return 0
+    table = CanonicalHeader.__table__
+    connection.execute(table.delete().where(table.c.file_id.in_(file_ids)))
+    return _fill(connection, file_ids).rowcount
+
+
+def _after_flush(session, flush_context):
+    diskfiles = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, DiskFile):
+            diskfiles.add(obj)
+        elif isinstance(obj, Header) and obj.diskfile is not None:
+            diskfiles.add(obj.diskfile)
+    if diskfiles:
+        update_canonical_header(session, diskfiles)
+
+
+def maintain_canonical_header(session_or_factory, enable: bool = True):
+    """
+    Keep the canonical header view up to date as an ingest session flushes.
+
+    After each flush, the rows for the files of any diskfiles or headers
+    added, changed or deleted in the flush are rebuilt with
+    :func:`update_canonical_header`.  Changes made with core statements,
+    rather than through the ORM objects, are not seen.
+
+    Parameters
+    ----------
+    session_or_factory : :class:`~sqlalchemy.orm.Session` or :class:`~sqlalchemy.orm.sessionmaker`
+        Session, or factory of sessions, to watch
+    enable : bool
+        If False, stop watching
+    """
+    if enable:
+        if not event.contains(session_or_factory, 'after_flush', _after_flush):
+            event.listen(session_or_factory, 'after_flush', _after_flush)
+    elif event.contains(session_or_factory, 'after_flush', _after_flush):
+        event.remove(session_or_factory, 'after_flush', _after_flush)
@@ -0,0 +1,614 @@
+"""
+This module provides the column types of the optional compact schema profile.
+
+By default, coordinates and other measured values are stored as `Numeric`,
+and come back from every query as :class:`decimal.Decimal`, which is slow to
+convert and to compute with.  Columns such as `instrument`, `filter_name` and
+`disperser` store the same few hundred strings again and again across
+millions of rows.
+
+Setting `compact_schema` in :mod:`~gemini_obs_db.db_config` to True, before
+any of the ORM classes are imported, switches those columns to compact types:
+
+- coordinates and measured values become double precision floats, and come
+  back as Python floats
+- the repeated strings are dictionary encoded, stored as small integer codes
+  with the strings kept once in the `text_code` table
+
+The encoding is done by :class:`CodedText`, a type decorator, so the ORM
+classes still take and return strings, and queries comparing a coded column
+with a string, or with a list of strings with `in_`, need no change.  Pattern
+matching with `like`, SQL functions on the column, and sorting by it work on
+the codes rather than the strings, so those queries need to join `text_code`.
+
+Codes are allocated when a string is first written, in the same transaction
+as the row that uses it, by an engine event that looks at every INSERT and
+UPDATE of a table with coded columns.  Searching for a string that was never
+written does not allocate a code, it just matches nothing.  The codes are
+cached in each process, see :data:`TEXT_CODES`.  A code added in a
+transaction is only used by the connection that added it until the
+transaction commits, so no other connection writes a code that may yet be
+rolled back.  The same event reads the codes again, on the connection running
+the statement, when a statement searches for a string that is not cached.
+Encoding the values of a statement never goes to the database itself.  The
+`instrument` dictionary is seeded from the
+:data:`~gemini_obs_db.utils.gemini_metadata_utils.INSTRUMENTS` vocabulary by
+:func:`seed_text_codes`, so instruments get the same codes in every database.
+"""
+import threading
+from typing import Dict, Iterable
+
+from sqlalchemy import Column, Float, Numeric, SmallInteger, Text, UniqueConstraint, event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql import ClauseElement, visitors
+from sqlalchemy.sql.dml import Insert, Update
+from sqlalchemy.types import TypeDecorator
+
+from gemini_obs_db import db_config
+from gemini_obs_db.orm import Base
+from gemini_obs_db.utils.gemini_metadata_utils import INSTRUMENTS
+
+
+__all__ = ["TextCode", "CodedText", "TextCodes", "TEXT_CODES", "seed_text_codes", "coordinate_type",
+           "measurement_type", "coded_text_type"]
+
+
+class TextCode(Base):
+    """
+    This is the ORM class for the text_code table, which holds the strings of
+    the dictionary encoded columns of the compact schema profile.
+    """
+    __tablename__ = 'text_code'
+    __table_args__ = (
+        UniqueConstraint('dictionary', 'value', name='uq_text_code_dictionary_value'),
+    )
+
+    dictionary = Column(Text, primary_key=True)
+    code = Column(SmallInteger, primary_key=True, autoincrement=False)
+    value = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return "<TextCode('%s', %d, '%s')>" % (self.dictionary, self.code, self.value)
+
+
+# Seed values for dictionaries, so their codes are the same in every database
+_VOCABULARIES = {
+    'instrument': INSTRUMENTS,
+}
+
+_PENDING_KEY = 'gemini_obs_db_text_codes_pending'
+
+# Info of the connection running a statement on each thread, for its pending codes
+_current = threading.local()
+
+
+def _pending_frames(info: dict) -> list:
+    """
+    Get the codes a connection has added in its open transaction.
+
+    They are kept as a stack of [savepoint name, {dictionary: {value: code}}],
+    with the transaction itself at the bottom, so that rolling back a
+    savepoint drops only the codes added since it.
+    """
+    frames = info.get(_PENDING_KEY)
+    if frames is None:
+        frames = info[_PENDING_KEY] = [[None, dict()]]
+    return frames
+
+
+def _pending_codes(info, dictionary: str) -> Dict[str, int]:
+    frames = info.get(_PENDING_KEY) if info is not None else None
+    codes = dict()
+    for name, pending in frames or ():
+        codes.update(pending.get(dictionary, ()))
+    return codes
+
+
+class TextCodes:
+    """
+    Cache of the codes in the text_code table, by dictionary.
+
+    The cache is filled from the database on first use of a dictionary, and
+    again whenever a string or code is not found, in case another process
+    has added it since.  It only holds committed codes, those added in an
+    open transaction are kept with its connection until it commits.
+
+    Parameters
+    ----------
+    engine : :class:`~sqlalchemy.engine.Engine`
+        Database to read the codes from, defaults to the engine of :mod:`gemini_obs_db.db`
+    """
+    def __init__(self, engine: Engine = None):
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._codes: Dict[str, Dict[str, int]] = dict()
+        self._values: Dict[str, Dict[int, str]] = dict()
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is not None:
+            return self._engine
+        import gemini_obs_db.db as db
+        return db.pg_db
+
+    def bind(self, engine: Engine):
+        """
+        Read the codes from another database, dropping what is cached.
+
+        Parameters
+        ----------
+        engine : :class:`~sqlalchemy.engine.Engine`
+            Database to read the codes from
+        """
+        self._engine = engine
+        self.clear()
+
+    def clear(self, dictionaries: Iterable[str] = None):
+        """
+        Drop cached codes, so they are read again.
+
+        Parameters
+        ----------
+        dictionaries : iterable of str
+            Dictionaries to drop, defaults to all of them
+        """
+        # The dicts are emptied rather than replaced, as the result processors hold on to them
+        with self._lock:
+            for dictionary in list(self._codes) if dictionaries is None else dictionaries:
+                self._cached(dictionary)
+                self._codes[dictionary].clear()
+                self._values[dictionary].clear()
+
+    def _cached(self, dictionary: str):
+        codes = self._codes.get(dictionary)
+        if codes is None:
+            codes = self._codes[dictionary] = dict()
+            self._values[dictionary] = dict()
+        return codes, self._values[dictionary]
+
+    def _load(self, dictionary: str, connection=None):
+        table = TextCode.__table__
+        query = select([table.c.code, table.c.value]).where(table.c.dictionary == dictionary)
+        if connection is None:
+            with self.engine.connect() as connection:
+                rows = connection.execute(query).fetchall()
+        else:
+            rows = connection.execute(query).fetchall()
+            # Leave out the codes this connection has added and not yet committed
+            pending = _pending_codes(connection.info, dictionary)
+            if pending:
+                rows = [r for r in rows if r[1] not in pending]
+        with self._lock:
+            codes, values = self._cached(dictionary)
+            values.clear()
+            values.update(rows)
+            codes.clear()
+            codes.update((value, code) for code, value in rows)
+
+    def code(self, dictionary: str, value: str, connection=None):
+        """
+        Get the code of a string.
+
+        Parameters
+        ----------
+        dictionary : str
+            Name of the dictionary, normally the column name
+        value : str
+            String to look up
+        connection : :class:`~sqlalchemy.engine.Connection`
+            Connection to read the codes with, if they are not cached, which
+            also sees the codes it has added in its open transaction
+
+        Returns
+        -------
+        int or None
+            The code, or None if the string has none yet
+        """
+        codes = self._codes.get(dictionary)
+        if codes is not None:
+            code = codes.get(value)
+            if code is not None:
+                return code
+        if connection is not None:
+            code = _pending_codes(connection.info, dictionary).get(value)
+            if code is not None:
+                return code
+        self._load(dictionary, connection)
+        return self._codes[dictionary].get(value)
+
+    def value(self, dictionary: str, code: int) -> str:
+        """
+        Get the string for a code.
+
+        Parameters
+        ----------
+        dictionary : str
+            Name of the dictionary, normally the column name
+        code : int
+            Code to look up
+
+        Returns
+        -------
+        str
+            The string
+        """
+        values = self._values.get(dictionary)
+        if values is not None:
+            value = values.get(code)
+            if value is not None:
+                return value
+        self._load(dictionary)
+        try:
+            return self._values[dictionary][code]
+        except KeyError:
+            raise ValueError("No string for code %s of dictionary %s" % (code, dictionary))
+
+    def ensure(self, connection, dictionary: str, values: Iterable[str]) -> Dict[str, int]:
+        """
+        Get the codes of some strings, adding codes for those that have none.
+
+        New codes are added in the transaction of `connection`, and only
+        used on that connection until the transaction commits.
+
+        Parameters
+        ----------
+        connection : :class:`~sqlalchemy.engine.Connection`
+            Connection to add the codes with
+        dictionary : str
+            Name of the dictionary, normally the column name
+        values : iterable of str
+            Strings to encode
+
+        Returns
+        -------
+        dict
+            Code of each string
+        """
+        codes = dict()
+        missing = list()
+        cached = self._codes.get(dictionary, dict())
+        pending = _pending_codes(connection.info, dictionary)
+        # In order, so that a vocabulary gets its codes in the order of its values
+        for value in dict.fromkeys(v for v in values if v is not None):
+            code = cached.get(value, pending.get(value))
+            if code is None:
+                missing.append(value)
+            else:
+                codes[value] = code
+        if missing:
+            self._load(dictionary, connection)
+            for value in missing:
+                code = self._codes[dictionary].get(value)
+                codes[value] = code if code is not None else self._add(connection, dictionary, value)
+        return codes
+
+    def _add(self, connection, dictionary: str, value: str) -> int:
+        table = TextCode.__table__
+        postgres = connection.dialect.name == 'postgresql'
+        while True:
+            code = connection.execute(select([func.coalesce(func.max(table.c.code), 0) + 1])
+                                      .where(table.c.dictionary == dictionary)).scalar()
+            # Another process may be adding codes too, so on PostgreSQL try in
+            # a savepoint, and if we clash, read its codes and try again
+            savepoint = connection.begin_nested() if postgres else None
+            try:
+                connection.execute(table.insert(), dict(dictionary=dictionary, code=code, value=value))
+            except IntegrityError:
+                if savepoint is None:
+                    raise
+                savepoint.rollback()
+                self._load(dictionary, connection)
+                existing = self._codes[dictionary].get(value)
+                if existing is not None:
+                    return existing
+                continue
+            if savepoint is not None:
+                savepoint.commit()
+            break
+        # Only this connection can use the code until it commits
+        _pending_frames(connection.info)[-1][1].setdefault(dictionary, dict())[value] = code
+        return code
+
+
+# Shared cache of the codes
+TEXT_CODES = TextCodes()
+
+
+class CodedText(TypeDecorator):
+    """
+    String column stored as a small integer code, with the strings in the text_code table.
+
+    Parameters
+    ----------
+    dictionary : str
+        Name of the set of strings the codes are for, columns with the same
+        strings, such as the `filter_name` of every instrument table, can share one
+    search : bool
+        If True, this is the type of values compared with a coded column, which
+        may have no code, rather than of values written to one
+    """
+    impl = SmallInteger
+
+    def __init__(self, dictionary: str, search: bool = False):
+        super().__init__()
+        self.dictionary = dictionary
+        self.search = search
+        self._search_type = None
+        _listen()
+
+    def coerce_compared_value(self, op, value):
+        # Values compared with the column, as in searches, get a type of their
+        # own, so that they can be told apart from the values being written
+        if self.search:
+            return self
+        if self._search_type is None:
+            self._search_type = CodedText(self.dictionary, search=True)
+        return self._search_type
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        # Only the cache is used here, it is brought up to date on the
+        # connection running the statement, before it runs
+        code = TEXT_CODES._codes.get(self.dictionary, dict()).get(value)
+        if code is None:
+            code = _pending_codes(getattr(_current, 'info', None), self.dictionary).get(value)
+        if code is not None:
+            return code
+        if self.search:
+            # A string that was never written matches nothing
+            return -1
+        raise ValueError("No code for '%s' in dictionary %s, it was not added before the statement ran"
+                         % (value, self.dictionary))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return TEXT_CODES.value(self.dictionary, value)
+
+    def result_processor(self, dialect, coltype):
+        # Decoding runs for every value fetched, so look the codes up directly
+        # in the cache, and only fall back to the method on a miss
+        dictionary = self.dictionary
+        with TEXT_CODES._lock:
+            get = TEXT_CODES._cached(dictionary)[1].get
+        value_of = TEXT_CODES.value
+
+        def process(value):
+            if value is None:
+                return None
+            string = get(value)
+            return string if string is not None else _decode_missing(dictionary, value, value_of)
+        return process
+
+
+def _decode_missing(dictionary: str, code: int, value_of) -> str:
+    # A code added in the open transaction of the connection, or one to read from the database
+    for value, pending_code in _pending_codes(getattr(_current, 'info', None), dictionary).items():
+        if pending_code == code:
+            return value
+    return value_of(dictionary, code)
+
+
+def _coded_columns(table) -> Dict[str, str]:
+    """
+    Get the dictionary of each coded column of a table, by column name.
+    """
+    coded = table.info.get('coded_columns')
+    if coded is None:
+        coded = table.info['coded_columns'] = dict((c.name, c.type.dictionary) for c in table.columns
+                                                   if isinstance(c.type, CodedText))
+    return coded
+
+
+def _key_names(values: dict) -> dict:
+    return dict((getattr(k, 'key', k), v) for k, v in values.items())
+
+
+def _encode_new_values(conn, clauseelement, multiparams, params):
+    """
+    Add codes for the strings an INSERT or UPDATE writes to coded columns.
+    """
+    coded = _coded_columns(clauseelement.table)
+    if not coded:
+        return
+    rows = list()
+    for multiparam in multiparams:
+        if isinstance(multiparam, dict):
+            rows.append(multiparam)
+        elif isinstance(multiparam, (list, tuple)):
+            rows.extend(p for p in multiparam if isinstance(p, dict))
+    if params:
+        rows.append(params)
+    values = getattr(clauseelement, 'parameters', None)
+    if isinstance(values, dict):
+        rows.append(_key_names(values))
+    elif isinstance(values, list):
+        # Several rows, as from values([...]), for a multi-VALUES INSERT
+        rows.extend(_key_names(v) for v in values if isinstance(v, dict))
+    for column, dictionary in coded.items():
+        strings = [row[column] for row in rows if isinstance(row.get(column), str)]
+        if strings:
+            TEXT_CODES.ensure(conn, dictionary, strings)
+
+
+def _refresh_searched_values(conn, clauseelement, multiparams, params):
+    """
+    Read the codes again for any dictionary a statement searches for a string that is not cached.
+    """
+    supplied = dict()
+    for multiparam in multiparams:
+        if isinstance(multiparam, dict):
+            supplied.update(multiparam)
+            break
+    if params:
+        supplied.update(params)
+    stale = set()
+
+    def visit_bindparam(bind):
+        type_ = bind.type
+        if not isinstance(type_, CodedText) or not type_.search or type_.dictionary in stale:
+            return
+        value = supplied.get(bind.key, bind.effective_value)
+        codes = TEXT_CODES._codes.get(type_.dictionary, dict())
+        pending = _pending_codes(conn.info, type_.dictionary)
+        for v in value if isinstance(value, (list, tuple)) else (value, ):
+            if isinstance(v, str) and v not in codes and v not in pending:
+                stale.add(type_.dictionary)
+                return
+
+    visitors.traverse(clauseelement, {}, {'bindparam': visit_bindparam})
+    for dictionary in stale:
+        TEXT_CODES._load(dictionary, conn)
+
+
+def _before_execute(conn, clauseelement, multiparams, params):
+    _current.info = conn.info
+    if isinstance(clauseelement, (Insert, Update)):
+        _encode_new_values(conn, clauseelement, multiparams, params)
+    if isinstance(clauseelement, ClauseElement):
+        _refresh_searched_values(conn, clauseelement, multiparams, params)
+
+
+def _commit(conn):
+    # The codes added in the transaction can now be used by everyone
+    frames = conn.info.pop(_PENDING_KEY, None)
+    if not frames:
+        return
+    with TEXT_CODES._lock:
+        for name, pending in frames:
+            for dictionary, codes in pending.items():
+                cached_codes, cached_values = TEXT_CODES._cached(dictionary)
+                cached_codes.update(codes)
+                cached_values.update((code, value) for value, code in codes.items())
+
+
+def _rollback(conn):
+    # The codes added in the transaction are gone with it
+    conn.info.pop(_PENDING_KEY, None)
+
+
+def _savepoint(conn, name):
+    _pending_frames(conn.info).append([name, dict()])
+
+
+def _pop_savepoint(conn, name) -> list:
+    frames = conn.info.get(_PENDING_KEY)
+    if not frames or len(frames) < 2:
+        return []
+    # The savepoint event comes before SQLAlchemy names the savepoint, so
+    # unless it was named, it is the innermost one, as savepoints nest
+    names = [f[0] for f in frames]
+    i = names.index(name, 1) if name in names[1:] else len(frames) - 1
+    popped = frames[i:]
+    del frames[i:]
+    return popped
+
+
+def _rollback_savepoint(conn, name, context):
+    # Only the codes added since the savepoint are gone
+    _pop_savepoint(conn, name)
+
+
+def _release_savepoint(conn, name, context):
+    popped = _pop_savepoint(conn, name)
+    if popped:
+        below = conn.info[_PENDING_KEY][-1][1]
+        for _, pending in popped:
+            for dictionary, codes in pending.items():
+                below.setdefault(dictionary, dict()).update(codes)
+
+
+def _reset(dbapi_connection, connection_record):
+    # Returned to the pool with its transaction still open, and rolled back there
+    connection_record.info.pop(_PENDING_KEY, None)
+
+
+def _listen():
+    """
+    Start encoding new strings as they are written, once the first coded column is defined.
+    """
+    if not event.contains(Engine, 'before_execute', _before_execute):
+        event.listen(Engine, 'before_execute', _before_execute)
+        event.listen(Engine, 'commit', _commit)
+        event.listen(Engine, 'rollback', _rollback)
+        event.listen(Engine, 'savepoint', _savepoint)
+        event.listen(Engine, 'rollback_savepoint', _rollback_savepoint)
+        event.listen(Engine, 'release_savepoint', _release_savepoint)
+        event.listen(Pool, 'reset', _reset)
+
+
+def seed_text_codes(session_or_engine):
+    """
+    Add the codes of the known vocabularies, such as the instruments, to the text_code table.
+
+    Parameters
+    ----------
+    session_or_engine : :class:`~sqlalchemy.orm.Session` or :class:`~sqlalchemy.engine.Engine`
+        Database to add the codes to
+    """
+    def seed(connection):
+        for dictionary, vocabulary in _VOCABULARIES.items():
+            TEXT_CODES.ensure(connection, dictionary, vocabulary.values)
+
+    if isinstance(session_or_engine, Engine):
+        with session_or_engine.begin() as connection:
+            seed(connection)
+    else:
+        seed(session_or_engine.connection())
+
+
+def coordinate_type():
+    """
+    Get the column type for sky coordinates and angles.
+
+    Returns
+    -------
+    :class:`~sqlalchemy.types.TypeEngine`
+        Double precision float in the compact profile, else `Numeric(16, 12)`
+    """
+    if db_config.compact_schema:
+        return Float(precision=53, asdecimal=False)
+    return Numeric(precision=16, scale=12)
+
+
+def measurement_type(precision: int, scale: int):
+    """
+    Get the column type for a measured value, such as the airmass.
+
+    Parameters
+    ----------
+    precision : int
+        Number of digits of the `Numeric` type outside the compact profile
+    scale : int
+        Number of digits after the point of the `Numeric` type outside the compact profile
+
+    Returns
+    -------
+    :class:`~sqlalchemy.types.TypeEngine`
+        Double precision float in the compact profile, else `Numeric`
+    """
+    if db_config.compact_schema:
+        return Float(precision=53, asdecimal=False)
+    return Numeric(precision=precision, scale=scale)
+
+
+def coded_text_type(dictionary: str):
+    """
+    Get the column type for a string with few distinct values.
+
+    Parameters
+    ----------
+    dictionary : str
+        Name of the set of strings, see :class:`CodedText`
+
+    Returns
+    -------
+    :class:`~sqlalchemy.types.TypeEngine`
+        :class:`CodedText` in the compact profile, else `Text`
+    """
+    if db_config.compact_schema:
+        return CodedText(dictionary)
+    return Text()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index, and_
 from sqlalchemy import BigInteger, Integer, Text, Boolean, DateTime
 from sqlalchemy.orm import relation, relationship
 
@@ -7,6 +7,7 @@ import datetime
 import re
 
 from gemini_obs_db.utils.hashes import md5sum, md5sum_size_bz2
+from gemini_obs_db.utils.instrumentation import stage, count
 
 from gemini_obs_db.orm import Base
 from .file import File
@@ -91,8 +92,8 @@ class DiskFile(Base):
 
     filename = Column(Text, index=True)
     path = Column(Text)
-    present = Column(Boolean, index=True)
-    canonical = Column(Boolean, index=True)
+    present = Column(Boolean)
+    canonical = Column(Boolean)
     file_md5 = Column(Text)
     file_size = Column(BigInteger)
     lastmod = Column(DateTime(timezone=True), index=True)
@@ -146,9 +147,13 @@ class DiskFile(Base):
         self.present = True
         self.canonical = True
         self.entrytime = datetime.datetime.now()
-        self.file_size = self.get_file_size()
-        self.file_md5 = self.get_file_md5()
-        self.lastmod = self.get_lastmod()
+        with stage('diskfile.stat'):
+            self.file_size = self.get_file_size()
+        with stage('diskfile.file_md5'):
+            self.file_md5 = self.get_file_md5()
+        count('diskfile.bytes_read', self.file_size)
+        with stage('diskfile.stat'):
+            self.lastmod = self.get_lastmod()
 
         ts = _determine_timestamp_from_filename(given_filename)
         if ts is not None:
@@ -168,7 +173,9 @@ class DiskFile(Base):
                 if os.path.exists(self.uncompressed_cache_file):
                     os.unlink(self.uncompressed_cache_file)
 
-                os.system('bzcat %s > %s' % (self.fullpath(), self.uncompressed_cache_file))
+                with stage('diskfile.bzcat'):
+                    os.system('bzcat %s > %s' % (self.fullpath(), self.uncompressed_cache_file))
+                count('diskfile.bytes_read', self.file_size)
                 # TODO remove these lines once we are comfortable with the above
                 # in_file = bz2.BZ2File(self.fullpath(), mode='rb')
                 # out_file = open(self.uncompressed_cache_file, 'wb')
@@ -180,8 +187,12 @@ class DiskFile(Base):
                 self.uncompressed_cache_file = None
                 raise
 
-            self.data_md5 = self.get_data_md5()
-            self.data_size = self.get_data_size()
+            with stage('diskfile.data_md5'):
+                self.data_md5 = self.get_data_md5()
+            with stage('diskfile.stat'):
+                self.data_size = self.get_data_size()
+            if self.uncompressed_cache_file:
+                count('diskfile.bytes_read', self.data_size)
         else:
             self.compressed = False
             self.data_md5 = self.file_md5
@@ -290,3 +301,13 @@ class DiskFile(Base):
             A human radable representation of this :class:`~gemini_obs_db.orm.diskfile.DiskFile`
         """
         return "<DiskFile('%s', '%s', '%s', '%s')>" % (self.id, self.file_id, self.filename, self.path)
+
+
+# Searches only ever want the present, canonical diskfiles, so partial indexes
+# on just those rows serve the joins from header and from file, and are much
+# smaller than indexes on the two booleans
+_canonical_present = and_(DiskFile.__table__.c.canonical, DiskFile.__table__.c.present)
+Index('ix_diskfile_canonical_present_id', DiskFile.__table__.c.id,
+      postgresql_where=_canonical_present, sqlite_where=_canonical_present)
+Index('ix_diskfile_canonical_present_file_id', DiskFile.__table__.c.file_id,
+      postgresql_where=_canonical_present, sqlite_where=_canonical_present)
@@ -5,6 +5,8 @@ from sqlalchemy.orm import relation
 from gemini_obs_db.orm.header import Header
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
 
 
 __all__ = ["F2"]
@@ -26,8 +28,8 @@ class F2(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    disperser = Column(Text, index=True)
-    filter_name = Column(Text, index=True)
+    disperser = Column(coded_text_type('disperser'), index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     lyot_stop = Column(Text, index=True)
     read_mode = Column(Text, index=True)
     focal_plane_mask = Column(Text)
@@ -48,6 +50,7 @@ class F2(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='f2')
     def populate(self, ad):
         """
         Populate the F2 information from the given :class:`~astrodata.core.AstroData` object
@@ -0,0 +1,270 @@
+import json
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from sqlalchemy import Column, ForeignKey, and_, or_
+from sqlalchemy import Integer, Text, Boolean
+from sqlalchemy.orm import relation, Session
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coordinate_type
+from .header import Header
+
+
+__all__ = ["Footprint", "build_footprints", "overlapping_footprints", "footprints_containing"]
+
+
+class Footprint(Base):
+    """
+    This is the ORM class for the footprint table.  This stores the sky footprint of
+    each extension of a file, as computed by
+    :meth:`~gemini_obs_db.orm.header.Header.footprints`, so spatial searches
+    do not need to go back to the FITS files.
+
+    Each footprint keeps its polygon vertices and an RA/Dec bounding box.  The
+    bounding box is indexed for a quick first pass, the polygon is used for the
+    exact test.  A footprint that straddles RA 0 has `ra_max` above 360, so that
+    `ra_min` is always in [0, 360) and `ra_max` is always at least `ra_min`.  A
+    footprint that contains a pole spans every RA and is flagged with `polar`.
+
+    Parameters
+    ----------
+    header : :class:`~gemini_obs_db.orm.header.Header`
+        Header record this footprint belongs to
+    extension : str
+        Extension the footprint is for, 'PHU' or 'EXTNAME,EXTVER'
+    vertices : array
+        Sequence of (RA, Dec) polygon vertices in decimal degrees
+    """
+    __tablename__ = 'footprint'
+
+    id = Column(Integer, primary_key=True)
+    header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
+    header = relation(Header, order_by=id)
+    extension = Column(Text)
+    ra_min = Column(coordinate_type(), index=True)
+    ra_max = Column(coordinate_type(), index=True)
+    dec_min = Column(coordinate_type(), index=True)
+    dec_max = Column(coordinate_type(), index=True)
+    polar = Column(Boolean)
+    vertices = Column(Text)
+
+    def __init__(self, header: Header, extension: str, vertices):
+        """
+        Create a footprint record for an extension of the given header
+
+        Parameters
+        ----------
+        header : :class:`~gemini_obs_db.orm.header.Header`
+            Header record this footprint belongs to
+        extension : str
+            Extension the footprint is for, 'PHU' or 'EXTNAME,EXTVER'
+        vertices : array
+            Sequence of (RA, Dec) polygon vertices in decimal degrees
+        """
+        self.header = header
+        self.extension = extension
+        vertices = [(float(ra) % 360.0, float(dec)) for ra, dec in vertices]
+        self.vertices = json.dumps(vertices)
+        (self.ra_min, self.ra_max, self.dec_min, self.dec_max), self.polar = _bounding_box(vertices)
+
+    def __repr__(self):
+        return "<Footprint('%s', '%s', '%s')>" % (self.id, self.header_id, self.extension)
+
+    def polygon(self) -> List[Tuple[float, float]]:
+        """
+        Get the polygon vertices of this footprint
+
+        Returns
+        -------
+        list of tuple
+            (RA, Dec) vertices in decimal degrees
+        """
+        return [tuple(v) for v in json.loads(self.vertices)]
+
+
+def _unwrap_ra(ras: Sequence[float]) -> Tuple[List[float], float]:
+    """
+    Make a closed ring of RAs continuous, returning the unwrapped values and the total winding.
+    """
+    unwrapped = [ras[0]]
+    for ra in list(ras[1:]) + [ras[0]]:
+        delta = (ra - unwrapped[-1] + 180.0) % 360.0 - 180.0
+        unwrapped.append(unwrapped[-1] + delta)
+    return unwrapped[:-1], unwrapped[-1] - unwrapped[0]
+
+
+def _bounding_box(vertices: Sequence[Tuple[float, float]]):
+    """
+    Get the RA/Dec bounding box of a polygon and whether it contains a pole.
+    """
+    ras, winding = _unwrap_ra([v[0] for v in vertices])
+    decs = [v[1] for v in vertices]
+    if abs(winding) > 180.0:
+        # The polygon goes all the way round, so it contains a pole
+        if sum(decs) > 0:
+            return (0.0, 360.0, min(decs), 90.0), True
+        return (0.0, 360.0, -90.0, max(decs)), True
+    ra_min = min(ras)
+    offset = ra_min % 360.0 - ra_min
+    return (ra_min + offset, max(ras) + offset, min(decs), max(decs)), False
+
+
+def build_footprints(header: Header, ad) -> List[Footprint]:
+    """
+    Build the footprint records for a header from an :class:`astrodata.AstroData` instance.
+
+    This is intended to be called at ingest, right after the header is created.
+
+    Parameters
+    ----------
+    header : :class:`~gemini_obs_db.orm.header.Header`
+        Header record to build footprints for
+    ad : :class:`astrodata.AstroData`
+        AstroData object to read the footprints from
+
+    Returns
+    -------
+    list of :class:`~Footprint`
+        One footprint per extension that has a usable WCS
+    """
+    return [Footprint(header, extension, fp) for extension, fp in header.footprints(ad).items()]
+
+
+def _tangent_plane(ra: np.ndarray, dec: np.ndarray, ra0: float, dec0: float):
+    """
+    Gnomonic projection about (ra0, dec0), all in degrees.  Points more than 90 degrees away come out as None.
+    """
+    ra, dec, ra0, dec0 = np.radians(ra), np.radians(dec), math.radians(ra0), math.radians(dec0)
+    cos_c = math.sin(dec0) * np.sin(dec) + math.cos(dec0) * np.cos(dec) * np.cos(ra - ra0)
+    if np.any(cos_c <= 0):
+        return None
+    x = np.cos(dec) * np.sin(ra - ra0) / cos_c
+    y = (math.cos(dec0) * np.sin(dec) - math.sin(dec0) * np.cos(dec) * np.cos(ra - ra0)) / cos_c
+    return np.column_stack((x, y))
+
+
+def _point_in_polygon(point, polygon: np.ndarray) -> bool:
+    x, y = point
+    inside = False
+    n = len(polygon)
+    for i in range(n):
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[(i + 1) % n]
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def _segments_cross(p1, p2, q1, q2) -> bool:
+    def orient(a, b, c):
+        return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    d1 = orient(q1, q2, p1)
+    d2 = orient(q1, q2, p2)
+    d3 = orient(p1, p2, q1)
+    d4 = orient(p1, p2, q2)
+    return (d1 > 0) != (d2 > 0) and (d3 > 0) != (d4 > 0)
+
+
+def _polygons_overlap(a: np.ndarray, b: np.ndarray) -> bool:
+    """
+    Test whether two planar polygons overlap, by edge crossings or containment.
+    """
+    for i in range(len(a)):
+        for j in range(len(b)):
+            if _segments_cross(a[i], a[(i + 1) % len(a)], b[j], b[(j + 1) % len(b)]):
+                return True
+    return _point_in_polygon(a[0], b) or _point_in_polygon(b[0], a)
+
+
+def _bbox_filter(ra_min: float, ra_max: float, dec_min: float, dec_max: float, polar: bool = False):
+    """
+    SQL criteria for footprints whose bounding box overlaps the given one.
+
+    Both boxes use the convention that `ra_min` is in [0, 360) and `ra_max` may be
+    above 360, so we also have to check the query box shifted by a turn either way.
+    A polar box covers every RA, so only the Dec range is checked.
+    """
+    dec_criteria = and_(Footprint.dec_min <= dec_max, Footprint.dec_max >= dec_min)
+    if polar:
+        return dec_criteria
+    ra_criteria = [and_(Footprint.ra_min <= ra_max + shift, Footprint.ra_max >= ra_min + shift)
+                   for shift in (-360.0, 0.0, 360.0)]
+    return and_(dec_criteria, or_(Footprint.polar == True, *ra_criteria))
+
+
+def overlapping_footprints(session: Session, vertices: Sequence[Tuple[float, float]], query=None) \
+        -> List[Footprint]:
+    """
+    Find the footprints that overlap a polygon on the sky.
+
+    The indexed bounding boxes are used to select candidates in the database,
+    then the candidates are tested exactly against the polygon.  The exact test
+    is done in the tangent plane about the polygon's first vertex, so the
+    polygons should be well under a hemisphere in size, as footprints are.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    vertices : sequence
+        (RA, Dec) vertices of the polygon to search with, in decimal degrees
+    query : :class:`~sqlalchemy.orm.Query`
+        Optional query on :class:`~Footprint` to refine, for example to join
+        to the header and restrict by instrument
+
+    Returns
+    -------
+    list of :class:`~Footprint`
+        Footprints overlapping the polygon
+    """
+    vertices = [(float(ra) % 360.0, float(dec)) for ra, dec in vertices]
+    (ra_min, ra_max, dec_min, dec_max), polar = _bounding_box(vertices)
+    if query is None:
+        query = session.query(Footprint)
+    candidates = query.filter(_bbox_filter(ra_min, ra_max, dec_min, dec_max, polar)).all()
+
+    ra0, dec0 = vertices[0]
+    target = _tangent_plane(np.array([v[0] for v in vertices]), np.array([v[1] for v in vertices]), ra0, dec0)
+    results = list()
+    for footprint in candidates:
+        polygon = footprint.polygon()
+        projected = _tangent_plane(np.array([v[0] for v in polygon]), np.array([v[1] for v in polygon]), ra0, dec0)
+        if projected is not None and target is not None and _polygons_overlap(target, projected):
+            results.append(footprint)
+    return results
+
+
+def footprints_containing(session: Session, ra: float, dec: float, query=None) -> List[Footprint]:
+    """
+    Find the footprints that contain a position on the sky.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    ra : float
+        Right Ascension in decimal degrees
+    dec : float
+        Declination in decimal degrees
+    query : :class:`~sqlalchemy.orm.Query`
+        Optional query on :class:`~Footprint` to refine
+
+    Returns
+    -------
+    list of :class:`~Footprint`
+        Footprints containing the position
+    """
+    ra = float(ra) % 360.0
+    if query is None:
+        query = session.query(Footprint)
+    candidates = query.filter(_bbox_filter(ra, ra, dec, dec)).all()
+    results = list()
+    for footprint in candidates:
+        polygon = footprint.polygon()
+        projected = _tangent_plane(np.array([v[0] for v in polygon]), np.array([v[1] for v in polygon]), ra, dec)
+        if projected is not None and _point_in_polygon((0.0, 0.0), projected):
+            results.append(footprint)
+    return results
@@ -1,12 +1,14 @@
 from abc import abstractmethod
 
-from sqlalchemy import Column, ForeignKey, Numeric
+from sqlalchemy import Column, ForeignKey
 from sqlalchemy import Integer, Text, Boolean, Enum
 from sqlalchemy.orm import relation
 
 from .header import Header
 
 from . import Base
+from .compact import coded_text_type, measurement_type
+from gemini_obs_db.utils.instrumentation import timed
 
 # Enumerated column types
 READ_SPEED_SETTINGS = ['slow', 'medium', 'fast', 'standard', 'unknown']
@@ -162,8 +164,8 @@ class Ghost(Base):
     header = relation(Header, order_by=id)
     arm = Column(Text, index=True)
     want_before_arc = Column(Boolean)
-    disperser = Column(Text, index=True)
-    filter_name = Column(Text, index=True)
+    disperser = Column(coded_text_type('disperser'), index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     detector_name = Column(Text, index=True)
     detector_x_bin = Column(Integer, index=True)
     detector_y_bin = Column(Integer, index=True)
@@ -185,9 +187,9 @@ class Ghost(Base):
     detector_y_bin_blue = Column(Integer, index=True)
     detector_y_bin_red = Column(Integer, index=True)
     detector_y_bin_slitv = Column(Integer, index=True)
-    exposure_time_blue = Column(Numeric(precision=8, scale=4))
-    exposure_time_red = Column(Numeric(precision=8, scale=4))
-    exposure_time_slitv = Column(Numeric(precision=8, scale=4))
+    exposure_time_blue = Column(measurement_type(8, 4))
+    exposure_time_red = Column(measurement_type(8, 4))
+    exposure_time_slitv = Column(measurement_type(8, 4))
     gain_setting_blue = Column(GAIN_SETTING_ENUM, index=True)
     gain_setting_red = Column(GAIN_SETTING_ENUM, index=True)
     gain_setting_slitv = Column(GAIN_SETTING_ENUM, index=True)
@@ -214,6 +216,7 @@ class Ghost(Base):
         # Populate from the astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='ghost')
     def populate(self, ad):
         """
         Populate the Ghost information from the given :class:`astrodata.AstroData`
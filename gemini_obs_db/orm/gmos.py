@@ -5,6 +5,8 @@ from sqlalchemy.orm import relation
 from .header import Header
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
 
 
 __all__ = ["Gmos"]
@@ -36,8 +38,8 @@ class Gmos(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    disperser = Column(Text, index=True)
-    filter_name = Column(Text, index=True)
+    disperser = Column(coded_text_type('disperser'), index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     detector_x_bin = Column(Integer, index=True)
     detector_y_bin = Column(Integer, index=True)
     array_name = Column(Text, index=True)
@@ -69,6 +71,7 @@ class Gmos(Base):
         # Populate from the astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='gmos')
     def populate(self, ad):
         """
         Populate GMOS record from AstroData instance
@@ -1,8 +1,11 @@
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy import Integer, Text, Enum
+from sqlalchemy import Integer, Text
 from sqlalchemy.orm import relation
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
+from gemini_obs_db.utils.vocabulary import Vocabulary
 from .header import Header
 
 
@@ -10,12 +13,12 @@ __all__ = ["Gnirs"]
 
 
 # Enumerated Column types
-READ_MODES = ['Very Faint Objects', 'Faint Objects', 'Bright Objects',
-              'Very Bright Objects', 'Invalid']
+READ_MODES = Vocabulary('gnirs_read_mode', ['Very Faint Objects', 'Faint Objects', 'Bright Objects',
+                                             'Very Bright Objects', 'Invalid'])
 
-READ_MODE_ENUM = Enum(*READ_MODES, name='gnirs_read_mode')
-WELL_DEPTH_SETTINGS = ['Shallow', 'Deep', 'Invalid']
-WELL_DEPTH_SETTING_ENUM = Enum(*WELL_DEPTH_SETTINGS, name='gnirs_well_depth_setting')
+READ_MODE_ENUM = READ_MODES.enum()
+WELL_DEPTH_SETTINGS = Vocabulary('gnirs_well_depth_setting', ['Shallow', 'Deep', 'Invalid'])
+WELL_DEPTH_SETTING_ENUM = WELL_DEPTH_SETTINGS.enum()
 
 
 class Gnirs(Base):
@@ -34,8 +37,8 @@ class Gnirs(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    disperser = Column(Text, index=True)
-    filter_name = Column(Text, index=True)
+    disperser = Column(coded_text_type('disperser'), index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     read_mode = Column(READ_MODE_ENUM, index=True)
     well_depth_setting = Column(WELL_DEPTH_SETTING_ENUM, index=True)
     camera = Column(Text, index=True)
@@ -57,6 +60,7 @@ class Gnirs(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='gnirs')
     def populate(self, ad):
         """
         Populate this GNIRS record from the given astrodata
@@ -3,6 +3,8 @@ from sqlalchemy import Integer, Text, Boolean
 from sqlalchemy.orm import relation
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
 from .header import Header
 
 
@@ -26,8 +28,8 @@ class Gpi(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    filter_name = Column(Text, index=True)
-    disperser = Column(Text, index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
+    disperser = Column(coded_text_type('disperser'), index=True)
     focal_plane_mask = Column(Text, index=True)
     pupil_mask = Column(Text, index=True)
     astrometric_standard = Column(Boolean, index=True)
@@ -50,6 +52,7 @@ class Gpi(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='gpi')
     def populate(self, ad):
         """
         Populate this GPI record from the given AstroData object
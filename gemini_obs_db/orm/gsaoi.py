@@ -3,6 +3,8 @@ from sqlalchemy import Integer, Text
 from sqlalchemy.orm import relation
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
 from .header import Header
 
 
@@ -25,7 +27,7 @@ class Gsaoi(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    filter_name = Column(Text, index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     read_mode = Column(Text, index=True)
 
     def __init__(self, header, ad):
@@ -44,6 +46,7 @@ class Gsaoi(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='gsaoi')
     def populate(self, ad):
         """
         Populate the GSAOI information from the astrodata object
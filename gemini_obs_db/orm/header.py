@@ -1,26 +1,32 @@
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy import Integer, Text, DateTime
-from sqlalchemy import Numeric, Boolean, Date
+from sqlalchemy import Boolean, Date
 from sqlalchemy import Time, BigInteger, Enum
 
 from sqlalchemy.orm import relation
 
 import datetime
+from typing import Union
+
+import numpy as np
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type, coordinate_type, measurement_type
 from gemini_obs_db.orm.diskfile import DiskFile
 from gemini_obs_db.utils.file_parser import build_parser
+from gemini_obs_db.utils.instrumentation import stage, timed, timed_parser
 
-from gemini_obs_db.utils.gemini_metadata_utils import GeminiProgram, procmode_codes
+from gemini_obs_db.utils.gemini_metadata_utils import GeminiProgram, PROCMODES
 
 from gemini_obs_db.utils.gemini_metadata_utils import gemini_gain_settings
 from gemini_obs_db.utils.gemini_metadata_utils import gemini_readspeed_settings
 from gemini_obs_db.utils.gemini_metadata_utils import gemini_welldepth_settings
 from gemini_obs_db.utils.gemini_metadata_utils import gemini_readmode_settings
+from gemini_obs_db.utils.spatial import healpix_index
+from gemini_obs_db.utils.tan_projection import tan_parameters, tan_footprints
 
 from astropy import wcs as pywcs
 from astropy.wcs import SingularMatrixError
-from astropy.io import fits
 
 
 __all__ = ["Header"]
@@ -39,7 +45,7 @@ try:
 except:
     pass
 
-from gemini_obs_db.utils.gemini_metadata_utils import obs_types, obs_classes, reduction_states
+from gemini_obs_db.utils.gemini_metadata_utils import OBSERVATION_TYPES, OBSERVATION_CLASSES, REDUCTION_STATES
 
 
 # ------------------------------------------------------------------------------
@@ -47,10 +53,10 @@ from gemini_obs_db.utils.gemini_metadata_utils import obs_types, obs_classes, re
 gemini_readmode_settings = [i.replace(' ', '_') for i in gemini_readmode_settings]
 
 # Enumerated Column types
-PROCMODE_ENUM = Enum(*procmode_codes, name='procmode')
-OBSTYPE_ENUM = Enum(*obs_types, name='obstype')
-OBSCLASS_ENUM = Enum(*obs_classes, name='obsclass')
-REDUCTION_STATE_ENUM = Enum(*reduction_states, name='reduction_state')
+PROCMODE_ENUM = PROCMODES.enum()
+OBSTYPE_ENUM = OBSERVATION_TYPES.enum()
+OBSCLASS_ENUM = OBSERVATION_CLASSES.enum()
+REDUCTION_STATE_ENUM = REDUCTION_STATES.enum()
 TELESCOPE_ENUM = Enum('Gemini-North', 'Gemini-South', name='telescope')
 QASTATE_ENUM = Enum('Fail', 'CHECK', 'Undefined', 'Usable', 'Pass', name='qa_state')
 MODE_ENUM = Enum('imaging', 'spectroscopy', 'LS', 'MOS', 'IFS', 'IFP', name='mode')
@@ -70,39 +76,49 @@ class Header(Base):
         The file this header is taken from
     """
     __tablename__ = 'header'
+    # Composite indexes for the usual combinations of search filters.  Most
+    # other columns are only searched together with one of these, so they
+    # are not indexed on their own, which keeps ingest fast
+    __table_args__ = (
+        Index('ix_header_instrument_ut_datetime_secs', 'instrument', 'ut_datetime_secs'),
+        Index('ix_header_observation_type_class_instrument', 'observation_type', 'observation_class', 'instrument'),
+        Index('ix_header_program_id_ut_datetime', 'program_id', 'ut_datetime'),
+    )
 
     id = Column(Integer, primary_key=True)
     diskfile_id = Column(Integer, ForeignKey('diskfile.id'), nullable=False, index=True)
     diskfile = relation(DiskFile, order_by=id)
-    program_id = Column(Text, index=True)
-    engineering = Column(Boolean, index=True)
-    science_verification = Column(Boolean, index=True)
-    calibration_program = Column(Boolean, index=True)
+    program_id = Column(Text)
+    engineering = Column(Boolean)
+    science_verification = Column(Boolean)
+    calibration_program = Column(Boolean)
     procmode = Column(PROCMODE_ENUM)
     observation_id = Column(Text, index=True)
     data_label = Column(Text, index=True)
-    telescope = Column(TELESCOPE_ENUM, index=True)
-    instrument = Column(Text, index=True)
+    telescope = Column(TELESCOPE_ENUM)
+    instrument = Column(coded_text_type('instrument'))
     ut_datetime = Column(DateTime(timezone=False), index=True)
-    ut_datetime_secs = Column(BigInteger, index=True)
+    ut_datetime_secs = Column(BigInteger)
     local_time = Column(Time(timezone=False))
-    observation_type = Column(OBSTYPE_ENUM, index=True)
-    observation_class = Column(OBSCLASS_ENUM, index=True)
+    observation_type = Column(OBSTYPE_ENUM)
+    observation_class = Column(OBSCLASS_ENUM)
     object = Column(Text, index=True)
-    ra = Column(Numeric(precision=16, scale=12), index=True)
-    dec = Column(Numeric(precision=16, scale=12), index=True)
-    azimuth = Column(Numeric(precision=16, scale=12))
-    elevation = Column(Numeric(precision=16, scale=12))
-    cass_rotator_pa = Column(Numeric(precision=16, scale=12))
-    airmass = Column(Numeric(precision=8, scale=6))
-    filter_name = Column(Text, index=True)
-    exposure_time = Column(Numeric(precision=8, scale=4))
-    disperser = Column(Text, index=True)
-    camera = Column(Text, index=True)
-    central_wavelength = Column(Numeric(precision=8, scale=6), index=True)
+    ra = Column(coordinate_type())
+    dec = Column(coordinate_type())
+    # NESTED HEALPix pixel of ra/dec at HEALPIX_ORDER, for cone searches, see utils.spatial
+    healpix = Column(BigInteger, index=True)
+    azimuth = Column(coordinate_type())
+    elevation = Column(coordinate_type())
+    cass_rotator_pa = Column(coordinate_type())
+    airmass = Column(measurement_type(8, 6))
+    filter_name = Column(coded_text_type('filter_name'))
+    exposure_time = Column(measurement_type(8, 4))
+    disperser = Column(coded_text_type('disperser'))
+    camera = Column(Text)
+    central_wavelength = Column(measurement_type(8, 6))
     wavelength_band = Column(Text)
-    focal_plane_mask = Column(Text, index=True)
-    pupil_mask = Column(Text, index=True)
+    focal_plane_mask = Column(Text)
+    pupil_mask = Column(Text)
     detector_binning = Column(Text)
     detector_roi_setting = Column(Text)
     detector_gain_setting = Column(DETECTOR_GAIN_ENUM)
@@ -110,8 +126,8 @@ class Header(Base):
     detector_welldepth_setting = Column(DETECTOR_WELLDEPTH_ENUM)
     detector_readmode_setting = Column(Text)
     coadds = Column(Integer)
-    spectroscopy = Column(Boolean, index=True)
-    mode = Column(MODE_ENUM, index=True)
+    spectroscopy = Column(Boolean)
+    mode = Column(MODE_ENUM)
     adaptive_optics = Column(Boolean)
     laser_guide_star = Column(Boolean)
     wavefront_sensor = Column(Text)
@@ -124,9 +140,9 @@ class Header(Base):
     requested_cc = Column(Integer)
     requested_wv = Column(Integer)
     requested_bg = Column(Integer)
-    qa_state = Column(QASTATE_ENUM, index=True)
+    qa_state = Column(QASTATE_ENUM)
     release = Column(Date)
-    reduction = Column(REDUCTION_STATE_ENUM, index=True)
+    reduction = Column(REDUCTION_STATE_ENUM)
     # added per Trac #264, Support for Gemini South All Sky Camera
     site_monitoring = Column(Boolean)
     types = Column(Text)
@@ -141,6 +157,7 @@ class Header(Base):
     def __repr__(self):
         return "<Header('%s', '%s')>" % (self.id, self.diskfile_id)
 
+    @timed('header.populate_fits')
     def populate_fits(self, diskfile: DiskFile, log=None):
         """
         Populates header table values from the FITS headers of the file.
@@ -162,8 +179,9 @@ class Header(Base):
                 fullpath = diskfile.uncompressed_cache_file
             else:
                 fullpath = diskfile.fullpath()
-            ad = astrodata.open(fullpath)
-        parser = build_parser(ad, log)
+            with stage('header.astrodata_open'):
+                ad = astrodata.open(fullpath)
+        parser = timed_parser(build_parser(ad, log))
 
         # Check for site_monitoring data. Currently, this only comprises
         # GS_ALLSKYCAMERA, but may accommodate other monitoring data.
@@ -202,6 +220,7 @@ class Header(Base):
 
         self.ra = parser.ra()
         self.dec = parser.dec()
+        self.healpix = healpix_index(self.ra, self.dec)
 
         self.azimuth = parser.azimuth()
         self.elevation = parser.elevation()
@@ -254,53 +273,109 @@ class Header(Base):
 
         return
 
+    @timed('header.footprints')
     def footprints(self, ad: astrodata.AstroData):
         """
         Set footprints based on information in an :class:`astrodata.AstroData` instance.
 
         This method extracts the WCS from the AstroData instance and uses that to build
-        footprint information.
+        footprint information.  Plain RA---TAN/DEC--TAN extensions are projected all
+        together by :func:`~gemini_obs_db.utils.tan_projection.tan_footprints`, other
+        projections go through :class:`astropy.wcs.WCS`.
 
         Parameters
         ----------
         ad : :class:`astrodata.AstroData`
             AstroData object to read footprints from
         """
-        retary = {}
+        # Array shapes come from the NAXISn keywords in the headers astrodata has
+        # already parsed, so we never need to re-open the file or read any pixels
+        headers = list(ad.hdr)
+        default_shape = _header_shape(headers[0]) if headers else None
+        candidates = list()
         # Horrible hack - GNIRS etc has the WCS for the extension in the PHU!
         if ad.tags.intersection({'GNIRS', 'MICHELLE', 'NIFS'}):
             # If we're not in an RA/Dec TANgent frame, don't even bother
-            if (ad.phu.get('CTYPE1') == 'RA---TAN') and (ad.phu.get('CTYPE2') == 'DEC--TAN'):
-                hdulist = fits.open(ad.path)
-                wcs = pywcs.WCS(hdulist[0].header)
-                wcs.array_shape = hdulist[1].data.shape
-                try:
-                    fp = wcs.calc_footprint()
-                    retary['PHU'] = fp
-                except SingularMatrixError:
-                    # WCS was all zeros.
-                    pass
+            if (ad.phu.get('CTYPE1') == 'RA---TAN') and (ad.phu.get('CTYPE2') == 'DEC--TAN') \
+                    and default_shape is not None:
+                candidates.append(('PHU', ad.phu, default_shape))
         else:
             # If we're not in an RA/Dec TANgent frame, don't even bother
-            # try using fitsio here too
-            hdulist = fits.open(ad.path)
-            for (hdu, hdr) in zip(hdulist[1:], ad.hdr): # ad.hdr:
+            for hdr in headers:
                 if (hdr.get('CTYPE1') == 'RA---TAN') and (hdr.get('CTYPE2') == 'DEC--TAN'):
                     extension = "%s,%s" % (hdr.get('EXTNAME'), hdr.get('EXTVER'))
-                    wcs = pywcs.WCS(hdu.header)
-                    if hdu.data is not None and hdu.data.shape:
-                        shpe = hdu.data.shape
-                        if len(shpe) == 3 and shpe[0] == 1:
-                            shpe = shpe[1:]
-                            wcs = pywcs.WCS(hdu.header, naxis=2)
-                        wcs.array_shape = shpe
-                    elif hdulist[1].data is not None and hdulist[1].data.shape:
-                        wcs.array_shape = hdulist[1].data.shape
-                    try:
-                        fp = wcs.calc_footprint()
-                        retary[extension] = fp
-                    except SingularMatrixError:
-                        # WCS was all zeros.
-                        pass
-
-        return retary
+                    shpe = _header_shape(hdr) or default_shape
+                    if shpe is not None:
+                        candidates.append((extension, hdr, shpe))
+
+        return _calc_footprints(candidates)
+
+
+def _header_shape(hdr) -> Union[tuple, None]:
+    """
+    Get the shape of the data array described by a FITS header, in NumPy order.
+
+    This reads the NAXIS and NAXISn keywords only, so the data is never touched.
+
+    Parameters
+    ----------
+    hdr : :class:`astropy.io.fits.Header`
+        Header to read
+
+    Returns
+    -------
+    tuple or None
+        Shape of the data, or None if the header has no data
+    """
+    naxis = hdr.get('NAXIS') or 0
+    if naxis <= 0:
+        return None
+    shape = tuple(int(hdr.get('NAXIS%d' % i) or 0) for i in range(naxis, 0, -1))
+    if not all(shape):
+        return None
+    return shape
+
+
+def _calc_footprints(candidates: list) -> dict:
+    """
+    Calculate the footprints for a list of (extension, header, shape).
+
+    Plain TAN projections are done together in one vectorized call, anything
+    else falls back to building an astropy WCS for the extension.
+    """
+    retary = dict()
+    tan = list()
+    for extension, hdr, shpe in candidates:
+        naxis = None
+        if len(shpe) == 3 and shpe[0] == 1:
+            shpe = shpe[1:]
+            naxis = 2
+        params = tan_parameters(hdr) if len(shpe) == 2 else None
+        if params is not None:
+            retary[extension] = None
+            tan.append((extension, params, (shpe[1], shpe[0])))
+        else:
+            fp = _calc_footprint(pywcs.WCS(hdr, naxis=naxis), shpe)
+            if fp is not None:
+                retary[extension] = fp
+    if tan:
+        fps = tan_footprints([t[1][0] for t in tan], [t[1][1] for t in tan], [t[1][2] for t in tan],
+                             [t[2] for t in tan])
+        for (extension, _, _), fp in zip(tan, fps):
+            retary[extension] = fp
+    return retary
+
+
+def _calc_footprint(wcs: pywcs.WCS, shape: tuple) -> Union[np.ndarray, None]:
+    """
+    Calculate the footprint of a 2D image of the given shape.
+
+    Returns None if the shape is not 2D or the WCS is degenerate.
+    """
+    if len(shape) != 2 or wcs.naxis != 2:
+        return None
+    try:
+        return wcs.calc_footprint(axes=(shape[1], shape[0]))
+    except SingularMatrixError:
+        # WCS was all zeros.
+        return None
@@ -0,0 +1,169 @@
+"""
+This module holds the named loading profiles for the ORM relationships.
+
+The relationships between the tables are all lazy by default, which is the
+right choice for ingest, where a record is built and its relations are rarely
+read.  A listing that shows the file name of a few hundred headers, though,
+then runs a query per row for the diskfile and another for the file, and
+more again for the previews or provenance.
+
+A loading profile names a set of eager loading strategies for the
+relationships hanging off a :class:`~gemini_obs_db.orm.diskfile.DiskFile`:
+
+`lazy`
+    Nothing is loaded eagerly, as without a profile
+`summary`
+    The diskfile and its file are joined into the main query
+`detail`
+    As `summary`, plus the previews, provenance and provenance history,
+    each with one extra SELECT ... IN query for all the rows
+
+The profiles can be applied to queries for
+:class:`~gemini_obs_db.orm.diskfile.DiskFile`,
+:class:`~gemini_obs_db.orm.header.Header`, or any table with a `header`
+relation, such as the instrument tables.  The path from there to the diskfile
+is always joined in.
+
+`File.diskfiles` is a dynamic relationship, a query rather than a list, so it
+can not be loaded eagerly.  Query from the diskfiles instead.
+"""
+from typing import List
+
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
+
+from .diskfile import DiskFile
+from .header import Header
+
+
+__all__ = ["LOADING_PROFILES", "loading_options", "apply_loading_profile", "query_headers", "query_diskfiles"]
+
+
+# Loading strategies of each profile, as (strategy, relationship of DiskFile) pairs
+LOADING_PROFILES = {
+    'lazy': (),
+    'summary': (
+        ('joined', DiskFile.file),
+    ),
+    'detail': (
+        ('joined', DiskFile.file),
+        ('selectin', DiskFile.previews),
+        ('selectin', DiskFile.provenance),
+        ('selectin', DiskFile.provenance_history),
+    ),
+}
+
+_LOADERS = {
+    'joined': joinedload,
+    'selectin': selectinload,
+}
+
+
+def _path_to_diskfile(entity) -> list:
+    """
+    Get the many-to-one relationships leading from an ORM class to its diskfile.
+    """
+    if entity is DiskFile:
+        return []
+    if entity is Header:
+        return [Header.diskfile]
+    header = getattr(entity, 'header', None)
+    if header is not None and getattr(header.property, 'mapper', None) is not None \
+            and header.property.mapper.class_ is Header:
+        return [header, Header.diskfile]
+    raise ValueError("No loading profiles for %s, it is not linked to a diskfile"
+                     % getattr(entity, '__name__', entity))
+
+
+def loading_options(entity, profile: str) -> List:
+    """
+    Build the loader options of a profile, for queries on an ORM class.
+
+    Parameters
+    ----------
+    entity : class
+        ORM class being queried, such as :class:`~gemini_obs_db.orm.header.Header`
+    profile : str
+        Name of the profile, one of :data:`LOADING_PROFILES`
+
+    Returns
+    -------
+    list
+        Loader options to pass to :meth:`~sqlalchemy.orm.query.Query.options`
+    """
+    try:
+        strategies = LOADING_PROFILES[profile]
+    except KeyError:
+        raise ValueError("Unknown loading profile %s" % profile)
+    if not strategies:
+        return []
+    prefix = _path_to_diskfile(entity)
+    options = list()
+    for strategy, attr in strategies:
+        # Each option joins the path down to the diskfile, then loads its relationship
+        option = None
+        for step, loader in [(p, joinedload) for p in prefix] + [(attr, _LOADERS[strategy])]:
+            option = loader(step) if option is None else getattr(option, loader.__name__)(step)
+        options.append(option)
+    return options
+
+
+def apply_loading_profile(query: Query, profile: str, entity=None) -> Query:
+    """
+    Apply a loading profile to a query.
+
+    Parameters
+    ----------
+    query : :class:`~sqlalchemy.orm.query.Query`
+        Query to apply the profile to
+    profile : str
+        Name of the profile, one of :data:`LOADING_PROFILES`
+    entity : class
+        ORM class the profile starts from, defaults to the first entity of the query
+
+    Returns
+    -------
+    :class:`~sqlalchemy.orm.query.Query`
+        The query with the loader options added
+    """
+    if entity is None:
+        entity = query.column_descriptions[0]['entity']
+    options = loading_options(entity, profile)
+    return query.options(*options) if options else query
+
+
+def query_headers(session: Session, profile: str = 'summary') -> Query:
+    """
+    Query the headers, with a loading profile.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    profile : str
+        Name of the profile, one of :data:`LOADING_PROFILES`
+
+    Returns
+    -------
+    :class:`~sqlalchemy.orm.query.Query`
+        Query for :class:`~gemini_obs_db.orm.header.Header`, to filter further
+    """
+    return apply_loading_profile(session.query(Header), profile, Header)
+
+
+def query_diskfiles(session: Session, profile: str = 'summary') -> Query:
+    """
+    Query the diskfiles, with a loading profile.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    profile : str
+        Name of the profile, one of :data:`LOADING_PROFILES`
+
+    Returns
+    -------
+    :class:`~sqlalchemy.orm.query.Query`
+        Query for :class:`~gemini_obs_db.orm.diskfile.DiskFile`, to filter further
+    """
+    return apply_loading_profile(session.query(DiskFile), profile, DiskFile)
@@ -1,35 +1,39 @@
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy import Integer, Enum
+from sqlalchemy import Integer
 from sqlalchemy.orm import relation
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.utils.instrumentation import timed
 from .header import Header
+from gemini_obs_db.utils.vocabulary import Vocabulary
 
 
 __all__ = ["Michelle"]
 
 
-READ_MODES = ['CHOP', 'NDCHOP', 'STARE', 'chop', 'stare', 'nod', 'chop-nod']
-READ_MODE_ENUM = Enum(*READ_MODES, name='michelle_read_mode')
+READ_MODES = Vocabulary('michelle_read_mode', ['CHOP', 'NDCHOP', 'STARE', 'chop', 'stare', 'nod', 'chop-nod'])
+READ_MODE_ENUM = READ_MODES.enum()
 
 # Now that the instrument is decomissioned, we can emum these for efficiency
-DISPERSERS = ['Echelle', 'LowN', 'LowQ', 'MedN1', 'MedN2', 'No Value', 'unknown']
-DISPERSER_ENUM = Enum(*DISPERSERS, name='michelle_disperser')
+DISPERSERS = Vocabulary('michelle_disperser', ['Echelle', 'LowN', 'LowQ', 'MedN1', 'MedN2', 'No Value', 'unknown'])
+DISPERSER_ENUM = DISPERSERS.enum()
 
-FILTERS = ['blank', 'BothBlanks', 'Clear', 'Clear_A', 'F112B21', 'F116B9','F125B9',
+FILTERS = Vocabulary('michelle_filter', [
+           'blank', 'BothBlanks', 'Clear', 'Clear_A', 'F112B21', 'F116B9','F125B9',
            'F209B42L', 'F66LB', 'F86B2', 'I103B10', 'I105B53', 'I107B4', 'I112B21',
            'I116B9', 'I125B9', 'I128B2', 'I185B9', 'I198B27', 'I209B42', 'I79B10',
            'I86B2', 'I88B10', 'I97B10', 'IP103B10', 'IP112B21', 'IP116B9', 'IP125B9',
            'IP185B9', 'IP198B27', 'IP79B10', 'IP88B10', 'IP97B10', 'No Value',
-           'NPBlock', 'Poly', 'QBlock']
+           'NPBlock', 'Poly', 'QBlock'])
 
-FILTER_NAME_ENUM = Enum(*FILTERS, name='michelle_filter')
+FILTER_NAME_ENUM = FILTERS.enum()
 
-FOCAL_PLANE_MASKS = ['4_pixels', 'unknown', '8_pixels', 'No Value', '1_pixel',
-                     '2_pixels', '3_pixels', '6_pixels', 'pinholeMask', '16_pixels',
-                     'None']
+FOCAL_PLANE_MASKS = Vocabulary('michelle_focal_plane_mask', [
+    '4_pixels', 'unknown', '8_pixels', 'No Value', '1_pixel',
+    '2_pixels', '3_pixels', '6_pixels', 'pinholeMask', '16_pixels',
+    'None'])
 
-FOCAL_PLANE_MAKE_ENUM = Enum(*FOCAL_PLANE_MASKS, name='michelle_focal_plane_mask')
+FOCAL_PLANE_MAKE_ENUM = FOCAL_PLANE_MASKS.enum()
 
 
 class Michelle(Base):
@@ -70,6 +74,7 @@ class Michelle(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='michelle')
     def populate(self, ad):
         """
         Populate the Michelle record data from an :class:`astrodata.core.AstroData` object
@@ -1,23 +1,28 @@
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy import Integer, Text, Enum
+from sqlalchemy import Integer
 from sqlalchemy.orm import relation
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
+from gemini_obs_db.utils.vocabulary import Vocabulary
 from .header import Header
 
 
 __all__ = ["Nici"]
 
 
-FOCAL_PLANE_MASKS = ['Clear_G5710', 'F0.22_G5715', 'F0.32_G5714', 'F0.46_G5713', 
-                     'F0.65_G5712', 'F0.90_G5711', 'Grid_G5716']
+FOCAL_PLANE_MASKS = Vocabulary('nici_focal_plane_mask', [
+    'Clear_G5710', 'F0.22_G5715', 'F0.32_G5714', 'F0.46_G5713',
+    'F0.65_G5712', 'F0.90_G5711', 'Grid_G5716'])
 
-FOCAL_PLANE_MASK_ENUM = Enum(*FOCAL_PLANE_MASKS, name='nici_focal_plane_mask')
+FOCAL_PLANE_MASK_ENUM = FOCAL_PLANE_MASKS.enum()
 
-DISPERSERS = ['Block', 'H-50/50_G5701', 'H-CH4-Dichroic_G5704', 
-              'H/K-Dichroic_G5705', 'Mirror_G5702', 'Open']
+DISPERSERS = Vocabulary('nici_disperser', [
+    'Block', 'H-50/50_G5701', 'H-CH4-Dichroic_G5704',
+    'H/K-Dichroic_G5705', 'Mirror_G5702', 'Open'])
 
-DISPERSER_ENUM = Enum(*DISPERSERS, name='nici_disperser')
+DISPERSER_ENUM = DISPERSERS.enum()
 
 
 class Nici(Base):
@@ -36,7 +41,7 @@ class Nici(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    filter_name = Column(Text, index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     focal_plane_mask = Column(FOCAL_PLANE_MASK_ENUM, index=True)
     disperser = Column(DISPERSER_ENUM, index=True)
 
@@ -57,6 +62,7 @@ class Nici(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='nici')
     def populate(self, ad):
         """
         Populate the NICI record data from an :class:`~astrodata.core.AstroData` object
@@ -1,16 +1,19 @@
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy import Integer, Text, Enum
+from sqlalchemy import Integer, Text
 from sqlalchemy.orm import relation
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
+from gemini_obs_db.utils.vocabulary import Vocabulary
 from .header import Header
 
 
 __all__ = ["Nifs"]
 
 
-READ_MODES = ['Faint Object', 'Medium Object', 'Bright Object', 'Invalid']
-READ_MODE_ENUM = Enum(*READ_MODES, name='nifs_read_mode')
+READ_MODES = Vocabulary('nifs_read_mode', ['Faint Object', 'Medium Object', 'Bright Object', 'Invalid'])
+READ_MODE_ENUM = READ_MODES.enum()
 
 
 class Nifs(Base):
@@ -29,8 +32,8 @@ class Nifs(Base):
     id = Column(Integer, primary_key=True)
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
-    disperser = Column(Text, index=True)
-    filter_name = Column(Text, index=True)
+    disperser = Column(coded_text_type('disperser'), index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     read_mode = Column(READ_MODE_ENUM, index=True)
     focal_plane_mask = Column(Text)
 
@@ -51,6 +54,7 @@ class Nifs(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='nifs')
     def populate(self, ad):
         """
         Populate the NIFS record data from an :class:`~astrodata.core.AstroData` object
@@ -1,42 +1,47 @@
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy import Integer, Text, Enum
+from sqlalchemy import Integer, Text
 from sqlalchemy.orm import relation
 
 from .header import Header
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.compact import coded_text_type
+from gemini_obs_db.utils.instrumentation import timed
+from gemini_obs_db.utils.vocabulary import Vocabulary
 
 
 __all__ = ["Niri"]
 
 
 # Enumerated Column types
-READ_MODES = ['High Background', 'Medium Background', 'Low Background', 'Invalid']
-READ_MODE_ENUM = Enum(*READ_MODES, name='niri_read_mode')
+READ_MODES = Vocabulary('niri_read_mode', ['High Background', 'Medium Background', 'Low Background', 'Invalid'])
+READ_MODE_ENUM = READ_MODES.enum()
 
-WELL_DEPTHS = ['Shallow', 'Deep', 'Invalid']
-WELL_DEPTH_SETTING_ENUM = Enum(*WELL_DEPTHS, name='niri_well_depth_setting')
+WELL_DEPTHS = Vocabulary('niri_well_depth_setting', ['Shallow', 'Deep', 'Invalid'])
+WELL_DEPTH_SETTING_ENUM = WELL_DEPTHS.enum()
 
 # Spectroscopy is decommissioned, so go ahead and enumerate the dispersers
-DISPERSERS = ['Hgrismf32_G5228', 'Hgrism_G5203', 'Jgrismf32_G5226', 'Jgrism_G5202',
-              'Kgrismf32_G5227', 'Kgrism_G5204', 'Lgrism_G5205', 'Mgrism_G5206',
-              'MIRROR']
+DISPERSERS = Vocabulary('niri_disperser', [
+    'Hgrismf32_G5228', 'Hgrism_G5203', 'Jgrismf32_G5226', 'Jgrism_G5202',
+    'Kgrismf32_G5227', 'Kgrism_G5204', 'Lgrism_G5205', 'Mgrism_G5206',
+    'MIRROR'])
 
-DISPERSER_ENUM = Enum(*DISPERSERS, name='niri_disperser')
+DISPERSER_ENUM = DISPERSERS.enum()
 
 # Very unlikely to get get new ones of these:
-CAMERAS = ['datum', 'f13.9', 'f14', 'f32', 'f6', 'INVALID', 'No Value', 'UNKNOWN']
-CAMERA_ENUM = Enum(*CAMERAS, name='niri_camera')
+CAMERAS = Vocabulary('niri_camera', ['datum', 'f13.9', 'f14', 'f32', 'f6', 'INVALID', 'No Value', 'UNKNOWN'])
+CAMERA_ENUM = CAMERAS.enum()
 
-DATA_SECTIONS = ['Section(x1=0, x2=1024, y1=0, y2=1024)',
-                 'Section(x1=0, x2=256, y1=0, y2=256)',
-                 'Section(x1=0, x2=512, y1=0, y2=512)',
-                 'Section(x1=0, x2=768, y1=0, y2=768)',
-                 'Section(x1=256, x2=769, y1=0, y2=1024)',
-                 'Section(x1=256, x2=769, y1=256, y2=768)',
-                 'Section(x1=64, x2=192, y1=64, y2=192)', 'None']
+DATA_SECTIONS = Vocabulary('niri_data_section', [
+    'Section(x1=0, x2=1024, y1=0, y2=1024)',
+    'Section(x1=0, x2=256, y1=0, y2=256)',
+    'Section(x1=0, x2=512, y1=0, y2=512)',
+    'Section(x1=0, x2=768, y1=0, y2=768)',
+    'Section(x1=256, x2=769, y1=0, y2=1024)',
+    'Section(x1=256, x2=769, y1=256, y2=768)',
+    'Section(x1=64, x2=192, y1=64, y2=192)', 'None'])
 
-DATA_SECTION_ENUM = Enum(*DATA_SECTIONS, name='niri_data_section')
+DATA_SECTION_ENUM = DATA_SECTIONS.enum()
 
 
 class Niri(Base):
@@ -56,7 +61,7 @@ class Niri(Base):
     header_id = Column(Integer, ForeignKey('header.id'), nullable=False, index=True)
     header = relation(Header, order_by=id)
     disperser = Column(DISPERSER_ENUM, index=True)
-    filter_name = Column(Text, index=True)
+    filter_name = Column(coded_text_type('filter_name'), index=True)
     read_mode = Column(READ_MODE_ENUM, index=True)
     well_depth_setting = Column(WELL_DEPTH_SETTING_ENUM, index=True)
     data_section = Column(DATA_SECTION_ENUM, index=True)
@@ -80,6 +85,7 @@ class Niri(Base):
         # Populate from an astrodata object
         self.populate(ad)
 
+    @timed('instrument.populate', instrument='niri')
     def populate(self, ad):
         """
         Populate the NIRI record data from an :class:`~astrodata.core.AstroData` object
@@ -106,11 +112,7 @@ class Niri(Base):
         try:
             data_sections = ad.data_section()
             if data_sections is not None and len(data_sections):
-                data_section = str(ad.data_section()[0])
-                if data_section in DATA_SECTIONS:
-                    self.data_section = data_section
-                else:
-                    self.data_section = 'None'
+                self.data_section = DATA_SECTIONS.get(str(data_sections[0]), 'None')
             else:
                 self.data_section = 'None'
         except TypeError:
@@ -1,13 +1,16 @@
 from datetime import datetime
+from typing import Iterable, Tuple
 
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy import Integer, Text, DateTime, String
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, Session
 
 from gemini_obs_db.orm import Base
+from gemini_obs_db.utils.instrumentation import timed
 
 
-__all__ = ["Provenance", "ProvenanceHistory", "ingest_provenance"]
+__all__ = ["Provenance", "ProvenanceHistory", "ingest_provenance", "bulk_ingest_provenance",
+           "parse_provenance_timestamp"]
 
 # from .diskfile import DiskFile
 
@@ -99,6 +102,59 @@ class ProvenanceHistory(Base):
         self.args = args
 
 
+def parse_provenance_timestamp(ts_str: str) -> datetime:
+    """
+    Parse a provenance timestamp.
+
+    DRAGONS writes these in the fixed format ``YYYY-MM-DD HH:MM:SS.ffffff``,
+    sometimes with a 'T' separator.  That layout is sliced out directly, which
+    is much faster than `strptime`.  Anything else falls back to `strptime`
+    with the usual formats.
+
+    Parameters
+    ----------
+    ts_str : str
+        Timestamp to parse
+
+    Returns
+    -------
+    datetime
+        The parsed timestamp
+    """
+    if len(ts_str) > 20 and ts_str[4] == '-' and ts_str[7] == '-' and ts_str[10] in ' T' \
+            and ts_str[13] == ':' and ts_str[16] == ':' and ts_str[19] == '.':
+        frac = ts_str[20:]
+        if frac.isdigit() and len(frac) <= 6:
+            try:
+                return datetime(int(ts_str[0:4]), int(ts_str[5:7]), int(ts_str[8:10]),
+                                int(ts_str[11:13]), int(ts_str[14:16]), int(ts_str[17:19]),
+                                int(frac.ljust(6, '0')))
+            except ValueError:
+                pass
+    if 'T' in ts_str:
+        return datetime.strptime(ts_str, PROVENANCE_DATE_FORMAT_ISO)
+    else:
+        return datetime.strptime(ts_str, PROVENANCE_DATE_FORMAT)
+
+
+def _provenance_rows(ad) -> Tuple[list, list]:
+    """
+    Read the provenance and provenance history out of an AstroData object as tuples.
+    """
+    prov_rows = list()
+    hist_rows = list()
+    provenance = getattr(ad, 'PROVENANCE', None)
+    if provenance:
+        for prov in provenance:
+            prov_rows.append((parse_provenance_timestamp(prov[0]), prov[1], prov[2], prov[3]))
+    provenance_history = getattr(ad, 'PROVENANCE_HISTORY', None)
+    if provenance_history:
+        for ph in provenance_history:
+            hist_rows.append((parse_provenance_timestamp(ph[0]), parse_provenance_timestamp(ph[1]), ph[2], ph[3]))
+    return prov_rows, hist_rows
+
+
+@timed('provenance.ingest')
 def ingest_provenance(diskfile):
     """
     Ingest the provenance data from the diskfile into the database.
@@ -115,36 +171,81 @@ def ingest_provenance(diskfile):
     -------
     None
     """
-    def _parse_timestamp(ts_str):
-        if 'T' in ts_str:
-            return datetime.strptime(timestamp_str, PROVENANCE_DATE_FORMAT_ISO)
-        else:
-            return datetime.strptime(timestamp_str, PROVENANCE_DATE_FORMAT)
-    ad = diskfile.ad_object
-    if hasattr(ad, 'PROVENANCE'):
-        provenance = ad.PROVENANCE
-        if provenance:
-            prov_list = list()
-            for prov in provenance:
-                timestamp_str = prov[0]
-                timestamp = _parse_timestamp(timestamp_str)
-                filename = prov[1]
-                md5 = prov[2]
-                provenance_added_by = prov[3]
-                prov_row = Provenance(timestamp, filename, md5, provenance_added_by)
-                prov_list.append(prov_row)
-            diskfile.provenance = prov_list
-    if hasattr(ad, 'PROVENANCE_HISTORY'):
-        provenance_history = ad.PROVENANCE_HISTORY
-        if provenance_history:
-            hist_list = list()
-            for ph in provenance_history:
-                timestamp_start_str = ph[0]
-                timestamp_stop_str = ph[1]
-                timestamp_start = _parse_timestamp(timestamp_start_str)
-                timestamp_stop = _parse_timestamp(timestamp_stop_str)
-                primitive = ph[2]
-                args = ph[3]
-                hist = ProvenanceHistory(timestamp_start, timestamp_stop, primitive, args)
-                hist_list.append(hist)
-            diskfile.provenance_history = hist_list
+    prov_rows, hist_rows = _provenance_rows(diskfile.ad_object)
+    if prov_rows:
+        diskfile.provenance = [Provenance(*row) for row in prov_rows]
+    if hist_rows:
+        diskfile.provenance_history = [ProvenanceHistory(*row) for row in hist_rows]
+
+
+def bulk_ingest_provenance(session: Session, diskfiles: Iterable) -> Tuple[int, int]:
+    """
+    Ingest the provenance data for many diskfiles at once.
+
+    This does the same job as :func:`ingest_provenance`, but without building
+    ORM objects.  All the rows for all the diskfiles go in with one
+    executemany INSERT per table.  Provenance that is already recorded for a
+    diskfile is not inserted again, so it is safe to run this again for a
+    file that is re-ingested.
+
+    The diskfiles must have their `ad_object` set.  Any that have not been
+    flushed yet are flushed first, to give them their ids.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to write the provenance with
+    diskfiles : iterable of :class:`~gemini_obs_db.orm.diskfile.Diskfile`
+        diskfiles to read provenance data out of
+
+    Returns
+    -------
+    tuple of int
+        Number of provenance and provenance history rows inserted
+    """
+    diskfiles = list(diskfiles)
+    if any(df.id is None for df in diskfiles):
+        session.flush()
+
+    prov_by_id = dict()
+    hist_by_id = dict()
+    for df in diskfiles:
+        prov_rows, hist_rows = _provenance_rows(df.ad_object)
+        if prov_rows:
+            prov_by_id.setdefault(df.id, list()).extend(prov_rows)
+        if hist_rows:
+            hist_by_id.setdefault(df.id, list()).extend(hist_rows)
+
+    prov_table = Provenance.__table__
+    hist_table = ProvenanceHistory.__table__
+    prov_columns = ('timestamp', 'filename', 'md5', 'primitive')
+    hist_columns = ('timestamp_start', 'timestamp_end', 'primitive', 'args')
+
+    def _new_rows(table, columns, by_id):
+        if not by_id:
+            return list()
+        existing = set(session.query(table.c.diskfile_id, *[table.c[c] for c in columns])
+                       .filter(table.c.diskfile_id.in_(list(by_id.keys()))))
+        rows = list()
+        for diskfile_id, entries in by_id.items():
+            for entry in entries:
+                key = (diskfile_id, ) + entry
+                if key not in existing:
+                    existing.add(key)
+                    row = dict(zip(columns, entry))
+                    row['diskfile_id'] = diskfile_id
+                    rows.append(row)
+        return rows
+
+    prov_rows = _new_rows(prov_table, prov_columns, prov_by_id)
+    hist_rows = _new_rows(hist_table, hist_columns, hist_by_id)
+    if prov_rows:
+        session.execute(prov_table.insert(), prov_rows)
+    if hist_rows:
+        session.execute(hist_table.insert(), hist_rows)
+    for df in diskfiles:
+        if df.id in prov_by_id:
+            session.expire(df, ['provenance'])
+        if df.id in hist_by_id:
+            session.expire(df, ['provenance_history'])
+    return len(prov_rows), len(hist_rows)
@@ -0,0 +1,274 @@
+"""
+This module holds the provenance graph, an indexed adjacency table of file lineage.
+
+The :class:`~gemini_obs_db.orm.provenance.Provenance` records of a processed
+file name its inputs by filename and md5.  Walking the lineage of a product
+from those means a query per generation.  Here the inputs are resolved to
+:class:`~gemini_obs_db.orm.file.File` and
+:class:`~gemini_obs_db.orm.diskfile.DiskFile` ids once, at ingest, and stored
+as edges.  The ancestors or descendants of a file, to any depth, are then a
+single recursive query.
+
+The graph is walked between files.  Only edges recorded for the canonical
+diskfile of a product are followed, so older versions of a file that has been
+re-ingested do not contribute stale lineage.
+"""
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import Column, ForeignKey, Integer, Text, String, and_, bindparam, cast, func, literal, or_, select
+from sqlalchemy.orm import relationship, Session
+
+from gemini_obs_db.orm import Base
+from .file import File
+from .diskfile import DiskFile
+from .provenance import Provenance
+
+
+__all__ = ["ProvenanceEdge", "build_provenance_edges", "resolve_provenance_edges", "ancestors", "descendants",
+           "MAX_LINEAGE_DEPTH"]
+
+
+# Depth limit for lineage queries, this also stops a walk round any cycle in the graph
+MAX_LINEAGE_DEPTH = 100
+
+
+class ProvenanceEdge(Base):
+    """
+    This is the ORM class for the provenance_edge table.  Each row links a
+    processed diskfile to one of the inputs named in its provenance.
+
+    The input is resolved by md5 to the exact diskfile that was used, or failing
+    that by filename to the file.  Inputs that are not in the database yet are
+    kept with only their name and md5, and can be resolved later with
+    :func:`resolve_provenance_edges`.
+
+    Parameters
+    ----------
+    diskfile_id : int
+        id of the processed :class:`~gemini_obs_db.orm.diskfile.DiskFile`
+    file_id : int
+        id of the processed :class:`~gemini_obs_db.orm.file.File`
+    provenance_id : int
+        id of the :class:`~gemini_obs_db.orm.provenance.Provenance` record this edge was built from
+    parent_filename : str
+        Filename of the input, as recorded in the provenance
+    parent_md5 : str
+        MD5 checksum of the input, as recorded in the provenance
+    """
+    __tablename__ = 'provenance_edge'
+
+    id = Column(Integer, primary_key=True)
+    diskfile_id = Column(Integer, ForeignKey('diskfile.id'), nullable=False, index=True)
+    diskfile = relationship(DiskFile, foreign_keys=[diskfile_id])
+    file_id = Column(Integer, ForeignKey('file.id'), nullable=False, index=True)
+    provenance_id = Column(Integer, ForeignKey('provenance.id'), index=True)
+    parent_filename = Column(String(128))
+    parent_md5 = Column(Text)
+    parent_file_id = Column(Integer, ForeignKey('file.id'), index=True)
+    parent_diskfile_id = Column(Integer, ForeignKey('diskfile.id'), index=True)
+    parent_diskfile = relationship(DiskFile, foreign_keys=[parent_diskfile_id])
+
+    def __init__(self, diskfile_id: int, file_id: int, provenance_id: int, parent_filename: str, parent_md5: str):
+        """
+        Create an unresolved provenance edge
+
+        Parameters
+        ----------
+        diskfile_id : int
+            id of the processed :class:`~gemini_obs_db.orm.diskfile.DiskFile`
+        file_id : int
+            id of the processed :class:`~gemini_obs_db.orm.file.File`
+        provenance_id : int
+            id of the :class:`~gemini_obs_db.orm.provenance.Provenance` record this edge was built from
+        parent_filename : str
+            Filename of the input, as recorded in the provenance
+        parent_md5 : str
+            MD5 checksum of the input, as recorded in the provenance
+        """
+        self.diskfile_id = diskfile_id
+        self.file_id = file_id
+        self.provenance_id = provenance_id
+        self.parent_filename = parent_filename
+        self.parent_md5 = parent_md5
+
+    def __repr__(self):
+        return "<ProvenanceEdge('%s', '%s', '%s')>" % (self.id, self.file_id, self.parent_file_id)
+
+
+def _resolve(session: Session, names: Iterable[str], md5s: Iterable[str]) -> Tuple[dict, dict]:
+    """
+    Look up input files by name and diskfiles by md5, returning dicts of name to file id
+    and md5 to (file id, diskfile id).
+    """
+    names = list(set(File.trim_name(n) for n in names if n))
+    md5s = list(set(m for m in md5s if m))
+    by_name = dict()
+    by_md5 = dict()
+    if names:
+        by_name = dict(session.query(File.name, File.id).filter(File.name.in_(names)))
+    if md5s:
+        # Prefer the canonical diskfile when several have the same checksum
+        query = session.query(DiskFile.data_md5, DiskFile.file_md5, DiskFile.file_id, DiskFile.id,
+                              DiskFile.canonical) \
+            .filter(or_(DiskFile.data_md5.in_(md5s), DiskFile.file_md5.in_(md5s)))
+        for data_md5, file_md5, file_id, diskfile_id, _ in sorted(query, key=lambda r: (bool(r[4]), r[3])):
+            for md5 in (data_md5, file_md5):
+                if md5 is not None:
+                    by_md5[md5] = (file_id, diskfile_id)
+    return by_name, by_md5
+
+
+def build_provenance_edges(session: Session, diskfiles: Iterable[DiskFile]) -> int:
+    """
+    Build the provenance edges for some diskfiles from their provenance records.
+
+    This is intended to be called at ingest, once the provenance is in the
+    database, for example after
+    :func:`~gemini_obs_db.orm.provenance.bulk_ingest_provenance`.  Any edges
+    already recorded for the diskfiles are replaced, so it is safe to call
+    again.  All the lookups are done in a couple of queries for the whole
+    batch and the edges are written with one executemany INSERT.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to use
+    diskfiles : iterable of :class:`~gemini_obs_db.orm.diskfile.DiskFile`
+        Processed diskfiles to build the edges for
+
+    Returns
+    -------
+    int
+        Number of edges written
+    """
+    diskfiles = list(diskfiles)
+    if any(df.id is None for df in diskfiles):
+        session.flush()
+    file_ids = {df.id: df.file_id for df in diskfiles}
+    if not file_ids:
+        return 0
+
+    edge_table = ProvenanceEdge.__table__
+    session.execute(edge_table.delete().where(edge_table.c.diskfile_id.in_(list(file_ids.keys()))))
+    provenance = session.query(Provenance.id, Provenance.diskfile_id, Provenance.filename, Provenance.md5) \
+        .filter(Provenance.diskfile_id.in_(list(file_ids.keys()))).all()
+    by_name, by_md5 = _resolve(session, [p.filename for p in provenance], [p.md5 for p in provenance])
+
+    rows = list()
+    for provenance_id, diskfile_id, filename, md5 in provenance:
+        parent_file_id, parent_diskfile_id = by_md5.get(md5, (None, None))
+        if parent_file_id is None and filename:
+            parent_file_id = by_name.get(File.trim_name(filename))
+        rows.append(dict(diskfile_id=diskfile_id, file_id=file_ids[diskfile_id], provenance_id=provenance_id,
+                         parent_filename=filename, parent_md5=md5, parent_file_id=parent_file_id,
+                         parent_diskfile_id=parent_diskfile_id))
+    if rows:
+        session.execute(edge_table.insert(), rows)
+    return len(rows)
+
+
+def resolve_provenance_edges(session: Session) -> int:
+    """
+    Resolve provenance edges whose inputs were not in the database when they were built.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to use
+
+    Returns
+    -------
+    int
+        Number of edges resolved
+    """
+    edge_table = ProvenanceEdge.__table__
+    pending = session.query(ProvenanceEdge.id, ProvenanceEdge.parent_filename, ProvenanceEdge.parent_md5) \
+        .filter(ProvenanceEdge.parent_file_id == None).all()
+    if not pending:
+        return 0
+    by_name, by_md5 = _resolve(session, [p.parent_filename for p in pending], [p.parent_md5 for p in pending])
+    updates = list()
+    for edge_id, filename, md5 in pending:
+        parent_file_id, parent_diskfile_id = by_md5.get(md5, (None, None))
+        if parent_file_id is None and filename:
+            parent_file_id = by_name.get(File.trim_name(filename))
+        if parent_file_id is not None:
+            updates.append(dict(edge_id=edge_id, parent_file_id=parent_file_id,
+                                parent_diskfile_id=parent_diskfile_id))
+    if updates:
+        session.execute(edge_table.update().where(edge_table.c.id == bindparam('edge_id'))
+                        .values(parent_file_id=bindparam('parent_file_id'),
+                                parent_diskfile_id=bindparam('parent_diskfile_id')), updates)
+    return len(updates)
+
+
+def _walk(session: Session, file_id: int, max_depth: int, upward: bool) -> List[Tuple[int, int]]:
+    """
+    Walk the provenance graph from a file with a recursive query.
+
+    Returns (file id, depth) pairs, with the shortest depth at which each file is reached.
+    """
+    edge = ProvenanceEdge.__table__
+    diskfile = DiskFile.__table__
+    if max_depth is None:
+        max_depth = MAX_LINEAGE_DEPTH
+    # Only follow edges recorded for the canonical version of each product
+    edges = edge.join(diskfile, and_(diskfile.c.id == edge.c.diskfile_id, diskfile.c.canonical == True))
+    source, target = (edge.c.file_id, edge.c.parent_file_id) if upward else (edge.c.parent_file_id, edge.c.file_id)
+
+    lineage = select([target.label('file_id'), cast(literal(1), Integer).label('depth')]) \
+        .select_from(edges).where(and_(source == file_id, target != None)) \
+        .cte('lineage', recursive=True)
+    step = select([target, lineage.c.depth + 1]) \
+        .select_from(edges.join(lineage, source == lineage.c.file_id)) \
+        .where(and_(lineage.c.depth < max_depth, target != None))
+    lineage = lineage.union(step)
+
+    query = select([lineage.c.file_id, func.min(lineage.c.depth)]) \
+        .where(lineage.c.file_id != file_id) \
+        .group_by(lineage.c.file_id).order_by(func.min(lineage.c.depth), lineage.c.file_id)
+    return [(row[0], row[1]) for row in session.execute(query)]
+
+
+def ancestors(session: Session, file_id: int, max_depth: int = None) -> List[Tuple[int, int]]:
+    """
+    Find the files that went into a file, recursively, in a single query.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    file_id : int
+        id of the :class:`~gemini_obs_db.orm.file.File` to find the inputs of
+    max_depth : int
+        Number of generations to go back, 1 for the direct inputs only.  Defaults
+        to :data:`MAX_LINEAGE_DEPTH`
+
+    Returns
+    -------
+    list of tuple
+        (file id, depth) of each ancestor, nearest first
+    """
+    return _walk(session, file_id, max_depth, upward=True)
+
+
+def descendants(session: Session, file_id: int, max_depth: int = None) -> List[Tuple[int, int]]:
+    """
+    Find the files that were made from a file, recursively, in a single query.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    file_id : int
+        id of the :class:`~gemini_obs_db.orm.file.File` to find the products of
+    max_depth : int
+        Number of generations to go forward, 1 for the direct products only.  Defaults
+        to :data:`MAX_LINEAGE_DEPTH`
+
+    Returns
+    -------
+    list of tuple
+        (file id, depth) of each descendant, nearest first
+    """
+    return _walk(session, file_id, max_depth, upward=False)
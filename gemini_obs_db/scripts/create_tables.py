@@ -2,7 +2,7 @@
 
 from argparse import ArgumentParser
 
-from gemini_obs_db.utils.createtables import create_tables, drop_tables
+from gemini_obs_db.utils.createtables import create_indexes, create_tables, drop_tables
 
 from gemini_obs_db.db import session_scope
 from gemini_obs_db import db_config as dbc
@@ -20,6 +20,14 @@ if __name__ == "__main__":
                         help="Drop the tables first")
     parser.add_argument("--nocreate", action="store_true", dest="nocreate",
                         help="Do not actually create the tables")
+    parser.add_argument("--defer-indexes", action="store_true", dest="defer_indexes",
+                        help="Create the tables without their secondary indexes, for a bulk load")
+    parser.add_argument("--build-indexes", action="store_true", dest="build_indexes",
+                        help="Build the indexes missing from the tables, such as after a bulk load")
+    parser.add_argument("--concurrently", action="store_true", dest="concurrently",
+                        help="Build the indexes without locking out writes (PostgreSQL only)")
+    parser.add_argument("--jobs", action="store", type=int, dest="jobs", default=1,
+                        help="Number of indexes to build at the same time (PostgreSQL only)")
     parser.add_argument("--url", action="store", dest="url",
                         help="Database URL for SqlAlchemy", default=dbc.database_url)
 
@@ -34,6 +42,10 @@ if __name__ == "__main__":
 
         if not args.nocreate:
             print("Creating database tables")
-            create_tables(session)
+            create_tables(session, defer_indexes=args.defer_indexes)
+
+        if args.build_indexes:
+            print("Building database indexes")
+            create_indexes(session, concurrently=args.concurrently, jobs=args.jobs)
 
     print("You may now want to ingest the standard star list")
@@ -5,7 +5,9 @@ in the Fits Storage System.
 from sqlalchemy.orm import Session
 
 import gemini_obs_db.db as db
-# from gemini_obs_db.db import pg_db
+from gemini_obs_db import db_config
+from gemini_obs_db.orm import Base
+# Imported so that their tables are in the metadata
 from gemini_obs_db.orm.file import File
 from gemini_obs_db.orm.diskfile import DiskFile
 from gemini_obs_db.orm.header import Header
@@ -20,33 +22,71 @@ from gemini_obs_db.orm.gsaoi import Gsaoi
 from gemini_obs_db.orm.nici import Nici
 from gemini_obs_db.orm.michelle import Michelle
 from gemini_obs_db.orm.calcache import CalCache
+from gemini_obs_db.orm.footprint import Footprint
+from gemini_obs_db.orm.provenance_graph import ProvenanceEdge
+from gemini_obs_db.orm.canonical_header import create_canonical_header, drop_canonical_header
+from gemini_obs_db.orm.compact import seed_text_codes
+from gemini_obs_db.utils.indexes import build_indexes, without_secondary_indexes
+from gemini_obs_db.utils.partitioning import create_partitions, partitioned_metadata
 
 
-def create_tables(session: Session):
+def _partitioning() -> bool:
+    return bool(db_config.partitioning) and db.pg_db.dialect.name == 'postgresql'
+
+
+def create_tables(session: Session, defer_indexes: bool = False):
     """
     Creates the database tables and grants the apache user
     SELECT on the appropriate ones
 
+    All the tables share one metadata, so they are created in a single pass.
+    For a bulk load into a new database, create them with `defer_indexes`,
+    load the data, and then build the indexes with :func:`create_indexes`.
+
     Parameters
     ----------
     session : :class:`Session`
         Session to create tables in
+    defer_indexes : bool
+        If True, leave out the indexes that are not unique
     """
+    if _partitioning():
+        # The partitioned tables, and those that refer to them, need different DDL
+        metadata = partitioned_metadata()
+    else:
+        metadata = Base.metadata
+    if defer_indexes:
+        metadata = without_secondary_indexes(metadata)
+
     # Create the tables
-    File.metadata.create_all(bind=db.pg_db)
-    DiskFile.metadata.create_all(bind=db.pg_db)
-    Header.metadata.create_all(bind=db.pg_db)
-    Gmos.metadata.create_all(bind=db.pg_db)
-    Niri.metadata.create_all(bind=db.pg_db)
-    Nifs.metadata.create_all(bind=db.pg_db)
-    Gnirs.metadata.create_all(bind=db.pg_db)
-    F2.metadata.create_all(bind=db.pg_db)
-    Ghost.metadata.create_all(bind=db.pg_db)
-    Gpi.metadata.create_all(bind=db.pg_db)
-    Gsaoi.metadata.create_all(bind=db.pg_db)
-    Michelle.metadata.create_all(bind=db.pg_db)
-    Nici.metadata.create_all(bind=db.pg_db)
-    CalCache.metadata.create_all(bind=db.pg_db)
+    metadata.create_all(bind=db.pg_db)
+    if _partitioning():
+        create_partitions(db.pg_db)
+
+    if db_config.compact_schema:
+        seed_text_codes(db.pg_db)
+
+    # The search view is built from the tables, so it goes last
+    create_canonical_header(db.pg_db)
+
+
+def create_indexes(session: Session, concurrently: bool = False, jobs: int = 1, log=None):
+    """
+    Builds the indexes missing from the database tables, such as
+    after a bulk load into tables created with `defer_indexes`
+
+    Parameters
+    ----------
+    session : :class:`Session`
+        Session to create indexes in
+    concurrently : bool
+        On PostgreSQL, build the indexes without locking out writes
+    jobs : int
+        On PostgreSQL, number of indexes to build at the same time
+    log : :class:`logging.Logger`
+        Logger to report each index to
+    """
+    build_indexes(db.pg_db, concurrently=concurrently, jobs=jobs, log=log)
 
 
 def drop_tables(session: Session):
@@ -58,4 +98,8 @@ def drop_tables(session: Session):
     session : :class:`Session`
         Session to create tables in
     """
-    File.metadata.drop_all(bind=db.pg_db)
+    drop_canonical_header(db.pg_db)
+    if _partitioning():
+        partitioned_metadata().drop_all(bind=db.pg_db)
+    else:
+        Base.metadata.drop_all(bind=db.pg_db)
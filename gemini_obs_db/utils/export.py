@@ -0,0 +1,302 @@
+"""
+This module provides a columnar export of the header table for analytics.
+
+The :class:`~gemini_obs_db.orm.header.Header` rows are joined with their
+:class:`~gemini_obs_db.orm.diskfile.DiskFile` and the instrument specific table
+and streamed out to Parquet or Arrow IPC files.  The output is partitioned in
+the usual ``key=value`` directory layout by instrument and UT date, so tools
+such as pyarrow datasets, pandas, DuckDB or Spark can scan it directly.
+
+Exports are incremental.  The highest header id when an export starts is saved as a
+watermark in the destination folder and the next export only picks up newer
+rows.
+
+This needs the optional `pyarrow` package.
+"""
+import json
+import os
+import re
+from decimal import Decimal
+from typing import Union
+
+from sqlalchemy import select, and_, or_, func, Integer, BigInteger, SmallInteger, Numeric, Float, Boolean, DateTime, \
+    Date, Time
+from sqlalchemy.orm import Session
+
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.orm.f2 import F2
+from gemini_obs_db.orm.ghost import Ghost
+from gemini_obs_db.orm.gmos import Gmos
+from gemini_obs_db.orm.gnirs import Gnirs
+from gemini_obs_db.orm.gpi import Gpi
+from gemini_obs_db.orm.gsaoi import Gsaoi
+from gemini_obs_db.orm.michelle import Michelle
+from gemini_obs_db.orm.nici import Nici
+from gemini_obs_db.orm.nifs import Nifs
+from gemini_obs_db.orm.niri import Niri
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+__all__ = ["EXPORT_FORMATS", "INSTRUMENT_TABLES", "read_watermark", "export_headers"]
+
+
+EXPORT_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Instrument specific tables, keyed by the instrument name as stored in the header
+INSTRUMENT_TABLES = {
+    'F2': F2,
+    'GHOST': Ghost,
+    'GMOS-N': Gmos,
+    'GMOS-S': Gmos,
+    'GNIRS': Gnirs,
+    'GPI': Gpi,
+    'GSAOI': Gsaoi,
+    'michelle': Michelle,
+    'NICI': Nici,
+    'NIFS': Nifs,
+    'NIRI': Niri,
+}
+
+WATERMARK_FILENAME = '_watermark.json'
+
+_unsafe_path_re = re.compile(r'[^\w.+-]')
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("Columnar export requires the pyarrow package")
+
+
+def _arrow_type(column):
+    """
+    Get the Arrow data type to use for a SQLAlchemy column.
+    """
+    coltype = column.type
+    if isinstance(coltype, Boolean):
+        return pyarrow.bool_()
+    if isinstance(coltype, BigInteger):
+        return pyarrow.int64()
+    if isinstance(coltype, SmallInteger):
+        return pyarrow.int16()
+    if isinstance(coltype, Integer):
+        return pyarrow.int32()
+    if isinstance(coltype, (Numeric, Float)):
+        return pyarrow.float64()
+    if isinstance(coltype, DateTime):
+        return pyarrow.timestamp('us', tz='UTC' if coltype.timezone else None)
+    if isinstance(coltype, Date):
+        return pyarrow.date32()
+    if isinstance(coltype, Time):
+        return pyarrow.time64('us')
+    return pyarrow.string()
+
+
+def _export_columns(instrument_class=None) -> list:
+    """
+    Get the labelled columns to select for an export.
+
+    Header columns keep their names.  DiskFile and instrument columns are
+    prefixed by their table name.  The redundant ids are left out.
+    """
+    columns = [c.label(c.name) for c in Header.__table__.columns]
+    columns.extend(c.label('diskfile_%s' % c.name) for c in DiskFile.__table__.columns
+                   if c.name != 'id')
+    if instrument_class is not None:
+        table = instrument_class.__table__
+        columns.extend(c.label('%s_%s' % (table.name, c.name)) for c in table.columns
+                       if c.name not in ('id', 'header_id'))
+    return columns
+
+
+def _export_queries(since_id: int, until_id: int, canonical_only: bool):
+    """
+    Generate the export selects, one for each instrument table and one for everything else.
+
+    Headers are outer joined to their instrument table, so a header that is missing its
+    instrument record is still exported.
+    """
+    header = Header.__table__
+    diskfile = DiskFile.__table__
+    base = header.join(diskfile, diskfile.c.id == header.c.diskfile_id)
+
+    def _finish(stmt):
+        stmt = stmt.where(and_(header.c.id > since_id, header.c.id <= until_id))
+        if canonical_only:
+            stmt = stmt.where(diskfile.c.canonical == True)
+        return stmt.order_by(header.c.id)
+
+    for instrument_class in sorted(set(INSTRUMENT_TABLES.values()), key=lambda c: c.__tablename__):
+        instruments = [k for k, v in INSTRUMENT_TABLES.items() if v is instrument_class]
+        table = instrument_class.__table__
+        columns = _export_columns(instrument_class)
+        stmt = select(columns).select_from(base.outerjoin(table, table.c.header_id == header.c.id)) \
+            .where(header.c.instrument.in_(instruments))
+        yield table.name, columns, _finish(stmt)
+
+    columns = _export_columns()
+    stmt = select(columns).select_from(base) \
+        .where(or_(header.c.instrument == None, ~header.c.instrument.in_(list(INSTRUMENT_TABLES.keys()))))
+    yield header.name, columns, _finish(stmt)
+
+
+def _partition_value(value) -> str:
+    if value is None:
+        return 'unknown'
+    return _unsafe_path_re.sub('_', str(value))
+
+
+class _PartitionedWriter:
+    """
+    Buffers rows per (instrument, UT date) partition and writes them out as files.
+
+    Once the total number of buffered rows reaches `max_rows`, every partition
+    is written out.  This bounds the memory use of the export regardless of
+    how many rows it covers.
+    """
+    def __init__(self, destination: str, fmt: str, columns: list, max_rows: int):
+        self.destination = destination
+        self.suffix = EXPORT_FORMATS[fmt]
+        self.fmt = fmt
+        self.names = [c.name for c in columns]
+        self.schema = pyarrow.schema([(c.name, _arrow_type(c)) for c in columns])
+        self.decimal_fields = [i for i, c in enumerate(columns) if isinstance(c.type, (Numeric, Float))]
+        self.instrument_index = self.names.index('instrument')
+        self.datetime_index = self.names.index('ut_datetime')
+        self.id_index = self.names.index('id')
+        self.max_rows = max_rows
+        self.buffered = 0
+        self.partitions = dict()
+        self.files_written = 0
+
+    def add(self, row):
+        ut_datetime = row[self.datetime_index]
+        key = (row[self.instrument_index], ut_datetime.date() if ut_datetime is not None else None)
+        self.partitions.setdefault(key, []).append(row)
+        self.buffered += 1
+        if self.buffered >= self.max_rows:
+            self.flush()
+
+    def _table(self, rows):
+        columns = [list(c) for c in zip(*rows)]
+        for i in self.decimal_fields:
+            columns[i] = [float(v) if isinstance(v, Decimal) else v for v in columns[i]]
+        return pyarrow.Table.from_arrays([pyarrow.array(values, type=field.type)
+                                          for values, field in zip(columns, self.schema)],
+                                         schema=self.schema)
+
+    def flush(self):
+        for (instrument, ut_date), rows in self.partitions.items():
+            folder = os.path.join(self.destination, 'instrument=%s' % _partition_value(instrument),
+                                  'ut_date=%s' % _partition_value(ut_date))
+            os.makedirs(folder, exist_ok=True)
+            filename = os.path.join(folder, 'part-%d-%d%s' % (rows[0][self.id_index], rows[-1][self.id_index],
+                                                              self.suffix))
+            table = self._table(rows)
+            if self.fmt == 'parquet':
+                pyarrow.parquet.write_table(table, filename)
+            else:
+                with pyarrow.OSFile(filename, 'wb') as sink:
+                    with pyarrow.ipc.new_file(sink, self.schema) as writer:
+                        writer.write_table(table)
+            self.files_written += 1
+        self.partitions = dict()
+        self.buffered = 0
+
+
+def read_watermark(destination: str) -> int:
+    """
+    Read the export watermark for a destination folder.
+
+    Parameters
+    ----------
+    destination : str
+        Folder holding a previous export
+
+    Returns
+    -------
+    int
+        Highest header id already exported, or 0 if nothing has been exported yet
+    """
+    try:
+        with open(os.path.join(destination, WATERMARK_FILENAME)) as f:
+            return int(json.load(f)['header_id'])
+    except FileNotFoundError:
+        return 0
+
+
+def _write_watermark(destination: str, header_id: int):
+    filename = os.path.join(destination, WATERMARK_FILENAME)
+    with open(filename + '.tmp', 'w') as f:
+        json.dump({'header_id': header_id}, f)
+    os.replace(filename + '.tmp', filename)
+
+
+def export_headers(session: Session, destination: str, fmt: str = 'parquet', since_id: Union[int, None] = None,
+                   batch_size: int = 50000, canonical_only: bool = True, log=None) -> int:
+    """
+    Export the header table, with diskfile and instrument details, to partitioned columnar files.
+
+    Rows are streamed from the database with a server-side cursor where the
+    database supports it, and at most `batch_size` rows are held in memory
+    before being written out.  Each instrument table gives a different set of
+    columns, so every file holds a single instrument's rows.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to read the headers with
+    destination : str
+        Folder to write the partitioned export to
+    fmt : str
+        Output format, 'parquet' or 'arrow' (Arrow IPC files)
+    since_id : int
+        Only export headers with an id above this, defaults to the watermark saved in `destination`
+    batch_size : int
+        Number of rows to fetch and buffer at a time
+    canonical_only : bool
+        If True, only export headers for canonical diskfiles, defaults to True
+    log : :class:`logging.Logger`
+        Logger to log progress to
+
+    Returns
+    -------
+    int
+        The new watermark, which is the highest header id when the export started
+    """
+    _require_pyarrow()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Unsupported export format '%s', expected one of %s" % (fmt, ', '.join(EXPORT_FORMATS)))
+    os.makedirs(destination, exist_ok=True)
+    if since_id is None:
+        since_id = read_watermark(destination)
+
+    # Every query stops at the highest id when the export starts, so headers
+    # committed while it runs are left for the next export, whatever query
+    # they would have fallen in
+    connection = session.connection().execution_options(stream_results=True)
+    watermark = max(since_id, connection.execute(select([func.max(Header.__table__.c.id)])).scalar() or 0)
+    for name, columns, stmt in _export_queries(since_id, watermark, canonical_only):
+        writer = _PartitionedWriter(destination, fmt, columns, batch_size)
+        result = connection.execute(stmt)
+        try:
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    writer.add(row)
+        finally:
+            result.close()
+        writer.flush()
+        if log and writer.files_written:
+            log.info("Exported %d files of %s rows" % (writer.files_written, name))
+
+    _write_watermark(destination, watermark)
+    return watermark
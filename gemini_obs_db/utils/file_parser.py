@@ -2,6 +2,8 @@
 This module is for helper classes for parsing file headers.  This will alleviate special case handling for
 some data issues without needing to pollute the AstroData code or require a DRAGONS update.
 """
+import sys
+import time
 from abc import ABC
 from datetime import datetime, date, timedelta
 from typing import Any, Union, Callable, List
@@ -12,6 +14,7 @@ import numpy as np
 from gemini_obs_db.utils.gemini_metadata_utils import gemini_procmode, gemini_telescope, gemini_instrument, \
     gemini_observation_type, gemini_observation_class, ratodeg, dectodeg, dmstodeg, gemini_readspeed_settings, \
     gemini_welldepth_settings, UT_DATETIME_SECS_EPOCH
+from gemini_obs_db.utils import profiling
 
 __all__ = ["build_parser"]
 
@@ -57,6 +60,12 @@ class FileParser(ABC):
         -------
         Value for the field, or None on error
         """
+        profiler = profiling._profiler
+        if profiler is not None:
+            # Named after the parser method we were called from
+            descriptor = sys._getframe(1).f_code.co_name
+            instrument = self._profiled_instrument()
+            start = time.perf_counter()
         try:
             if callable(fn):
                 retval = fn()
@@ -65,12 +74,33 @@ class FileParser(ABC):
             if retval is not None and convert_fn is not None:
                 retval = convert_fn(retval)
             if require_in and retval not in require_in:
-                return None
-            return retval
-        except (TypeError, AttributeError, KeyError, ValueError, IndexError) as data_err:
+                retval = None
+        except Exception as data_err:
+            if profiler is not None:
+                profiler.record(instrument, descriptor, time.perf_counter() - start, error=data_err)
+            if not isinstance(data_err, (TypeError, AttributeError, KeyError, ValueError, IndexError)):
+                raise
             if self._log:
                 self._log.warning("%s: %s" % (message, data_err))
             return None
+        if profiler is not None:
+            profiler.record(instrument, descriptor, time.perf_counter() - start, value=retval)
+        return retval
+
+    def _profiled_instrument(self) -> str:
+        """
+        Get the instrument to file descriptor statistics under, working it out once per parser.
+        """
+        instrument = self.__dict__.get('_profile_instrument')
+        if instrument is None:
+            try:
+                instrument = self.ad.instrument()
+            except Exception:
+                instrument = None
+            if not instrument:
+                instrument = type(self).__name__
+            self._profile_instrument = instrument
+        return instrument
 
     def adaptive_optics(self) -> bool:
         raise NotImplementedError()
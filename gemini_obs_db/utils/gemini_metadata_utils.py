@@ -6,14 +6,18 @@ classes and functions for parsing the metadata in Gemini FITS files.
 from astropy.coordinates import Angle
 from typing import Union, Tuple
 
+import functools
 import re
+import warnings
 import time
 import datetime
 from datetime import date, timedelta
 import dateutil.parser
+import numpy as np
 
 # from . import fits_storage_config
 from gemini_obs_db import db_config
+from gemini_obs_db.utils.vocabulary import Vocabulary
 
 
 __all__ = [
@@ -24,16 +28,24 @@ __all__ = [
     "gemini_telescopes",
     "gemini_telescope",
     "gemini_instrument",
+    "INSTRUMENTS",
     "get_fake_ut",
     "gemini_date",
     "ratodeg",
     "dectodeg",
+    "ratodeg_array",
+    "dectodeg_array",
     "degtora",
     "degtodec",
     "dmstodeg",
     "srtodeg",
     "gemini_daterange",
     "gemini_procmode",
+    "PROCMODES",
+    "OBSERVATION_TYPES",
+    "OBSERVATION_CLASSES",
+    "REDUCTION_STATES",
+    "CALIBRATION_TYPES",
     "obs_types",
     "gemini_observation_type",
     "obs_classes",
@@ -51,10 +63,17 @@ __all__ = [
     "GeminiDataLabel",
     "GeminiObservation",
     "GeminiProgram",
+    "clear_parser_caches",
+    "PROGRAM_ID_FIELDS",
+    "DATALABEL_FIELDS",
+    "parse_program_ids",
+    "parse_datalabels",
     "get_date_offset",
     "get_time_period",
     "gemini_time_period_from_range",
     "gemini_semester",
+    "ut_datetime_secs_array",
+    "gemini_semester_array",
     "previous_semester",
     "site_monitor",
     "UT_DATETIME_SECS_EPOCH",
@@ -65,6 +84,8 @@ DATE_LIMIT_LOW = dateutil.parser.parse('19900101')
 DATE_LIMIT_HIGH = dateutil.parser.parse('20500101')
 ZERO_OFFSET = datetime.timedelta()
 ONEDAY_OFFSET = datetime.timedelta(days=1)
+# Size of the LRU cache of parsed absolute dates
+DATE_CACHE_SIZE = 4096
 UT_DATETIME_SECS_EPOCH = datetime.datetime(2000, 1, 1, 0, 0, 0)
 # ------------------------------------------------------------------------------
 # Compile some regular expressions here. This is fairly complex, so I've
@@ -173,6 +194,8 @@ gemini_instrument_dict = {
     'zorro': 'ZORRO',
     'maroon-x': 'MAROON-X'
 }
+INSTRUMENTS = Vocabulary('instrument', gemini_instrument_dict.values(), normalize=str.lower,
+                         aliases=gemini_instrument_dict)
 
 
 def gemini_instrument(string: str, gmos: bool = False, other: bool = False) -> str:
@@ -211,18 +234,23 @@ def gemini_instrument(string: str, gmos: bool = False, other: bool = False) -> s
     if other:
         retary = string
 
-    try:
-        retary = gemini_instrument_dict[string.lower()]
-    except KeyError:
-        if string:
-            if hqcre.match(string):
-                retary = 'Hokupaa+QUIRC'
-            elif gmos and string.lower() == 'gmos':
-                retary = 'GMOS'
+    instrument = INSTRUMENTS.normalize(string)
+    if instrument is not None:
+        retary = instrument
+    elif string:
+        if hqcre.match(string):
+            retary = 'Hokupaa+QUIRC'
+        elif gmos and string.lower() == 'gmos':
+            retary = 'GMOS'
 
     return retary
 
 
+@functools.lru_cache(maxsize=16)
+def _transit_time(transit: str) -> datetime.time:
+    return datetime.datetime.strptime(transit, "%H:%M:%S").time()
+
+
 def get_fake_ut(transit: str = "14:00:00"):
     """
     Generate the fake UT date used to name Gemini data.
@@ -253,7 +281,7 @@ def get_fake_ut(transit: str = "14:00:00"):
 
     """
     # Convert the transit time string into a datetime.time object
-    transittime = datetime.datetime.strptime(transit, "%H:%M:%S").time()
+    transittime = _transit_time(transit)
 
     # Get the local and UTC date and time
     dtlocal = datetime.datetime.now()
@@ -316,18 +344,42 @@ def gemini_date(string: str, as_datetime: bool = False, offset: timedelta = ZERO
         offset = ZERO_OFFSET
         suffix = 'Z'
 
-    dt_to_text = lambda x: x.date().strftime('%Y%m%d') + suffix
-    dt_to_text_full = lambda x: x.strftime('%Y-%m-%dT%H:%M:%S') + suffix
-    dt_to_text_short = lambda x: x.strftime('%Y%m%dT%H%M%S') + suffix
-
     if string in {'today', 'tonight'}:
         string = get_fake_ut()
         # string = dt_to_text(datetime.datetime.utcnow())
     elif string in {'yesterday', 'lastnight'}:
-        past = dateutil.parser.parse(get_fake_ut()) - ONEDAY_OFFSET
-        string = dt_to_text(past)
+        past = _parse_yyyymmdd(get_fake_ut()) - ONEDAY_OFFSET
+        string = past.strftime('%Y%m%d')
         # string = dt_to_text(datetime.datetime.utcnow() - ONEDAY_OFFSET)
 
+    # Relative terms are resolved by now, so the rest only depends on the arguments and can be cached
+    return _gemini_date(string, as_datetime, offset, suffix)
+
+
+def _parse_yyyymmdd(string: str) -> datetime.datetime:
+    """
+    Parse a YYYYMMDD string, falling back to dateutil for anything unexpected.
+    """
+    try:
+        return datetime.datetime(int(string[0:4]), int(string[4:6]), int(string[6:8]))
+    except ValueError:
+        return dateutil.parser.parse(string)
+
+
+_isodatetimecre = re.compile(r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,5}))?$')
+_compactdatetimecre = re.compile(r'^(\d{4})(\d\d)(\d\d)T(\d\d)(\d\d)(\d\d)$')
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def _gemini_date(string: str, as_datetime: bool, offset: timedelta, suffix: str) \
+        -> Union[datetime.datetime, str, None]:
+    """
+    Parse an absolute date for :func:`gemini_date`.
+    """
+    dt_to_text = lambda x: x.date().strftime('%Y%m%d') + suffix
+    dt_to_text_full = lambda x: x.strftime('%Y-%m-%dT%H:%M:%S') + suffix
+    dt_to_text_short = lambda x: x.strftime('%Y%m%dT%H%M%S') + suffix
+
     if len(string) == 8 and string.isdigit():
         # What we want here is to bracket from 2pm yesterday through 2pm today.
         # That is, 20200415 should convert to 2020-04-14 14:00 local time, but
@@ -339,7 +391,7 @@ def gemini_date(string: str, as_datetime: bool = False, offset: timedelta = ZERO
         # offset (HST) = -10 + 10 = 0
         # offset (CL) = -10 + 4 = -6
         try:
-            dt = dateutil.parser.parse(string) + offset
+            dt = _parse_yyyymmdd(string) + offset
             dt = dt.replace(tzinfo=None)
             if DATE_LIMIT_LOW <= dt < DATE_LIMIT_HIGH:
                 return dt_to_text(dt) if not as_datetime else dt
@@ -349,6 +401,15 @@ def gemini_date(string: str, as_datetime: bool = False, offset: timedelta = ZERO
     if len(string) >= 14 and 'T' in string and ':' in string and '=' not in string:
         # Parse an ISO style datestring, so 2019-12-10T11:22:33.444444
         try:
+            match = _isodatetimecre.match(string)
+            if match:
+                # The common layout, parsed by hand
+                frac = match.group(7)
+                dt = datetime.datetime(*[int(v) for v in match.groups()[:6]],
+                                       microsecond=int(frac.ljust(6, '0')) if frac else 0) + offset
+                if DATE_LIMIT_LOW <= dt < DATE_LIMIT_HIGH:
+                    return dt_to_text_full(dt) if not as_datetime else dt
+                return '' if not as_datetime else None
             # TODO this is dateutil bug #786, so for now we truncate to 6 digits
             if '.' in string:
                 lastdot = string.rindex('.')
@@ -366,6 +427,12 @@ def gemini_date(string: str, as_datetime: bool = False, offset: timedelta = ZERO
     if len(string) >= 14 and 'T' in string and ':' not in string and '=' not in string and '-' not in string:
         # Parse an compressed style datestring, so 20191210T112233
         try:
+            match = _compactdatetimecre.match(string)
+            if match:
+                dt = datetime.datetime(*[int(v) for v in match.groups()])
+                if DATE_LIMIT_LOW <= dt < DATE_LIMIT_HIGH:
+                    return dt_to_text_full(dt) if not as_datetime else dt
+                return '' if not as_datetime else None
             dt = dateutil.parser.isoparse("%s-%s-%sT%s:%s:%sZ" % (string[0:4], string[4:6], string[6:8],
                                                                   string[9:11], string[11:13], string[13:15])) # + offset
             # strip back out time zone as the rest of the code does not support it
@@ -378,6 +445,18 @@ def gemini_date(string: str, as_datetime: bool = False, offset: timedelta = ZERO
     return '' if not as_datetime else None
 
 
+# Sexagesimal RA and Dec for the fast paths, HH:MM:SS.sss and [+-]DD:MM:SS.sss
+_ra_re = re.compile(r'^([01]\d|2[0-3]):([012345]\d):([012345]\d)(\.\d*)?$')
+_dec_re = re.compile(r'^([+-]?)(\d\d):([012345]\d):([012345]\d)(\.\d*)?$')
+
+# deprecated, used by ratodeg_old and dectodeg_old
+racre = re.compile(r'^([012]\d):([012345]\d):([012345]\d)(\.?\d*)$')
+deccre = re.compile(r'^([+-]?)(\d\d):([012345]\d):([012345]\d)(\.?\d*)$')
+
+# Longest fractional seconds the array parsers handle exactly, longer ones go through the scalar parser
+_MAX_FRAC_DIGITS = 13
+
+
 def ratodeg(string: str) -> float:
     """
     A utility function that recognises an RA: HH:MM:SS.sss
@@ -389,6 +468,11 @@ def ratodeg(string: str) -> float:
     except:
         # ok, fall back to smart parsing
         pass
+    if isinstance(string, str):
+        re_match = _ra_re.match(string.strip())
+        if re_match:
+            secs = float(re_match.group(3) + (re_match.group(4) or ''))
+            return 15.0 * (int(re_match.group(1)) + int(re_match.group(2)) / 60.0 + secs / 3600.0)
     try:
         return Angle("%s %s" % (string, "hours")).degree
     except:
@@ -397,10 +481,6 @@ def ratodeg(string: str) -> float:
     return None
 
 
-# deprecated, used by ratodeg_old
-racre = re.compile(r'^([012]\d):([012345]\d):([012345]\d)(\.?\d*)$')
-
-
 # deprecated
 def ratodeg_old(string: str) -> float:
     """
@@ -447,6 +527,12 @@ def dectodeg(string: str) -> float:
             return value
     except:
         pass
+    if isinstance(string, str):
+        re_match = _dec_re.match(string.strip())
+        if re_match:
+            secs = float(re_match.group(4) + (re_match.group(5) or ''))
+            degs = int(re_match.group(2)) + int(re_match.group(3)) / 60.0 + secs / 3600.0
+            return -degs if re_match.group(1) == '-' else degs
     try:
         a = Angle("%s %s" % (string, "degrees"))
         if hasattr(a, "degrees"):
@@ -458,10 +544,6 @@ def dectodeg(string: str) -> float:
         return None
 
 
-# deprecated, used by dectodeg_old
-deccre = re.compile(r'^([+-]?)(\d\d):([012345]\d):([012345]\d)(\.?\d*)$')
-
-
 # deprecated
 def dectodeg_old(string: str) -> float:
     """
@@ -500,6 +582,146 @@ def dectodeg_old(string: str) -> float:
     return degs
 
 
+def _sexagesimal_fields(chars: np.ndarray, max_first: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parse rows of ASCII codes laid out as AA:MM:SS[.sss] into their three fields.
+
+    `max_first` is the highest digit allowed first in the AA field.  Returns a
+    mask of the rows that have exactly that layout, and the AA, MM and seconds
+    values for them.  The seconds are an exact integer divided by a power of
+    ten, so they come out exactly as `float` would parse them.
+    """
+    nrows, width = chars.shape
+    if width < 8:
+        return np.zeros(nrows, dtype=bool), None, None, None
+    digits = chars.astype(np.int64) - ord('0')
+    isdigit = (digits >= 0) & (digits <= 9)
+    ok = isdigit[:, [0, 1, 3, 4, 6, 7]].all(axis=1) & (chars[:, 2] == ord(':')) & (chars[:, 5] == ord(':')) \
+        & (digits[:, 0] <= max_first) & (digits[:, 3] <= 5) & (digits[:, 6] <= 5)
+
+    secs_int = digits[:, 6] * 10 + digits[:, 7]
+    nfrac = np.zeros(nrows, dtype=np.int64)
+    if width > 8:
+        # After the seconds there is either nothing, or a '.' and then only digits
+        point = chars[:, 8] == ord('.')
+        tail = chars[:, 9:]
+        # Once a row ends (NUL padding) it must stay ended
+        ended = np.logical_or.accumulate(tail == 0, axis=1)
+        ok &= (point | (chars[:, 8] == 0) & ended.all(axis=1)) & np.all(isdigit[:, 9:] | ended, axis=1)
+        frac_digits = isdigit[:, 9:] & ~ended & point[:, np.newaxis]
+        nfrac = frac_digits.sum(axis=1)
+        ok &= nfrac <= _MAX_FRAC_DIGITS
+        for i in range(min(tail.shape[1], _MAX_FRAC_DIGITS)):
+            secs_int = np.where(frac_digits[:, i], secs_int * 10 + digits[:, 9 + i], secs_int)
+    secs = secs_int / 10.0 ** np.minimum(nfrac, _MAX_FRAC_DIGITS)
+    first = digits[:, 0] * 10 + digits[:, 1]
+    mins = digits[:, 3] * 10 + digits[:, 4]
+    return ok, first, mins, secs
+
+
+def _ascii_rows(strings: np.ndarray) -> Union[np.ndarray, None]:
+    """
+    Get stripped strings as a 2D array of their ASCII codes, NUL padded, or None if they are not all ASCII.
+    """
+    try:
+        encoded = np.char.strip(np.asarray(strings, dtype=str)).astype('S')
+    except UnicodeEncodeError:
+        return None
+    width = max(encoded.dtype.itemsize, 1)
+    return np.frombuffer(encoded.tobytes(), dtype=np.uint8).reshape(len(encoded), width) if len(encoded) \
+        else np.zeros((0, width), dtype=np.uint8)
+
+
+def _array_parse(values, scalar, vector) -> np.ndarray:
+    """
+    Common driver for the array coordinate parsers.
+
+    Strings in the fixed sexagesimal layout are done by `vector` all at once,
+    anything else goes through the `scalar` parser one value at a time.
+    """
+    values = np.asarray(values, dtype=object).ravel()
+    result = np.full(len(values), np.nan)
+    is_str = np.array([isinstance(v, str) for v in values], dtype=bool)
+    done = np.zeros(len(values), dtype=bool)
+    if is_str.any():
+        chars = _ascii_rows(values[is_str])
+        if chars is not None:
+            ok, degs = vector(chars)
+            idx = np.flatnonzero(is_str)[ok]
+            result[idx] = degs[ok]
+            done[idx] = True
+    for i in np.flatnonzero(~done):
+        value = scalar(values[i])
+        if value is not None:
+            result[i] = value
+    return result
+
+
+def _ra_vector(chars: np.ndarray):
+    ok, hours, mins, secs = _sexagesimal_fields(chars, 2)
+    if hours is None:
+        return ok, None
+    # Hours of 24 and over are left to astropy, as in ratodeg
+    ok &= hours < 24
+    return ok, 15.0 * (hours + mins / 60.0 + secs / 3600.0)
+
+
+def _dec_vector(chars: np.ndarray):
+    signed = (chars[:, 0] == ord('+')) | (chars[:, 0] == ord('-')) if chars.shape[1] else \
+        np.zeros(len(chars), dtype=bool)
+    negative = chars[:, 0] == ord('-') if chars.shape[1] else signed
+    # Shift the signed rows left by one so every row starts with the degrees
+    shifted = np.concatenate((chars[:, 1:], np.zeros((len(chars), 1), dtype=chars.dtype)), axis=1)
+    chars = np.where(signed[:, np.newaxis], shifted, chars)
+    ok, degs, mins, secs = _sexagesimal_fields(chars, 9)
+    if degs is None:
+        return ok, None
+    degs = degs + mins / 60.0 + secs / 3600.0
+    return ok, np.where(negative, -degs, degs)
+
+
+def ratodeg_array(values) -> np.ndarray:
+    """
+    Convert many RA values to decimal degrees at once, as :func:`ratodeg` does.
+
+    Strings in the HH:MM:SS.sss form are converted with array operations,
+    anything else is handed to :func:`ratodeg`.  The results are identical to
+    calling :func:`ratodeg` on each value.
+
+    Parameters
+    ----------
+    values : sequence
+        RA strings or numbers, as a list, a NumPy array or a pandas Series
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        RA in decimal degrees, with NaN where a value could not be parsed
+    """
+    return _array_parse(values, ratodeg, _ra_vector)
+
+
+def dectodeg_array(values) -> np.ndarray:
+    """
+    Convert many Dec values to decimal degrees at once, as :func:`dectodeg` does.
+
+    Strings in the [+-]DD:MM:SS.sss form are converted with array operations,
+    anything else is handed to :func:`dectodeg`.  The results are identical to
+    calling :func:`dectodeg` on each value.
+
+    Parameters
+    ----------
+    values : sequence
+        Dec strings or numbers, as a list, a NumPy array or a pandas Series
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Dec in decimal degrees, with NaN where a value could not be parsed
+    """
+    return _array_parse(values, dectodeg, _dec_vector)
+
+
 def degtora(decimal: float) -> str:
     """
     Convert decimal degrees to RA HH:MM:SS.ss string
@@ -652,7 +874,8 @@ def gemini_daterange(string: str, as_datetime: bool = False, offset: timedelta =
     return '' if not as_datetime else None
 
 
-procmode_codes = ('sq', 'ql', 'qa')
+PROCMODES = Vocabulary('procmode', ('sq', 'ql', 'qa'))
+procmode_codes = PROCMODES.values
 
 
 def gemini_procmode(string: str) -> str:
@@ -673,11 +896,12 @@ def gemini_procmode(string: str) -> str:
         The name of the processed mode code or None.
 
     """
-    return string if string in procmode_codes else None
+    return PROCMODES.get(string)
 
 
-obs_types = ('DARK', 'ARC', 'FLAT', 'BIAS', 'OBJECT', 'PINHOLE', 'RONCHI', 'CAL', 'FRINGE', 'MASK', 'STANDARD',
-             'SLITILLUM', 'BPM')
+OBSERVATION_TYPES = Vocabulary('obstype', ('DARK', 'ARC', 'FLAT', 'BIAS', 'OBJECT', 'PINHOLE', 'RONCHI', 'CAL',
+                                           'FRINGE', 'MASK', 'STANDARD', 'SLITILLUM', 'BPM'))
+obs_types = OBSERVATION_TYPES.values
 
 
 def gemini_observation_type(string: str) -> str:
@@ -702,10 +926,11 @@ def gemini_observation_type(string: str) -> str:
         The name of the observation type or None.
 
     """
-    return string if string in obs_types else None
+    return OBSERVATION_TYPES.get(string)
 
 
-obs_classes = ('dayCal', 'partnerCal', 'acqCal', 'acq', 'science', 'progCal')
+OBSERVATION_CLASSES = Vocabulary('obsclass', ('dayCal', 'partnerCal', 'acqCal', 'acq', 'science', 'progCal'))
+obs_classes = OBSERVATION_CLASSES.values
 
 
 def gemini_observation_class(string: str) -> str:
@@ -727,13 +952,15 @@ def gemini_observation_class(string: str) -> str:
         The name of the observation class or None.
 
     """
-    return string if string in obs_classes else None
+    return OBSERVATION_CLASSES.get(string)
 
 
-reduction_states = ('RAW', 'PREPARED', 'PROCESSED_FLAT', 'PROCESSED_BIAS',
-                    'PROCESSED_FRINGE', 'PROCESSED_ARC', 'PROCESSED_DARK',
-                    'PROCESSED_TELLURIC', 'PROCESSED_SCIENCE', 'PROCESSED_STANDARD',
-                    'PROCESSED_SLITILLUM', 'PROCESSED_BPM', 'PROCESSED_UNKNOWN')
+REDUCTION_STATES = Vocabulary('reduction_state', (
+    'RAW', 'PREPARED', 'PROCESSED_FLAT', 'PROCESSED_BIAS',
+    'PROCESSED_FRINGE', 'PROCESSED_ARC', 'PROCESSED_DARK',
+    'PROCESSED_TELLURIC', 'PROCESSED_SCIENCE', 'PROCESSED_STANDARD',
+    'PROCESSED_SLITILLUM', 'PROCESSED_BPM', 'PROCESSED_UNKNOWN'))
+reduction_states = REDUCTION_STATES.values
 
 
 def gemini_reduction_state(string: str) -> str:
@@ -754,17 +981,18 @@ def gemini_reduction_state(string: str) -> str:
         The name of reduction state or None.
 
     """
-    return string if string in reduction_states else None
+    return REDUCTION_STATES.get(string)
 
 
-cal_types = (
+CALIBRATION_TYPES = Vocabulary('caltype', (
     'bias', 'dark', 'flat', 'arc', 'processed_bias', 'processed_dark',
     'processed_flat', 'processed_arc', 'processed_fringe', 'pinhole_mask',
     'ronchi_mask', 'spectwilight', 'lampoff_flat', 'qh_flat', 'specphot',
     'photometric_standard', 'telluric_standard', 'domeflat', 'lampoff_domeflat',
     'mask', 'polarization_standard', 'astrometric_standard', 'polarization_flat',
     'processed_standard', 'processed_slitillum', 'slitillum', 'processed_bpm',
-)
+))
+cal_types = CALIBRATION_TYPES.values
 
 
 def gemini_caltype(string: str) -> str:
@@ -789,7 +1017,7 @@ def gemini_caltype(string: str) -> str:
         The name of calibration type or None.
 
     """
-    return string if string in cal_types else None
+    return CALIBRATION_TYPES.get(string)
 
 
 gmos_gratings = ('MIRROR', 'B480', 'B600', 'R600', 'R400', 'R831', 'R150', 'B1200')
@@ -914,73 +1142,117 @@ dlcre = re.compile(r'^(?P<progid>(?:%s)|(?:%s)|(?:%s))-(?P<obsid>\d*)-(?P<dlid>\
 #                     r'G[NS]-((?:CAL)|(?:ENG))20\d\d[01]\d[0123]\d'))
 
 
-class GeminiDataLabel:
+# Size of the LRU caches in front of the program ID, observation ID and datalabel parsers
+PARSER_CACHE_SIZE = 8192
+
+# Anchored versions of the program ID patterns
+calengcre_old = re.compile(calengre_old + r'$')
+calengcre = re.compile(calengre + r'$')
+scicre = re.compile(scire + r'$')
+obscre = re.compile(obsre)
+
+
+class _Immutable:
+    """
+    Base for the parsed metadata classes.
+
+    These instances are shared through the parser caches, so they must not be
+    modified once built.  The attributes are set with `_set` while parsing and
+    are read-only after that.
+    """
+    __slots__ = ()
+
+    def _set(self, **kwargs):
+        for name, value in kwargs.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class GeminiDataLabel(_Immutable):
     """
     Construct a GeminiDataLabel from the given datalabel string.
 
     This will parse the passed datalabel and fill in the various fields
-    with values inferred from the datalabel.
+    with values inferred from the datalabel.  Parsed datalabels are cached
+    and shared, so the instances are immutable.
+
+    The fields are:
+
+    * datalabel: datalabel as a string, empty if it is not in the correct format
+    * projectid: project id portion
+    * project: :class:`~gemini_obs_db.utils.gemini_metadata_utils.GeminiProgram` for the given project id
+    * observation_id: observation id portion
+    * obsnum: observation number
+    * dlnum: datalabel number
+    * extension: extension number, if any
+    * datalabel_noextension: datalabel without the extension number suffix
+    * valid: True if datalabel is in the correct format
 
     dl: str
         datalabel to use
     """
+    __slots__ = ('datalabel', 'projectid', 'project', 'observation_id', 'obsnum', 'dlnum', 'extension',
+                 'datalabel_noextension', 'valid')
 
-    datalabel = ''
-    projectid = ''
-    observation_id = ''
-    obsnum = ''
-    dlnum = ''
-    extension = ''
-    project = ''
-
-    def __init__(self, dl: str):
-        """
-        Construct a GeminiDataLabel from the given datalabel string.
-
-        This will parse the passed datalabel and fill in the various fields
-        with values inferred from the datalabel.
-
-        dl: str
-            datalabel to use
-        """
+    def __new__(cls, dl: str):
         # Clean up datalabel if it has space padding
         if dl is not None and isinstance(dl, str):
             dl = dl.strip()
+        return _parse_datalabel(cls, dl)
 
-        self.datalabel = dl              #: datalabel as a string
-        self.projectid = ''              #: project id portion
-        self.project = None              #: :class:`~gemini_obs_db.utils.gemini_metadata_utils.GeminiProgram` for the given project id
-        self.observation_id = ''         #: observaiton id portion
-        self.obsnum = ''                 #: observation number
-        self.dlnum = ''                  #: datalabel number
-        self.extension = ''              #: extension number, if any
-        self.datalabel_noextension = ''  #: datalabel without the extension number suffix
-        self.valid = False               #: True if datalabel is in the correct format
-        if self.datalabel:
-            self.parse()
+    def __reduce__(self):
+        return self.__class__, (self.datalabel, )
 
     def parse(self):
         """
-        Infer the other fields for this GeminiDataLabel based on the
-        text datalabel.
+        Does nothing, the fields are filled in when the datalabel is constructed.
+
+        .. deprecated:: 1.0.26
+            Kept for older callers, instances are now parsed once and immutable
         """
-        dlm = dlcre.match(self.datalabel)
-        if dlm:
-            self.projectid = dlm.group('progid')
-            self.obsnum = dlm.group('obsid')
-            self.dlnum = dlm.group('dlid')
-            self.extension = dlm.group('extn')
-            self.project = GeminiProgram(self.projectid)
-            self.observation_id = '%s-%s' % (self.projectid, self.obsnum)
-            self.datalabel_noextension = '%s-%s-%s' % (self.projectid, self.obsnum, self.dlnum)
-            self.valid = True
-        else:
-            # Match failed - Null the datalabel field
-            self.datalabel = ''
-            self.valid = False
+        warnings.warn("GeminiDataLabel.parse() is deprecated, the fields are parsed on construction",
+                      DeprecationWarning, stacklevel=2)
+
+
+def _datalabel_fields(dl: str) -> tuple:
+    """
+    Parse a datalabel into (datalabel, projectid, observation_id, obsnum, dlnum, extension,
+    datalabel_noextension, valid), as for :class:`GeminiDataLabel`.
+    """
+    dlm = dlcre.match(dl) if dl else None
+    if not dlm:
+        # Match failed - Null the datalabel field
+        return '' if dl else dl, '', '', '', '', '', '', False
+    projectid = dlm.group('progid')
+    obsnum = dlm.group('obsid')
+    dlnum = dlm.group('dlid')
+    return dl, projectid, '%s-%s' % (projectid, obsnum), obsnum, dlnum, dlm.group('extn'), \
+        '%s-%s-%s' % (projectid, obsnum, dlnum), True
 
 
-class GeminiObservation:
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def _parse_datalabel(cls, dl: str) -> GeminiDataLabel:
+    self = object.__new__(cls)
+    datalabel, projectid, observation_id, obsnum, dlnum, extension, datalabel_noextension, valid = \
+        _datalabel_fields(dl)
+    self._set(datalabel=datalabel, projectid=projectid, observation_id=observation_id, obsnum=obsnum,
+              dlnum=dlnum, extension=extension, datalabel_noextension=datalabel_noextension, valid=valid,
+              project=GeminiProgram(projectid) if valid else None)
+    return self
+
+
+class GeminiObservation(_Immutable):
     """
     The GeminiObservation class parses an observation ID
 
@@ -990,41 +1262,41 @@ class GeminiObservation:
     * observation_id: The observation ID provided. If the class cannot
                      make sense of the string passed in, this field will
                      be empty
-    * project: A GeminiProgram object for the project this is part of
+    * program: A GeminiProgram object for the project this is part of
     * obsnum: The observation numer within the project
 
+    Parsed observation IDs are cached and shared, so the instances are immutable.
+
     Parameters
     ----------
     observation_id : str
         ObservationID from which to parse the information
     """
-    observation_id = ''
-    program = ''
-    obsnum = ''
+    __slots__ = ('observation_id', 'program', 'obsnum', 'valid')
 
-    def __init__(self, observation_id):
+    def __new__(cls, observation_id):
         # Clean up value if it has space padding
         if observation_id is not None and isinstance(observation_id, str):
             observation_id = observation_id.strip()
+        return _parse_observation(cls, observation_id)
+
+    def __reduce__(self):
+        return self.__class__, (self.observation_id, )
 
-        if observation_id:
-            match = re.match(obsre, observation_id)
-            if match:
-                self.observation_id = observation_id
-                self.program = GeminiProgram(match.group(1))
-                self.obsnum = match.group('obsid')
-                self.valid = True
-            else:
-                self.observation_id = ''
-                self.project = ''
-                self.obsnum = ''
-                self.valid = False
-        else:
-            self.observation_id = ''
-            self.valid = False
 
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def _parse_observation(cls, observation_id: str) -> GeminiObservation:
+    self = object.__new__(cls)
+    self._set(observation_id='', program='', obsnum='', valid=False)
+    if observation_id:
+        match = obscre.match(observation_id)
+        if match:
+            self._set(observation_id=observation_id, program=GeminiProgram(match.group(1)),
+                      obsnum=match.group('obsid'), valid=True)
+    return self
 
-class GeminiProgram:
+
+class GeminiProgram(_Immutable):
     """
     The GeminiProgram class parses a Gemini Program ID and provides
     various useful information deduced from it.
@@ -1048,73 +1320,182 @@ class GeminiProgram:
     This could be easily expanded to extract semester, hemisphere, program number etc
     if required.
 
+    Parsed program IDs are cached and shared, so the instances are immutable.
+
     Parameters
     ----------
     program_id : str
         Gemini ProgramID to parse
     """
-    program_id = None
-    valid = None
-    is_cal = False
-    is_eng = False
-    is_q = False
-    is_c = False
-    is_sv = False
-    is_qs = False
-    is_dd = False
-    is_lp = False
-    is_ft = False
-    is_ds = False
-
-    def __init__(self, program_id: str):
+    __slots__ = ('program_id', 'valid', 'is_cal', 'is_eng', 'is_q', 'is_c', 'is_sv', 'is_qs', 'is_dd', 'is_lp',
+                 'is_ft', 'is_ds')
+
+    def __new__(cls, program_id: str):
         # clean up any spaces
         if program_id is not None and isinstance(program_id, str):
             program_id = program_id.strip()
+        return _parse_program(cls, program_id)
+
+    def __reduce__(self):
+        return self.__class__, (self.program_id, )
+
+
+def _program_fields(program_id: str) -> tuple:
+    """
+    Parse a program ID into the field values of :class:`GeminiProgram`, in `__slots__` order.
+    """
+    valid = None
+    is_cal = is_eng = is_q = is_c = is_sv = is_ft = is_ds = False
+    # Check for the CAL / ENG form
+    ec_match = calengcre_old.match(program_id) or calengcre.match(program_id)
+    sci_match = scicre.match(program_id) if not ec_match else None
+    if ec_match:
+        # Valid eng / cal form
+        valid = True
+        is_eng = ec_match.group(1) == 'ENG'
+        is_cal = ec_match.group(1) == 'CAL'
+    elif sci_match:
+        # Valid science form
+        valid = True
+        is_q = sci_match.group(4) == 'Q'
+        is_c = sci_match.group(4) == 'C'
+        is_eng = sci_match.group(4) == 'ENG'
+        is_cal = sci_match.group(4) == 'CAL'
+        if program_id.startswith('G-'):
+            is_sv = sci_match.group(3) == 'V'
+            is_ft = sci_match.group(3) == 'F'
+            is_ds = sci_match.group(3) == 'S'
+        else:
+            is_sv = sci_match.group(4) == 'SV'
+            is_ft = sci_match.group(4) == 'FT'
+            is_ds = sci_match.group(4) == 'DS'
+
+        # If the program id is OLD style and program number contained leading zeros, strip them out of
+        # the official program_id
+        if sci_match.group(5)[0] == '0' and not program_id.startswith('G-'):
+            prog_num = int(sci_match.group(5))
+            program_id = "%s-%s-%s-%s" % (sci_match.group(1),
+                                          sci_match.group(2),
+                                          sci_match.group(4),
+                                          prog_num)
+    else:
+        # Not a valid format. Probably some kind of engineering test program
+        # that someone just made up.
+        valid = False
+        is_eng = True
+    return program_id, valid, is_cal, is_eng, is_q, is_c, is_sv, False, False, False, is_ft, is_ds
+
+
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def _parse_program(cls, program_id: str) -> GeminiProgram:
+    self = object.__new__(cls)
+    self._set(**dict(zip(GeminiProgram.__slots__, _program_fields(program_id))))
+    return self
+
+
+def clear_parser_caches():
+    """
+    Empty the caches of parsed program IDs, observation IDs and datalabels.
+    """
+    _parse_program.cache_clear()
+    _parse_observation.cache_clear()
+    _parse_datalabel.cache_clear()
+
+
+PROGRAM_ID_FIELDS = GeminiProgram.__slots__
+DATALABEL_FIELDS = ('datalabel', 'projectid', 'observation_id', 'obsnum', 'dlnum', 'extension',
+                    'datalabel_noextension', 'valid')
+
+
+def _unique_strings(values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Clean up a sequence of strings as the parsers do and reduce it to its unique values.
+
+    Returns the unique values and the indices that rebuild the input from them.
+    Missing values, such as None or NaN from pandas, come out as empty strings.
+    """
+    values = np.asarray(values, dtype=object).ravel()
+    cleaned = np.array([v.strip() if isinstance(v, str) else '' for v in values], dtype=object)
+    if len(cleaned) == 0:
+        return np.array([], dtype=object), np.array([], dtype=np.intp)
+    return np.unique(cleaned.astype(str), return_inverse=True)
+
+
+def _structured(fields: Tuple[str, ...], rows: list, inverse: np.ndarray) -> np.ndarray:
+    """
+    Build a structured array from parsed rows of the unique values, expanded back to the input order.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    dtype = list()
+    for name, column in zip(fields, columns):
+        if name == 'valid' or name.startswith('is_'):
+            dtype.append((name, np.bool_))
+        else:
+            width = max([len(v) for v in column if v] + [1])
+            dtype.append((name, 'U%d' % width))
+    unique = np.empty(len(rows), dtype=dtype)
+    for name, column in zip(fields, columns):
+        unique[name] = [bool(v) if unique.dtype[name] == np.bool_ else (v or '') for v in column]
+    return unique[inverse]
 
-        self.program_id = program_id
-        # Check for the CAL / ENG form
-        ec_match_old = re.match(calengre_old + r'$', program_id)
-        ec_match = re.match(calengre + r'$', program_id)
-        sci_match = re.match(scire + r'$', program_id)
-        if ec_match_old:
-            # Valid eng / cal form
-            self.valid = True
-            self.is_eng = ec_match_old.group(1) == 'ENG'
-            self.is_cal = ec_match_old.group(1) == 'CAL'
-        elif ec_match:
-            self.valid = True
-            self.is_eng = ec_match.group(1) == 'ENG'
-            self.is_cal = ec_match.group(1) == 'CAL'
-        elif sci_match:
-            # Valid science form
-            self.valid = True
-            self.is_q = sci_match.group(4) == 'Q'
-            self.is_c = sci_match.group(4) == 'C'
-            self.is_eng = sci_match.group(4) == 'ENG'
-            self.is_cal = sci_match.group(4) == 'CAL'
-            if program_id.startswith('G-'):
-                self.is_sv = sci_match.group(3) == 'V'
-                self.is_ft = sci_match.group(3) == 'F'
-                self.is_ds = sci_match.group(3) == 'S'
-            else:
-                self.is_sv = sci_match.group(4) == 'SV'
-                self.is_ft = sci_match.group(4) == 'FT'
-                self.is_ds = sci_match.group(4) == 'DS'
-
-            # If the program id is OLD style and program number contained leading zeros, strip them out of
-            # the official program_id
-            if sci_match.group(5)[0] == '0' and not program_id.startswith('G-'):
-                prog_num = int(sci_match.group(5))
-                self.program_id = "%s-%s-%s-%s" % (sci_match.group(1),
-                                                   sci_match.group(2),
-                                                   sci_match.group(4),
-                                                   prog_num)
 
+def parse_program_ids(program_ids) -> np.ndarray:
+    """
+    Parse many program IDs at once into a NumPy structured array.
+
+    This gives the same answers as :class:`GeminiProgram`, without building an
+    object per value.  Each distinct program ID is parsed once, however often
+    it appears, so columns straight out of the database parse quickly.
+
+    Parameters
+    ----------
+    program_ids : sequence of str
+        Program IDs, as a list, a NumPy string or object array or a pandas Series.
+        Missing values are treated as empty strings.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Structured array with one record per input and the fields in
+        :data:`PROGRAM_ID_FIELDS`: program_id, valid, is_cal, is_eng, is_q, is_c,
+        is_sv, is_qs, is_dd, is_lp, is_ft and is_ds
+    """
+    unique, inverse = _unique_strings(program_ids)
+    return _structured(PROGRAM_ID_FIELDS, [_program_fields(p) for p in unique], inverse)
+
+
+def parse_datalabels(datalabels) -> np.ndarray:
+    """
+    Parse many datalabels at once into a NumPy structured array.
+
+    This gives the same answers as :class:`GeminiDataLabel`, plus the flags
+    of the program the datalabel belongs to, without building an object per
+    value.  Each distinct datalabel is parsed once.
+
+    Parameters
+    ----------
+    datalabels : sequence of str
+        Datalabels, as a list, a NumPy string or object array or a pandas Series.
+        Missing values are treated as empty strings.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Structured array with one record per input and the fields in
+        :data:`DATALABEL_FIELDS` followed by the program flags is_cal, is_eng,
+        is_q, is_c, is_sv, is_qs, is_dd, is_lp, is_ft and is_ds.  The flags are
+        all False for an invalid datalabel.
+    """
+    unique, inverse = _unique_strings(datalabels)
+    flags = PROGRAM_ID_FIELDS[2:]
+    rows = list()
+    for dl in unique:
+        fields = _datalabel_fields(dl)
+        if fields[-1]:
+            rows.append(fields + _program_fields(fields[1])[2:])
         else:
-            # Not a valid format. Probably some kind of engineering test program
-            # that someone just made up.
-            self.valid = False
-            self.is_eng = True
+            rows.append(fields + (False, ) * len(flags))
+    return _structured(DATALABEL_FIELDS + flags, rows, inverse)
 
 
 def get_date_offset() -> timedelta:
@@ -1128,13 +1509,20 @@ def get_date_offset() -> timedelta:
     timedelta
         The `timedelta` to use for this application/server.
     """
-    if db_config.use_utc:
+    # The offset only changes if the configuration or the process time zone does, so
+    # it is worked out once for each combination of those
+    return _date_offset(db_config.use_utc, time.timezone, time.altzone, time.daylight)
+
+
+@functools.lru_cache(maxsize=16)
+def _date_offset(use_utc: bool, timezone: int, altzone: int, daylight: int) -> timedelta:
+    if use_utc:
         return ZERO_OFFSET
 
     # Calculate the proper offset to add to the date
     # We consider the night boundary to be 14:00 local time
     # This is midnight UTC in Hawaii, completely arbitrary in Chile
-    zone = time.altzone if time.daylight else time.timezone
+    zone = altzone if daylight else timezone
     # print datetime.timedelta(hours=16)
     # print datetime.timedelta(seconds=zone)
     # print ONEDAY_OFFSET
@@ -1164,11 +1552,12 @@ def get_time_period(start: str, end: str = None, as_date: bool = False) \
     tuple
         A tuple of `date` or `datetime` with the resulting parsed values, defaults to False
     """
-    startdt = gemini_date(start, offset=get_date_offset(), as_datetime=True)
+    offset = get_date_offset()
+    startdt = gemini_date(start, offset=offset, as_datetime=True)
     if end is None:
         enddt = startdt
     else:
-        enddt = gemini_date(end, offset=get_date_offset(), as_datetime=True)
+        enddt = gemini_date(end, offset=offset, as_datetime=True)
         # Flip them round if reversed
         if startdt > enddt:
             startdt, enddt = enddt, startdt
@@ -1230,6 +1619,68 @@ def gemini_semester(dt: date) -> str:
     return str(year) + letter
 
 
+def _datetime64(values) -> np.ndarray:
+    """
+    Get values as a datetime64[us] array, with None as NaT.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != 'M':
+        values = np.array([np.datetime64('NaT') if v is None else v for v in values.ravel()],
+                          dtype='datetime64[us]')
+    return values.astype('datetime64[us]').ravel()
+
+
+def ut_datetime_secs_array(values) -> np.ma.MaskedArray:
+    """
+    Convert many UT datetimes to seconds since :data:`UT_DATETIME_SECS_EPOCH` at once.
+
+    This matches the `ut_datetime_secs` header column, including truncating
+    fractions of a second towards zero.
+
+    Parameters
+    ----------
+    values : array
+        Datetimes as a `datetime64` array, or a sequence of `datetime` with None for missing values
+
+    Returns
+    -------
+    :class:`numpy.ma.MaskedArray`
+        int64 seconds, masked where the datetime is missing.  `tolist()` gives None for those.
+    """
+    values = _datetime64(values)
+    missing = np.isnat(values)
+    micros = (values - np.datetime64(UT_DATETIME_SECS_EPOCH, 'us')).astype(np.int64)
+    secs = micros // 1000000
+    # int() truncates towards zero, floor division rounds down
+    secs = np.where((micros < 0) & (micros % 1000000 != 0), secs + 1, secs)
+    return np.ma.masked_array(np.where(missing, 0, secs), mask=missing)
+
+
+def gemini_semester_array(values) -> np.ndarray:
+    """
+    Get the semester names for many dates at once, as :func:`gemini_semester` does.
+
+    Parameters
+    ----------
+    values : array
+        Dates as a `datetime64` array, or a sequence of `date` or `datetime` with None for missing values
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Semester names such as '2020A', with an empty string where the date is missing
+    """
+    values = _datetime64(values)
+    missing = np.isnat(values)
+    months = values.astype('datetime64[M]').astype(np.int64)
+    year = months // 12 + 1970
+    month = months % 12 + 1
+    semester_a = (month >= 2) & (month <= 7)
+    year = np.where(month == 1, year - 1, year)
+    names = np.char.add(year.astype(str), np.where(semester_a, 'A', 'B'))
+    return np.where(missing, '', names)
+
+
 _semester_re = r'(20\d\d)([AB])'
 
 
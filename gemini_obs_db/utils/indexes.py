@@ -0,0 +1,271 @@
+"""
+This module manages the indexes of the database: migrating them to the curated set, and building them after a load.
+
+The header table used to have a single column index on almost every column,
+and the diskfile table one on each of `present` and `canonical`.  Every one of
+those is updated on every insert, yet searches filter on several columns at
+once and the planner could use few of them.  They have been replaced by a
+handful of composite indexes on header, for the usual combinations of search
+filters, and by partial indexes on diskfile that only cover the present,
+canonical rows.
+
+New databases get the curated set from `create_tables`.  For an existing
+database, :func:`migrate_indexes` creates the indexes declared on the ORM
+classes that are missing and drops the retired ones.  It can also be run in
+reverse, to go back to the old set.
+
+For a bulk load into a new database, the tables can be created without
+their secondary indexes, from :func:`without_secondary_indexes`, and the
+indexes built afterwards with :func:`build_indexes`, several at a time.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.header import Header
+
+
+__all__ = ["RETIRED_INDEXES", "CURATED_INDEXES", "index_changes", "migrate_indexes", "without_secondary_indexes",
+           "build_indexes"]
+
+
+# The single column indexes dropped from the schema, by name, as (table, column)
+RETIRED_INDEXES = {
+    'ix_header_%s' % column: ('header', column) for column in (
+        'program_id', 'engineering', 'science_verification', 'calibration_program', 'telescope', 'instrument',
+        'ut_datetime_secs', 'observation_type', 'observation_class', 'ra', 'dec', 'filter_name', 'disperser',
+        'camera', 'central_wavelength', 'focal_plane_mask', 'pupil_mask', 'spectroscopy', 'mode', 'qa_state',
+        'reduction')
+}
+RETIRED_INDEXES.update({
+    'ix_diskfile_present': ('diskfile', 'present'),
+    'ix_diskfile_canonical': ('diskfile', 'canonical'),
+})
+
+# The indexes that replaced them
+CURATED_INDEXES = (
+    'ix_header_instrument_ut_datetime_secs',
+    'ix_header_observation_type_class_instrument',
+    'ix_header_program_id_ut_datetime',
+    'ix_diskfile_canonical_present_id',
+    'ix_diskfile_canonical_present_file_id',
+)
+
+_TABLES = (Header.__table__, DiskFile.__table__)
+
+_create_index_re = re.compile(r'^CREATE (UNIQUE )?INDEX')
+
+
+def _existing_indexes(connection) -> dict:
+    """
+    Get the names of the indexes in the database, by table.
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    return {table.name: set(i['name'] for i in inspector.get_indexes(table.name))
+            for table in _TABLES if table.name in tables}
+
+
+def index_changes(engine: Engine, reverse: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    Work out the SQL to bring the indexes of a database to the curated set.
+
+    Parameters
+    ----------
+    engine : :class:`~sqlalchemy.engine.Engine`
+        Database to check
+    reverse : bool
+        If True, go back to the old set of indexes instead
+
+    Returns
+    -------
+    list of str, list of str
+        The CREATE INDEX statements, and the names of the indexes to drop
+    """
+    with engine.connect() as connection:
+        existing = _existing_indexes(connection)
+    creates = list()
+    drops = list()
+    for table in _TABLES:
+        if table.name not in existing:
+            continue
+        names = existing[table.name]
+        if reverse:
+            for name, (table_name, column) in sorted(RETIRED_INDEXES.items()):
+                if table_name == table.name and name not in names:
+                    creates.append('CREATE INDEX %s ON %s (%s)' % (name, table_name, column))
+            drops.extend(sorted(name for name in CURATED_INDEXES if name in names))
+        else:
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name not in names:
+                    creates.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+            drops.extend(sorted(name for name, (table_name, column) in RETIRED_INDEXES.items()
+                                if table_name == table.name and name in names))
+    return creates, drops
+
+
+def migrate_indexes(engine: Engine, concurrently: bool = False, reverse: bool = False, dry_run: bool = False,
+                    log=None) -> List[str]:
+    """
+    Bring the indexes of a database to the curated set.
+
+    The new indexes are created before the old ones are dropped, so searches
+    are never left without an index.  On PostgreSQL, `concurrently` builds and
+    drops the indexes without locking out writes to the tables, which takes
+    longer, but lets ingest carry on.
+
+    Parameters
+    ----------
+    engine : :class:`~sqlalchemy.engine.Engine`
+        Database to migrate
+    concurrently : bool
+        On PostgreSQL, use CREATE/DROP INDEX CONCURRENTLY
+    reverse : bool
+        If True, go back to the old set of indexes instead
+    dry_run : bool
+        If True, only work out the statements, without running them
+    log : :class:`logging.Logger`
+        Logger to report each statement to
+
+    Returns
+    -------
+    list of str
+        The statements, in the order they are run
+    """
+    creates, drops = index_changes(engine, reverse=reverse)
+    concurrently = concurrently and engine.dialect.name == 'postgresql'
+    if concurrently:
+        creates = [_concurrently(c) for c in creates]
+    statements = creates + ['DROP INDEX %s%s' % ('CONCURRENTLY ' if concurrently else '', name) for name in drops]
+    if not dry_run:
+        _execute(engine, statements, concurrently, log)
+    return statements
+
+
+def _concurrently(statement: str) -> str:
+    return _create_index_re.sub(lambda m: m.group(0) + ' CONCURRENTLY', statement, count=1)
+
+
+def _execute(engine: Engine, statements: List[str], autocommit: bool, log=None):
+    """
+    Run DDL statements in order on one connection, each in its own transaction, or with autocommit.
+    """
+    connection = engine.connect()
+    try:
+        if autocommit:
+            # CONCURRENTLY can not run inside a transaction block
+            connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        for statement in statements:
+            if log is not None:
+                log.info(statement)
+            if autocommit:
+                connection.execute(text(statement))
+            else:
+                with connection.begin():
+                    connection.execute(text(statement))
+    finally:
+        connection.close()
+
+
+def without_secondary_indexes(metadata: MetaData) -> MetaData:
+    """
+    Copy table definitions, leaving out the indexes that are not unique.
+
+    Creating the tables from the copy, bulk loading them, and then building
+    the indexes with :func:`build_indexes`, is much faster than loading into
+    tables that already have their indexes.  Primary keys, unique indexes and
+    constraints are kept, so the data is still checked as it is loaded.
+
+    Parameters
+    ----------
+    metadata : :class:`~sqlalchemy.schema.MetaData`
+        Table definitions to copy
+
+    Returns
+    -------
+    :class:`~sqlalchemy.schema.MetaData`
+        The copy, without the secondary indexes
+    """
+    copy = MetaData()
+    for table in metadata.sorted_tables:
+        table.tometadata(copy)
+    for table in copy.tables.values():
+        for index in list(table.indexes):
+            if not index.unique:
+                table.indexes.discard(index)
+    return copy
+
+
+def _partitioned_tables(connection) -> set:
+    if connection.dialect.name != 'postgresql':
+        return set()
+    return set(r[0] for r in connection.execute(text(
+        "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid")))
+
+
+def build_indexes(engine: Engine, metadata: MetaData = None, concurrently: bool = False, jobs: int = 1,
+                  dry_run: bool = False, log=None) -> List[str]:
+    """
+    Create the declared indexes that are missing from a database, such as after a bulk load.
+
+    On PostgreSQL the indexes can be built several at a time, each on its own
+    connection, and with `concurrently`, without locking out writes to the
+    tables.  PostgreSQL can not build the index of a partitioned table
+    concurrently, so those are always built normally.  Other databases build
+    one index at a time.
+
+    Parameters
+    ----------
+    engine : :class:`~sqlalchemy.engine.Engine`
+        Database to build the indexes in
+    metadata : :class:`~sqlalchemy.schema.MetaData`
+        Table definitions with the indexes, defaults to those of the ORM classes
+    concurrently : bool
+        On PostgreSQL, use CREATE INDEX CONCURRENTLY
+    jobs : int
+        On PostgreSQL, number of indexes to build at the same time
+    dry_run : bool
+        If True, only work out the statements, without running them
+    log : :class:`logging.Logger`
+        Logger to report each statement to
+
+    Returns
+    -------
+    list of str
+        The CREATE INDEX statements
+    """
+    if metadata is None:
+        metadata = Base.metadata
+    postgres = engine.dialect.name == 'postgresql'
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        tables = set(inspector.get_table_names())
+        partitioned = _partitioned_tables(connection)
+        statements = list()
+        for table in metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            names = set(i['name'] for i in inspector.get_indexes(table.name))
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name not in names:
+                    statement = str(CreateIndex(index).compile(dialect=engine.dialect))
+                    if concurrently and postgres and table.name not in partitioned:
+                        statement = _concurrently(statement)
+                    statements.append(statement)
+    if dry_run or not statements:
+        return statements
+    autocommit = concurrently and postgres
+    if jobs > 1 and postgres:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for future in [executor.submit(_execute, engine, [statement], autocommit, log)
+                           for statement in statements]:
+                future.result()
+    else:
+        _execute(engine, statements, autocommit, log)
+    return statements
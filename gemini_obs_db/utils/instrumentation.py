@@ -0,0 +1,422 @@
+"""
+This module provides optional timing and counting hooks for the ingest path.
+
+The ORM constructors that do the work of an ingest, such as
+:class:`~gemini_obs_db.orm.diskfile.DiskFile` and
+:meth:`~gemini_obs_db.orm.header.Header.populate_fits`, mark their stages with
+:func:`stage`, and count the bytes they read with :func:`count`.  Nothing is
+measured until a sink is added with :func:`add_sink`.  With no sinks, a stage
+is a shared object whose enter and exit do nothing, so the hooks cost about as
+much as a function call.
+
+Three sinks are provided: :class:`LoggingSink` writes each measurement to a
+logger, :class:`StatsdSink` sends them to a StatsD server over UDP, and
+:class:`PrometheusTextfileSink` keeps totals and writes them out in the
+Prometheus text format, for the node exporter textfile collector.  Anything
+with `timing` and `count` methods can be used as a sink.
+"""
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+__all__ = ["Sink", "LoggingSink", "StatsdSink", "PrometheusTextfileSink", "add_sink", "remove_sink", "clear_sinks",
+           "enabled", "stage", "count", "timed", "timed_parser", "flush"]
+
+
+_sinks: List['Sink'] = list()
+
+
+class Sink:
+    """
+    Base class for the destinations of the measurements.
+    """
+    def timing(self, name: str, seconds: float, tags: Dict[str, str]):
+        """
+        Record how long a stage took.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        seconds : float
+            Time taken, in seconds
+        tags : dict
+            Extra labels for the measurement, such as the descriptor name
+        """
+        raise NotImplementedError()
+
+    def count(self, name: str, value: int, tags: Dict[str, str]):
+        """
+        Add to a counter.
+
+        Parameters
+        ----------
+        name : str
+            Name of the counter
+        value : int
+            Amount to add
+        tags : dict
+            Extra labels for the measurement
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Write out anything held back.
+        """
+        pass
+
+
+def _format_tags(tags: Dict[str, str]) -> str:
+    return ','.join('%s=%s' % (k, v) for k, v in sorted(tags.items()))
+
+
+class LoggingSink(Sink):
+    """
+    Sink that logs each measurement.
+
+    Parameters
+    ----------
+    log : :class:`logging.Logger`
+        Logger to write to, defaults to the logger of this module
+    level : int
+        Level to log at, defaults to DEBUG
+    """
+    def __init__(self, log: logging.Logger = None, level: int = logging.DEBUG):
+        self.log = log if log is not None else logging.getLogger(__name__)
+        self.level = level
+
+    def timing(self, name, seconds, tags):
+        self.log.log(self.level, "%s [%s]: %.6fs" % (name, _format_tags(tags), seconds))
+
+    def count(self, name, value, tags):
+        self.log.log(self.level, "%s [%s]: +%d" % (name, _format_tags(tags), value))
+
+
+class StatsdSink(Sink):
+    """
+    Sink that sends each measurement to a StatsD server.
+
+    Tags are sent in the DogStatsD `|#key:value` form, which plain StatsD
+    servers ignore.  Sending is fire and forget, a server that is down does
+    not hold up the ingest.
+
+    Parameters
+    ----------
+    host : str
+        StatsD host
+    port : int
+        StatsD UDP port
+    prefix : str
+        Prefix for the metric names
+    """
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'gemini_obs_db'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _send(self, name: str, value: str, kind: str, tags: Dict[str, str]):
+        message = '%s.%s:%s|%s' % (self.prefix, name, value, kind)
+        if tags:
+            message += '|#' + ','.join('%s:%s' % (k, v) for k, v in sorted(tags.items()))
+        try:
+            self._socket.sendto(message.encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+    def timing(self, name, seconds, tags):
+        self._send(name, '%.3f' % (seconds * 1000.0), 'ms', tags)
+
+    def count(self, name, value, tags):
+        self._send(name, '%d' % value, 'c', tags)
+
+
+class PrometheusTextfileSink(Sink):
+    """
+    Sink that keeps running totals and writes them in the Prometheus text format.
+
+    Stages become summaries, `<prefix>_<name>_seconds` with `_sum` and
+    `_count` series, and counters become `<prefix>_<name>_total`.  The file is
+    written by :meth:`flush`, to a temporary file that is then renamed, so the
+    collector never reads a partial file.
+
+    Parameters
+    ----------
+    path : str
+        File to write, normally in the textfile collector directory and ending in `.prom`
+    prefix : str
+        Prefix for the metric names
+    """
+    def __init__(self, path: str, prefix: str = 'gemini_obs_db'):
+        self.path = path
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._timings: Dict[Tuple[str, tuple], List[float]] = dict()
+        self._counts: Dict[Tuple[str, tuple], int] = dict()
+
+    def _metric(self, name: str) -> str:
+        return '%s_%s' % (self.prefix, ''.join(c if c.isalnum() else '_' for c in name))
+
+    def timing(self, name, seconds, tags):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            totals = self._timings.setdefault(key, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def count(self, name, value, tags):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + value
+
+    @staticmethod
+    def _labels(tags: tuple) -> str:
+        if not tags:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                 for k, v in tags)
+
+    def render(self) -> str:
+        """
+        Render the totals in the Prometheus text format.
+
+        Returns
+        -------
+        str
+            The metrics, one series per line
+        """
+        lines = list()
+        with self._lock:
+            timings = sorted(self._timings.items())
+            counts = sorted(self._counts.items())
+        typed = set()
+        for (name, tags), (total, n) in timings:
+            metric = self._metric(name) + '_seconds'
+            if metric not in typed:
+                lines.append('# TYPE %s summary' % metric)
+                typed.add(metric)
+            lines.append('%s_sum%s %r' % (metric, self._labels(tags), total))
+            lines.append('%s_count%s %d' % (metric, self._labels(tags), n))
+        for (name, tags), value in counts:
+            metric = self._metric(name) + '_total'
+            if metric not in typed:
+                lines.append('# TYPE %s counter' % metric)
+                typed.add(metric)
+            lines.append('%s%s %d' % (metric, self._labels(tags), value))
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, self.path)
+
+
+def add_sink(sink: Sink):
+    """
+    Start sending measurements to a sink.
+
+    Parameters
+    ----------
+    sink : :class:`Sink`
+        Sink to add
+    """
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: Sink):
+    """
+    Stop sending measurements to a sink.
+
+    Parameters
+    ----------
+    sink : :class:`Sink`
+        Sink to remove
+    """
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def clear_sinks():
+    """
+    Remove all the sinks, turning the instrumentation off.
+    """
+    del _sinks[:]
+
+
+def enabled() -> bool:
+    """
+    Check if any measurements are being recorded.
+
+    Returns
+    -------
+    bool
+        True if there is at least one sink
+    """
+    return bool(_sinks)
+
+
+def flush():
+    """
+    Flush all the sinks, such as writing out a Prometheus text file.
+    """
+    for sink in _sinks:
+        sink.flush()
+
+
+class _NullStage:
+    """
+    Stage used when nothing is listening, which does nothing at all.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    Stage that times its body and sends the time to the sinks.
+    """
+    __slots__ = ('name', 'tags', 'start')
+
+    def __init__(self, name: str, tags: Dict[str, str]):
+        self.name = name
+        self.tags = tags
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        tags = self.tags if exc_type is None else dict(self.tags, error=exc_type.__name__)
+        for sink in _sinks:
+            sink.timing(self.name, seconds, tags)
+        return False
+
+
+def stage(name: str, **tags):
+    """
+    Time a stage of the ingest.
+
+    Use as a context manager.  If the body raises, the time is still recorded,
+    with an extra `error` tag naming the exception.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, such as `diskfile.md5`
+    tags
+        Extra labels for the measurement
+
+    Returns
+    -------
+    context manager
+        Times its body, or does nothing if there are no sinks
+    """
+    if not _sinks:
+        return _NULL_STAGE
+    return _Stage(name, tags)
+
+
+def count(name: str, value: int = 1, **tags):
+    """
+    Add to a counter, such as the number of bytes read.
+
+    Parameters
+    ----------
+    name : str
+        Name of the counter
+    value : int
+        Amount to add
+    tags
+        Extra labels for the measurement
+    """
+    if _sinks and value:
+        for sink in _sinks:
+            sink.count(name, value, tags)
+
+
+def timed(name: str, **tags) -> Callable:
+    """
+    Decorator to time every call of a function as a stage.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+    tags
+        Extra labels for the measurement
+
+    Returns
+    -------
+    callable
+        Decorator
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+            with _Stage(name, tags):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _TimedParser:
+    """
+    Proxy for a :class:`~gemini_obs_db.utils.file_parser.FileParser` that times each descriptor.
+    """
+    __slots__ = ('_parser', '_tags')
+
+    def __init__(self, parser, tags: Dict[str, str]):
+        self._parser = parser
+        self._tags = tags
+
+    def __getattr__(self, name):
+        attr = getattr(self._parser, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        tags = dict(self._tags, descriptor=name)
+
+        def descriptor(*args, **kwargs):
+            with stage('descriptor', **tags):
+                return attr(*args, **kwargs)
+        return descriptor
+
+
+def timed_parser(parser, **tags):
+    """
+    Time each descriptor read through a file parser.
+
+    Parameters
+    ----------
+    parser : :class:`~gemini_obs_db.utils.file_parser.FileParser`
+        Parser, as returned by :func:`~gemini_obs_db.utils.file_parser.build_parser`
+    tags
+        Extra labels for the measurements.  The parser class and descriptor
+        name are always added
+
+    Returns
+    -------
+    :class:`~gemini_obs_db.utils.file_parser.FileParser`
+        The parser itself if there are no sinks, else a proxy that times each method call
+    """
+    if not _sinks:
+        return parser
+    return _TimedParser(parser, dict(tags, parser=type(parser).__name__))
@@ -0,0 +1,121 @@
+"""
+This module provides maintenance routines for backfilling derived columns.
+
+Several header columns are worked out at ingest from other columns, such as
+`ut_datetime_secs` from `ut_datetime`, or the engineering, science
+verification and calibration flags from the `program_id`.  When the rules for
+these change, or a new derived column is added, the existing rows need
+recomputing.  Doing that through the ORM, one header at a time, takes days on
+the full archive.  The routines here read the source columns in batches,
+compute the new values with the vectorized helpers in
+:mod:`~gemini_obs_db.utils.gemini_metadata_utils` and write back only the rows
+that changed, with one executemany UPDATE per batch.
+"""
+from typing import Iterable
+
+import numpy as np
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.utils.gemini_metadata_utils import parse_program_ids, ut_datetime_secs_array
+
+
+__all__ = ["DERIVED_COLUMNS", "recompute_derived_columns"]
+
+
+# Derived header columns that can be recomputed, and the columns they are derived from
+DERIVED_COLUMNS = {
+    'ut_datetime_secs': ('ut_datetime', ),
+    'engineering': ('program_id', ),
+    'science_verification': ('program_id', ),
+    'calibration_program': ('program_id', ),
+}
+
+
+def _derive(columns: Iterable[str], rows: list, names: list) -> dict:
+    """
+    Compute the derived columns for a batch of rows, returning lists of values by column name.
+    """
+    source = {name: [r[i] for r in rows] for i, name in enumerate(names)}
+    values = dict()
+    if 'ut_datetime_secs' in columns:
+        values['ut_datetime_secs'] = ut_datetime_secs_array(source['ut_datetime']).tolist()
+    flags = [c for c in ('engineering', 'science_verification', 'calibration_program') if c in columns]
+    if flags:
+        program_ids = source['program_id']
+        missing = [p is None for p in program_ids]
+        parsed = parse_program_ids(program_ids)
+        if 'engineering' in columns:
+            # program ID is None - mark as engineering
+            values['engineering'] = (parsed['is_eng'] | ~parsed['valid'] | np.array(missing, dtype=bool)).tolist()
+        if 'science_verification' in columns:
+            values['science_verification'] = (parsed['is_sv'] & ~np.array(missing, dtype=bool)).tolist()
+        if 'calibration_program' in columns:
+            # Ingest leaves this alone when there is no program ID, so we do too
+            current = source['calibration_program']
+            values['calibration_program'] = [c if m else bool(v)
+                                             for c, m, v in zip(current, missing, parsed['is_cal'])]
+    return values
+
+
+def recompute_derived_columns(session: Session, columns: Iterable[str] = None, batch_size: int = 10000,
+                              log=None) -> int:
+    """
+    Recompute derived header columns for every row, in batches.
+
+    Each batch is read with keyset pagination on the header id, the derived
+    values are computed for the whole batch with NumPy, and only the rows
+    where a value changed are written back.  Each batch is committed, so an
+    interrupted run can simply be started again.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to update with
+    columns : iterable of str
+        Columns to recompute, a subset of :data:`DERIVED_COLUMNS`.  Defaults to all of them.
+    batch_size : int
+        Number of rows to read and update per batch
+    log : :class:`logging.Logger`
+        Logger to log progress to
+
+    Returns
+    -------
+    int
+        Number of rows updated
+    """
+    columns = list(DERIVED_COLUMNS.keys()) if columns is None else list(columns)
+    unknown = set(columns) - set(DERIVED_COLUMNS.keys())
+    if unknown:
+        raise ValueError("Can not recompute column(s) %s" % ', '.join(sorted(unknown)))
+    table = Header.__table__
+    names = sorted(set(c for column in columns for c in DERIVED_COLUMNS[column]) | set(columns))
+    stmt = table.update().where(table.c.id == bindparam('_id')) \
+        .values(**{column: bindparam('_%s' % column) for column in columns})
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = session.execute(select([table.c.id] + [table.c[name] for name in names])
+                               .where(table.c.id > last_id)
+                               .order_by(table.c.id).limit(batch_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        values = _derive(columns, [r[1:] for r in rows], names)
+        params = list()
+        for i, row in enumerate(rows):
+            new = {column: values[column][i] for column in columns}
+            if any(row[names.index(column) + 1] != new[column] for column in columns):
+                param = {'_%s' % column: value for column, value in new.items()}
+                param['_id'] = row[0]
+                params.append(param)
+        if params:
+            session.execute(stmt, params)
+        session.commit()
+        updated += len(params)
+        if log:
+            log.info("Recomputed derived columns up to header id %d, %d rows updated" % (last_id, updated))
+    return updated
@@ -0,0 +1,332 @@
+"""
+This module provides optional range partitioning of the header and diskfile tables on PostgreSQL.
+
+The header and diskfile tables grow for as long as the archive runs, but most
+queries are for recent nights.  With partitioning on, `header` is partitioned
+by `ut_datetime` and `diskfile` by `datafile_timestamp`, into one partition per
+Gemini semester or per month, so vacuum, index builds and searches over a few
+nights only touch the partitions that hold them.
+
+Set `partitioning` in :mod:`~gemini_obs_db.db_config` to `semester` or `month`
+before running `create_tables`.  It creates the tables from
+:func:`partitioned_metadata`, then the partitions with
+:func:`create_partitions`.  Run :func:`create_partitions` again from cron, so
+that the partitions are always created ahead of the data that goes in them.
+Rows with no date, or a date outside the partitions, go to a default
+partition, and are moved out if a partition for them is created later.
+
+PostgreSQL requires unique constraints on a partitioned table to include the
+partition key, so the `id` of these two tables is no longer a primary key in
+the database, but part of a unique constraint on the id and the key, and is
+still filled in from its sequence.  Foreign keys can only reference a unique
+constraint, so the foreign keys to `header.id` and `diskfile.id`, from the
+instrument tables, previews, provenance and so on, are not created.  The ORM
+classes are unchanged, and the relationships between them work as before.
+
+Partition pruning only happens when a query constrains the partition key
+itself, not `ut_datetime_secs` or an expression on the key.  Use
+:func:`header_date_range`, :func:`diskfile_date_range` or
+:func:`date_range_filter` to build date filters that prune.
+"""
+import datetime
+from typing import List, Tuple
+
+from sqlalchemy import Column, ForeignKeyConstraint, Index, MetaData, Sequence, Table, UniqueConstraint, \
+    and_, inspect, text
+from sqlalchemy.engine import Engine
+
+from gemini_obs_db import db_config
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.header import Header
+
+
+__all__ = ["PARTITION_KEYS", "PARTITION_SCHEMES", "partition_bounds", "partition_name", "partitioned_metadata",
+           "create_partitions", "header_date_range", "diskfile_date_range", "date_range_filter"]
+
+
+# Partitioned tables, and the column each is partitioned on
+PARTITION_KEYS = {
+    'header': 'ut_datetime',
+    'diskfile': 'datafile_timestamp',
+}
+
+PARTITION_SCHEMES = ('semester', 'month')
+
+# Filenames carry the date of the night, which can be a day off the UT date of the observation
+DEFAULT_SLACK = datetime.timedelta(days=1)
+
+
+def partition_bounds(dt: datetime.datetime, scheme: str) -> Tuple[datetime.datetime, datetime.datetime, str]:
+    """
+    Get the range of the partition that holds a date.
+
+    Semesters run from February 1st to August 1st for A, and from August 1st
+    to February 1st for B, so January belongs to the B semester of the year
+    before.
+
+    Parameters
+    ----------
+    dt : datetime
+        Date to look up
+    scheme : str
+        `semester` or `month`
+
+    Returns
+    -------
+    datetime, datetime, str
+        Start of the partition, end of the partition (excluded), and the
+        suffix for its name, such as `2023b` or `2024_01`
+    """
+    if scheme == 'semester':
+        if dt.month >= 8:
+            return datetime.datetime(dt.year, 8, 1), datetime.datetime(dt.year + 1, 2, 1), '%db' % dt.year
+        if dt.month >= 2:
+            return datetime.datetime(dt.year, 2, 1), datetime.datetime(dt.year, 8, 1), '%da' % dt.year
+        return datetime.datetime(dt.year - 1, 8, 1), datetime.datetime(dt.year, 2, 1), '%db' % (dt.year - 1)
+    if scheme == 'month':
+        start = datetime.datetime(dt.year, dt.month, 1)
+        end = datetime.datetime(dt.year + 1, 1, 1) if dt.month == 12 else datetime.datetime(dt.year, dt.month + 1, 1)
+        return start, end, '%d_%02d' % (dt.year, dt.month)
+    raise ValueError("Unknown partitioning scheme %s, expected one of %s" % (scheme, ', '.join(PARTITION_SCHEMES)))
+
+
+def partition_name(table_name: str, dt: datetime.datetime, scheme: str) -> str:
+    """
+    Get the name of the partition of a table that holds a date.
+
+    Parameters
+    ----------
+    table_name : str
+        `header` or `diskfile`
+    dt : datetime
+        Date to look up
+    scheme : str
+        `semester` or `month`
+
+    Returns
+    -------
+    str
+        Name of the partition, such as `header_2023b`
+    """
+    return '%s_%s' % (table_name, partition_bounds(dt, scheme)[2])
+
+
+def _partitioned_copy(table: Table, key: str, metadata: MetaData) -> Table:
+    """
+    Copy a table into a metadata, as a table partitioned on a key.
+    """
+    columns = list()
+    for column in table.columns:
+        if column.primary_key:
+            sequence = '%s_%s_seq' % (table.name, column.name)
+            columns.append(Column(column.name, column.type, Sequence(sequence), nullable=False,
+                                  server_default=text("nextval('%s'::regclass)" % sequence)))
+        else:
+            columns.append(column.copy())
+    foreign_keys = [constraint.copy() for constraint in table.foreign_key_constraints]
+    copy = Table(table.name, metadata, *(columns + foreign_keys),
+                 UniqueConstraint('id', key, name='uq_%s_id_%s' % (table.name, key)),
+                 postgresql_partition_by='RANGE (%s)' % key)
+    # Indexes declared with index=True came across with the columns
+    names = set(index.name for index in copy.indexes)
+    for index in table.indexes:
+        if index.name not in names:
+            Index(index.name, *[copy.c[c.name] for c in index.columns], unique=index.unique, **index.dialect_kwargs)
+    return copy
+
+
+def partitioned_metadata(metadata: MetaData = None) -> MetaData:
+    """
+    Copy the table definitions, with the header and diskfile tables partitioned.
+
+    Create the tables from this copy to get a partitioned database.  The ORM
+    classes keep using the original definitions.
+
+    Parameters
+    ----------
+    metadata : :class:`~sqlalchemy.schema.MetaData`
+        Table definitions to copy, defaults to those of the ORM classes
+
+    Returns
+    -------
+    :class:`~sqlalchemy.schema.MetaData`
+        The copy, with the partitioned tables and without foreign keys to them
+    """
+    if metadata is None:
+        metadata = Base.metadata
+    partitioned = MetaData()
+    for table in metadata.sorted_tables:
+        if table.name in PARTITION_KEYS:
+            _partitioned_copy(table, PARTITION_KEYS[table.name], partitioned)
+        else:
+            table.tometadata(partitioned)
+    for table in partitioned.tables.values():
+        for constraint in list(table.constraints):
+            if isinstance(constraint, ForeignKeyConstraint) \
+                    and constraint.elements[0].target_fullname.split('.')[0] in PARTITION_KEYS:
+                table.constraints.remove(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+                    table.foreign_keys.discard(element)
+    return partitioned
+
+
+def _literal(table_name: str, dt: datetime.datetime) -> str:
+    # datafile_timestamp is a timestamp with time zone, the bounds are in UTC
+    if table_name == 'diskfile':
+        return "'%s+00'" % dt.strftime('%Y-%m-%d %H:%M:%S')
+    return "'%s'" % dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _create_partition(connection, table_name: str, name: str, start: datetime.datetime, end: datetime.datetime):
+    key = PARTITION_KEYS[table_name]
+    bounds = "FOR VALUES FROM (%s) TO (%s)" % (_literal(table_name, start), _literal(table_name, end))
+    in_range = "%s >= %s AND %s < %s" % (key, _literal(table_name, start), key, _literal(table_name, end))
+    default = '%s_default' % table_name
+    stranded = connection.execute(text("SELECT EXISTS (SELECT 1 FROM %s WHERE %s)" % (default, in_range))).scalar()
+    if not stranded:
+        connection.execute(text("CREATE TABLE %s PARTITION OF %s %s" % (name, table_name, bounds)))
+        return
+    # Rows for the new partition already sit in the default one, and would
+    # block its creation, so move them across
+    connection.execute(text("ALTER TABLE %s DETACH PARTITION %s" % (table_name, default)))
+    connection.execute(text("CREATE TABLE %s PARTITION OF %s %s" % (name, table_name, bounds)))
+    connection.execute(text("INSERT INTO %s SELECT * FROM %s WHERE %s" % (table_name, default, in_range)))
+    connection.execute(text("DELETE FROM %s WHERE %s" % (default, in_range)))
+    connection.execute(text("ALTER TABLE %s ATTACH PARTITION %s DEFAULT" % (table_name, default)))
+
+
+def _periods(scheme: str, start: datetime.datetime, ahead: int, now: datetime.datetime) -> list:
+    """
+    List the partition ranges from the one holding `start` to `ahead` after the one holding `now`.
+    """
+    periods = list()
+    dt = start if start is not None else now
+    while True:
+        period_start, period_end, suffix = partition_bounds(dt, scheme)
+        periods.append((period_start, period_end, suffix))
+        if period_start > now:
+            ahead -= 1
+        if period_end > now and ahead <= 0:
+            return periods
+        dt = period_end
+
+
+def create_partitions(engine: Engine, scheme: str = None, start: datetime.datetime = None, ahead: int = None,
+                      log=None) -> List[str]:
+    """
+    Create the partitions of the header and diskfile tables that do not exist yet.
+
+    The default partitions are created too, if they are missing.  Call this
+    on a schedule, so there is always a partition ready for new data.
+
+    Parameters
+    ----------
+    engine : :class:`~sqlalchemy.engine.Engine`
+        PostgreSQL database, with the tables from :func:`partitioned_metadata`
+    scheme : str
+        `semester` or `month`, defaults to `partitioning` in :mod:`~gemini_obs_db.db_config`
+    start : datetime
+        Date of the first partition, defaults to now.  Set it to the date of
+        the oldest data when partitioning an archive being reloaded
+    ahead : int
+        Number of partitions to create after the current one, defaults to
+        `partitions_ahead` in :mod:`~gemini_obs_db.db_config`
+    log : :class:`logging.Logger`
+        Logger to report each new partition to
+
+    Returns
+    -------
+    list of str
+        Names of the partitions created
+    """
+    if scheme is None:
+        scheme = db_config.partitioning
+    if ahead is None:
+        ahead = db_config.partitions_ahead
+    periods = _periods(scheme, start, ahead, datetime.datetime.utcnow())
+    created = list()
+    with engine.begin() as connection:
+        existing = set(inspect(connection).get_table_names())
+        for table_name in PARTITION_KEYS:
+            default = '%s_default' % table_name
+            if default not in existing:
+                connection.execute(text("CREATE TABLE %s PARTITION OF %s DEFAULT" % (default, table_name)))
+                created.append(default)
+            for period_start, period_end, suffix in periods:
+                name = '%s_%s' % (table_name, suffix)
+                if name not in existing:
+                    _create_partition(connection, table_name, name, period_start, period_end)
+                    created.append(name)
+    if log is not None:
+        for name in created:
+            log.info("Created partition %s" % name)
+    return created
+
+
+def header_date_range(start: datetime.datetime, end: datetime.datetime):
+    """
+    Filter headers to a range of UT dates, so that only their partitions are read.
+
+    Parameters
+    ----------
+    start : datetime
+        First UT date and time to include
+    end : datetime
+        UT date and time to stop at, excluded
+
+    Returns
+    -------
+    :class:`~sqlalchemy.sql.expression.ClauseElement`
+        Condition on `ut_datetime`
+    """
+    return and_(Header.ut_datetime >= start, Header.ut_datetime < end)
+
+
+def diskfile_date_range(start: datetime.datetime, end: datetime.datetime,
+                        slack: datetime.timedelta = DEFAULT_SLACK):
+    """
+    Filter diskfiles to those of a range of UT dates, so that only their partitions are read.
+
+    The diskfiles are partitioned on the date in their filename, which is
+    the date of the night and can be a day off the UT date, so the range is
+    widened by `slack` either side.  Combine this with
+    :func:`header_date_range` for the exact range.
+
+    Parameters
+    ----------
+    start : datetime
+        First UT date and time to include
+    end : datetime
+        UT date and time to stop at, excluded
+    slack : timedelta
+        How far to widen the range either side
+
+    Returns
+    -------
+    :class:`~sqlalchemy.sql.expression.ClauseElement`
+        Condition on `datafile_timestamp`
+    """
+    return and_(DiskFile.datafile_timestamp >= start - slack, DiskFile.datafile_timestamp < end + slack)
+
+
+def date_range_filter(start: datetime.datetime, end: datetime.datetime, slack: datetime.timedelta = DEFAULT_SLACK):
+    """
+    Filter a query joining headers to diskfiles to a range of UT dates, pruning both tables.
+
+    Parameters
+    ----------
+    start : datetime
+        First UT date and time to include
+    end : datetime
+        UT date and time to stop at, excluded
+    slack : timedelta
+        How far to widen the range on the diskfiles, see :func:`diskfile_date_range`
+
+    Returns
+    -------
+    :class:`~sqlalchemy.sql.expression.ClauseElement`
+        Condition on `ut_datetime` and `datafile_timestamp`
+    """
+    return and_(header_date_range(start, end), diskfile_date_range(start, end, slack))
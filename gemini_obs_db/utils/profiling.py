@@ -0,0 +1,305 @@
+"""
+This module provides lightweight latency statistics and the descriptor profiler.
+
+:class:`LatencyHistogram` keeps the distribution of a latency in a fixed set
+of logarithmic buckets, so it uses the same small amount of memory however
+many times it is fed, and still gives percentiles to within a few percent.
+
+The descriptor profiler records, for every instrument and descriptor read
+through :meth:`~gemini_obs_db.utils.file_parser.FileParser._try_or_none`, the
+number of calls, the latency distribution, the number of None results and the
+failures by exception type.  It is off by default, and costs one attribute
+check per descriptor when off.  Turn it on with
+:func:`enable_descriptor_profiling`, and a report of where the time went is
+written when the process exits.  The report shows which descriptors are slow,
+or fail on every file of an instrument, and so are worth replacing with a
+direct keyword read for that instrument.
+"""
+import atexit
+import math
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple, Union
+
+
+__all__ = ["LatencyHistogram", "DescriptorStats", "DescriptorProfiler", "enable_descriptor_profiling",
+           "disable_descriptor_profiling", "descriptor_profiler"]
+
+
+class LatencyHistogram:
+    """
+    Bounded histogram of latencies, with logarithmic buckets.
+
+    Each decade from `low` to `high` seconds is split into `per_decade`
+    buckets.  Values outside that range go into the first or last bucket, but
+    the exact minimum and maximum are kept too.  Percentiles are interpolated
+    geometrically within a bucket, so with the default of 20 buckets per
+    decade they are within about 6% of the true value.
+
+    Parameters
+    ----------
+    low : float
+        Lower edge of the first bucket, in seconds
+    high : float
+        Upper edge of the last bucket, in seconds
+    per_decade : int
+        Number of buckets per factor of ten
+    """
+    __slots__ = ('low', 'per_decade', 'buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self, low: float = 1e-6, high: float = 100.0, per_decade: int = 20):
+        self.low = low
+        self.per_decade = per_decade
+        self.buckets = [0] * (int(round(math.log10(high / low) * per_decade)) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, seconds: float) -> int:
+        if seconds <= self.low:
+            return 0
+        return min(int(math.log10(seconds / self.low) * self.per_decade) + 1, len(self.buckets) - 1)
+
+    def _edges(self, index: int) -> Tuple[float, float]:
+        if index == 0:
+            return self.low, self.low
+        return (self.low * 10.0 ** ((index - 1) / self.per_decade),
+                self.low * 10.0 ** (index / self.per_decade))
+
+    def record(self, seconds: float):
+        """
+        Add a latency.
+
+        Parameters
+        ----------
+        seconds : float
+            Latency in seconds
+        """
+        self.buckets[self._index(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram'):
+        """
+        Add the latencies of another histogram with the same buckets to this one.
+
+        Parameters
+        ----------
+        other : :class:`LatencyHistogram`
+            Histogram to add
+        """
+        if len(other.buckets) != len(self.buckets) or other.low != self.low:
+            raise ValueError("Can not merge histograms with different buckets")
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, q: float) -> Union[float, None]:
+        """
+        Estimate a percentile of the latencies.
+
+        Parameters
+        ----------
+        q : float
+            Percentile, from 0 to 100
+
+        Returns
+        -------
+        float or None
+            Estimated latency in seconds, or None if nothing has been recorded
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower, upper = self._edges(index)
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                if upper <= lower:
+                    return lower
+                # interpolate geometrically within the bucket
+                return lower * (upper / lower) ** ((rank - seen) / n)
+            seen += n
+        return self.max
+
+    @property
+    def mean(self) -> Union[float, None]:
+        """
+        Mean latency in seconds, or None if nothing has been recorded
+        """
+        return self.total / self.count if self.count else None
+
+
+class DescriptorStats:
+    """
+    Statistics for one descriptor of one instrument.
+    """
+    __slots__ = ('latency', 'nones', 'failures')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.nones = 0
+        self.failures = Counter()
+
+    @property
+    def calls(self) -> int:
+        """
+        Number of times the descriptor was read
+        """
+        return self.latency.count
+
+
+class DescriptorProfiler:
+    """
+    Collects descriptor statistics by (instrument, descriptor).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats: Dict[Tuple[str, str], DescriptorStats] = dict()
+
+    def record(self, instrument: str, descriptor: str, seconds: float, value=None, error: Exception = None):
+        """
+        Record one read of a descriptor.
+
+        Parameters
+        ----------
+        instrument : str
+            Instrument of the file
+        descriptor : str
+            Name of the descriptor
+        seconds : float
+            Time taken to read it
+        value
+            Value returned, only checked for None
+        error : Exception
+            Exception raised, if it failed
+        """
+        key = (instrument, descriptor)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = DescriptorStats()
+            stats.latency.record(seconds)
+            if error is not None:
+                stats.failures[type(error).__name__] += 1
+            elif value is None:
+                stats.nones += 1
+
+    def reset(self):
+        """
+        Forget everything recorded so far.
+        """
+        with self._lock:
+            self.stats = dict()
+
+    def rows(self) -> List[tuple]:
+        """
+        Get the statistics as rows, slowest in total first.
+
+        Returns
+        -------
+        list of tuple
+            (instrument, descriptor, calls, failures, nones, total seconds, p50, p95, p99, failures by type)
+        """
+        with self._lock:
+            items = list(self.stats.items())
+        rows = list()
+        for (instrument, descriptor), stats in items:
+            latency = stats.latency
+            rows.append((instrument, descriptor, stats.calls, sum(stats.failures.values()), stats.nones,
+                         latency.total, latency.percentile(50), latency.percentile(95), latency.percentile(99),
+                         dict(stats.failures)))
+        rows.sort(key=lambda r: -r[5])
+        return rows
+
+    def report(self) -> str:
+        """
+        Format the statistics as a table, slowest in total first.
+
+        Returns
+        -------
+        str
+            The report
+        """
+        lines = ['%-12s %-28s %8s %8s %8s %10s %9s %9s %9s  %s'
+                 % ('instrument', 'descriptor', 'calls', 'failed', 'none', 'total ms', 'p50 ms', 'p95 ms', 'p99 ms',
+                    'failures')]
+        for instrument, descriptor, calls, failed, nones, total, p50, p95, p99, failures in self.rows():
+            lines.append('%-12s %-28s %8d %8d %8d %10.2f %9.3f %9.3f %9.3f  %s'
+                         % (instrument, descriptor, calls, failed, nones, total * 1000.0, p50 * 1000.0,
+                            p95 * 1000.0, p99 * 1000.0,
+                            ', '.join('%s: %d' % f for f in sorted(failures.items(), key=lambda f: -f[1]))))
+        return '\n'.join(lines)
+
+
+_profiler: Union[DescriptorProfiler, None] = None
+_report_log = None
+_atexit_registered = False
+
+
+def _report_at_exit():
+    if _profiler is not None and _profiler.stats:
+        report = "Descriptor profile:\n" + _profiler.report()
+        if _report_log is not None:
+            _report_log.info(report)
+        else:
+            print(report, file=sys.stderr)
+
+
+def enable_descriptor_profiling(report_at_exit: bool = True, log=None) -> DescriptorProfiler:
+    """
+    Start profiling the descriptors read through the file parsers.
+
+    Parameters
+    ----------
+    report_at_exit : bool
+        If True, write the report when the process exits
+    log : :class:`logging.Logger`
+        Logger to write the report to, defaults to stderr
+
+    Returns
+    -------
+    :class:`DescriptorProfiler`
+        The profiler, which can also be read at any time
+    """
+    global _profiler, _report_log, _atexit_registered
+    if _profiler is None:
+        _profiler = DescriptorProfiler()
+    _report_log = log
+    if report_at_exit and not _atexit_registered:
+        atexit.register(_report_at_exit)
+        _atexit_registered = True
+    return _profiler
+
+
+def disable_descriptor_profiling():
+    """
+    Stop profiling the descriptors, and drop what was recorded.
+    """
+    global _profiler
+    _profiler = None
+
+
+def descriptor_profiler() -> Union[DescriptorProfiler, None]:
+    """
+    Get the active descriptor profiler.
+
+    Returns
+    -------
+    :class:`DescriptorProfiler` or None
+        The profiler, or None if profiling is off
+    """
+    return _profiler
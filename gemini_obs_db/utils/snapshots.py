@@ -0,0 +1,195 @@
+"""
+This module provides a lightweight, read-only query API for the ORM tables.
+
+Loading large numbers of :class:`~gemini_obs_db.orm.header.Header` or
+:class:`~gemini_obs_db.orm.diskfile.DiskFile` records as full ORM instances is
+expensive.  Each instance is entered into the session identity map, carries
+instrumented attributes and relationship loaders, and keeps a reference to the
+session.  For reporting style jobs we only want the column values.
+
+The helpers here query the mapped columns directly, so the session never builds
+ORM instances for the results.  Rows come back as compact, immutable
+namedtuple records or as column-oriented NumPy arrays.
+"""
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Dict
+
+import numpy as np
+
+from sqlalchemy import Integer, Numeric, Float, Boolean, DateTime, Date
+from sqlalchemy.orm import Session
+
+
+__all__ = ["snapshot_type", "iter_snapshots", "query_snapshots", "query_arrays"]
+
+
+def _column_names(orm_class, columns: Iterable[str] = None) -> tuple:
+    """
+    Get the column names to fetch for an ORM class, validating any requested names.
+    """
+    table_columns = orm_class.__table__.columns
+    if columns is None:
+        return tuple(c.name for c in table_columns)
+    columns = tuple(columns)
+    for name in columns:
+        if name not in table_columns:
+            raise ValueError("%s has no column '%s'" % (orm_class.__name__, name))
+    return columns
+
+
+@lru_cache(maxsize=None)
+def _snapshot_type(orm_class, columns: tuple):
+    return namedtuple("%sSnapshot" % orm_class.__name__, columns)
+
+
+def snapshot_type(orm_class, columns: Iterable[str] = None):
+    """
+    Get the record type used for read-only snapshots of an ORM class.
+
+    The record type is a namedtuple with one field per requested column.  These
+    have no per-instance dictionary and are immutable, so they are much more
+    compact than the ORM instances and are safe to share.  The types are cached,
+    so asking twice for the same class and columns gives the same type.
+
+    Parameters
+    ----------
+    orm_class : class
+        ORM class, such as :class:`~gemini_obs_db.orm.header.Header`
+    columns : list of str
+        Names of the columns to include, defaults to all columns of the table
+
+    Returns
+    -------
+    type
+        namedtuple type for the snapshot records
+    """
+    return _snapshot_type(orm_class, _column_names(orm_class, columns))
+
+
+def _column_query(session: Session, orm_class, columns: tuple, criteria, joins, order_by):
+    query = session.query(*[getattr(orm_class.__table__.c, name) for name in columns])
+    query = query.select_from(orm_class)
+    for join in joins or ():
+        query = query.join(join)
+    if criteria:
+        query = query.filter(*criteria)
+    if order_by is not None:
+        query = query.order_by(order_by)
+    return query
+
+
+def iter_snapshots(session: Session, orm_class, *criteria, columns: Iterable[str] = None,
+                   joins: Iterable = None, order_by=None, yield_per: int = 1000) -> Iterator[tuple]:
+    """
+    Iterate over read-only snapshots of the rows of an ORM class.
+
+    This queries the table columns rather than the mapped entity, so no
+    ORM instances are created and the session identity map is untouched.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    orm_class : class
+        ORM class to snapshot, such as :class:`~gemini_obs_db.orm.header.Header`
+    criteria : SQLAlchemy expressions
+        Filter criteria, for example ``Header.instrument == 'GMOS-N'``
+    columns : list of str
+        Names of the columns to include, defaults to all columns of the table
+    joins : list
+        Entities or relationships to join to, for criteria on related tables
+    order_by : SQLAlchemy expression
+        Ordering for the results, if any
+    yield_per : int
+        Number of rows to fetch from the database cursor at a time
+
+    Returns
+    -------
+    iterator of namedtuple
+        Snapshot records, see :func:`snapshot_type`
+    """
+    columns = _column_names(orm_class, columns)
+    record = _snapshot_type(orm_class, columns)
+    query = _column_query(session, orm_class, columns, criteria, joins, order_by)
+    for row in query.yield_per(yield_per):
+        yield record._make(row)
+
+
+def query_snapshots(session: Session, orm_class, *criteria, columns: Iterable[str] = None,
+                    joins: Iterable = None, order_by=None) -> List[tuple]:
+    """
+    Get a list of read-only snapshots of the rows of an ORM class.
+
+    See :func:`iter_snapshots` for a description of the parameters.
+
+    Returns
+    -------
+    list of namedtuple
+        Snapshot records, see :func:`snapshot_type`
+    """
+    columns = _column_names(orm_class, columns)
+    record = _snapshot_type(orm_class, columns)
+    query = _column_query(session, orm_class, columns, criteria, joins, order_by)
+    return [record._make(row) for row in query]
+
+
+def _to_array(values: list, coltype) -> np.ndarray:
+    """
+    Convert a list of column values to the most natural NumPy array for the column type.
+
+    Missing values become NaN for numeric columns and NaT for dates.  Integer
+    columns with missing values are promoted to float so they can hold NaN.
+    Anything else, including text, enums and nullable booleans, is kept as an
+    object array.
+    """
+    has_none = any(v is None for v in values)
+    if isinstance(coltype, Boolean):
+        if not has_none:
+            return np.array(values, dtype=bool)
+    elif isinstance(coltype, Integer):
+        if not has_none:
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    elif isinstance(coltype, (Numeric, Float)):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    elif isinstance(coltype, DateTime):
+        return np.array([np.datetime64('NaT') if v is None else np.datetime64(v.replace(tzinfo=None), 'us')
+                         for v in values], dtype='datetime64[us]')
+    elif isinstance(coltype, Date):
+        return np.array([np.datetime64('NaT') if v is None else
+                         np.datetime64(v.date() if isinstance(v, datetime) else v, 'D')
+                         for v in values], dtype='datetime64[D]')
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+def query_arrays(session: Session, orm_class, *criteria, columns: Iterable[str] = None,
+                 joins: Iterable = None, order_by=None) -> Dict[str, np.ndarray]:
+    """
+    Get the rows of an ORM class as column-oriented NumPy arrays.
+
+    Numeric columns become float arrays with NaN for missing values, integer
+    columns become int64 arrays (or float if there are missing values), date
+    and time columns become `datetime64` arrays with NaT for missing values.
+    Text and enumerated columns are returned as object arrays.
+
+    See :func:`iter_snapshots` for a description of the parameters.
+
+    Returns
+    -------
+    dict of str to :class:`numpy.ndarray`
+        Dictionary of column name to array of values, all arrays have the same length
+    """
+    columns = _column_names(orm_class, columns)
+    query = _column_query(session, orm_class, columns, criteria, joins, order_by)
+    rows = query.all()
+    table_columns = orm_class.__table__.columns
+    if rows:
+        column_values = list(zip(*rows))
+    else:
+        column_values = [()] * len(columns)
+    return {name: _to_array(list(values), table_columns[name].type)
+            for name, values in zip(columns, column_values)}
@@ -0,0 +1,443 @@
+"""
+This module provides a HEALPix based spatial index for cone and box searches.
+
+Each header with a valid RA/Dec gets the NESTED HEALPix pixel number at order
+:data:`HEALPIX_ORDER` stored in an indexed column.  In the NESTED scheme the
+pixels of a coarser order are contiguous ranges of the finer pixel numbers, so
+this single column serves every order up to :data:`HEALPIX_ORDER`.  Pixel `p`
+at order `k` is the range ``[p << 2*(HEALPIX_ORDER-k), (p+1) << 2*(HEALPIX_ORDER-k))``.
+
+A cone search first works out a small set of pixel ranges that cover the cone,
+which the database can answer from the index, and only then applies the exact
+angular distance test to the surviving rows.
+
+The HEALPix implementation follows Gorski et al. 2005, ApJ 622, 759 and the
+reference C library.  It is plain NumPy, so it works on scalars and arrays alike.
+
+The exact distance test in SQL uses the trigonometric functions.  These are
+built in to PostgreSQL and available in SQLite 3.35 and later when compiled
+with the math functions, which includes the SQLite shipped with recent Pythons.
+"""
+import math
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from sqlalchemy import and_, or_, func, select, bindparam
+from sqlalchemy.orm import Query, Session
+
+
+__all__ = [
+    "HEALPIX_ORDER",
+    "ang2pix_nest",
+    "pix2ang_nest",
+    "healpix_index",
+    "cone_pixel_ranges",
+    "box_pixel_ranges",
+    "cone_search",
+    "box_search",
+    "update_healpix",
+]
+
+
+# Order 14 is nside 16384, about 12.9 arcsec pixels, the finest order we store.
+HEALPIX_ORDER = 14
+
+# Upper bound on the angular radius of a pixel, in units of 1/nside radians.
+# The true value tends to 1.06897 for large nside and is smaller for small nside.
+_MAX_PIXRAD_FACTOR = 1.1
+
+# Limit on how far below the target pixel size we refine a cone, keeps the number of ranges small
+_CONE_REFINE_PIXELS = 4
+
+_JRLL = np.array([2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4], dtype=np.int64)
+_JPLL = np.array([1, 3, 5, 7, 0, 2, 4, 6, 1, 3, 5, 7], dtype=np.int64)
+
+
+def _spread_bits(v: np.ndarray, order: int) -> np.ndarray:
+    """
+    Interleave zeros between the bits of `v`, so bit i moves to bit 2i.
+    """
+    result = np.zeros_like(v)
+    for bit in range(order):
+        result |= ((v >> bit) & 1) << (2 * bit)
+    return result
+
+
+def _compress_bits(v: np.ndarray, order: int) -> np.ndarray:
+    """
+    Inverse of :func:`_spread_bits`, collecting the even bits of `v`.
+    """
+    result = np.zeros_like(v)
+    for bit in range(order):
+        result |= ((v >> (2 * bit)) & 1) << bit
+    return result
+
+
+def ang2pix_nest(order: int, ra, dec) -> Union[int, np.ndarray]:
+    """
+    Get the NESTED HEALPix pixel number for sky positions.
+
+    Parameters
+    ----------
+    order : int
+        HEALPix order, the number of pixels per base pixel side is ``2**order``
+    ra : float or array
+        Right Ascension in decimal degrees
+    dec : float or array
+        Declination in decimal degrees
+
+    Returns
+    -------
+    int or :class:`numpy.ndarray`
+        Pixel number(s), as an int for scalar inputs
+    """
+    scalar = np.ndim(ra) == 0 and np.ndim(dec) == 0
+    nside = 1 << order
+    phi = np.radians(np.atleast_1d(np.asarray(ra, dtype=np.float64)))
+    theta = np.radians(np.atleast_1d(np.asarray(dec, dtype=np.float64)))
+    phi, theta = np.broadcast_arrays(phi, theta)
+    z = np.sin(theta)
+    s = np.cos(theta)
+    za = np.abs(z)
+    tt = np.mod(phi, 2.0 * np.pi) * (2.0 / np.pi)
+    tt = np.where(tt >= 4.0, 0.0, tt)
+
+    face = np.empty(z.shape, dtype=np.int64)
+    ix = np.empty(z.shape, dtype=np.int64)
+    iy = np.empty(z.shape, dtype=np.int64)
+
+    # Equatorial region
+    eq = za <= 2.0 / 3.0
+    temp1 = nside * (0.5 + tt[eq])
+    temp2 = nside * (z[eq] * 0.75)
+    jp = (temp1 - temp2).astype(np.int64)
+    jm = (temp1 + temp2).astype(np.int64)
+    ifp = jp // nside
+    ifm = jm // nside
+    face[eq] = np.where(ifp == ifm, ifp | 4, np.where(ifp < ifm, ifp, ifm + 8))
+    ix[eq] = jm & (nside - 1)
+    iy[eq] = nside - (jp & (nside - 1)) - 1
+
+    # Polar caps
+    polar = ~eq
+    ntt = np.minimum(tt[polar].astype(np.int64), 3)
+    tp = tt[polar] - ntt
+    tmp = nside * s[polar] / np.sqrt((1.0 + za[polar]) / 3.0)
+    jp = np.minimum((tp * tmp).astype(np.int64), nside - 1)
+    jm = np.minimum(((1.0 - tp) * tmp).astype(np.int64), nside - 1)
+    north = z[polar] >= 0
+    face[polar] = np.where(north, ntt, ntt + 8)
+    ix[polar] = np.where(north, nside - jm - 1, jp)
+    iy[polar] = np.where(north, nside - jp - 1, jm)
+
+    pix = face * (nside * nside) + _spread_bits(ix, order) + (_spread_bits(iy, order) << 1)
+    return int(pix[0]) if scalar else pix
+
+
+def pix2ang_nest(order: int, pix) -> Tuple[Union[float, np.ndarray], Union[float, np.ndarray]]:
+    """
+    Get the sky position of the center of NESTED HEALPix pixels.
+
+    Parameters
+    ----------
+    order : int
+        HEALPix order, the number of pixels per base pixel side is ``2**order``
+    pix : int or array
+        Pixel number(s)
+
+    Returns
+    -------
+    tuple of float or :class:`numpy.ndarray`
+        RA and Dec of the pixel center(s) in decimal degrees
+    """
+    scalar = np.ndim(pix) == 0
+    nside = 1 << order
+    npface = nside * nside
+    pix = np.atleast_1d(np.asarray(pix, dtype=np.int64))
+    face = pix // npface
+    ipf = pix & (npface - 1)
+    ix = _compress_bits(ipf, order)
+    iy = _compress_bits(ipf >> 1, order)
+
+    fact2 = 4.0 / (12 * npface)
+    fact1 = (nside << 1) * fact2
+    jr = _JRLL[face] * nside - ix - iy - 1
+
+    nr = np.where(jr < nside, jr, np.where(jr > 3 * nside, 4 * nside - jr, nside))
+    tmp = nr * nr * fact2
+    z = np.where(jr < nside, 1.0 - tmp, np.where(jr > 3 * nside, tmp - 1.0, (2 * nside - jr) * fact1))
+
+    jp = _JPLL[face] * nr + ix - iy
+    jp = np.where(jp < 0, jp + 8 * nr, jp)
+    phi = np.where(nr == nside, 0.75 * (np.pi / 2.0) * jp * fact1, (0.5 * (np.pi / 2.0) * jp) / nr)
+
+    ra = np.degrees(phi)
+    dec = np.degrees(np.arcsin(np.clip(z, -1.0, 1.0)))
+    if scalar:
+        return float(ra[0]), float(dec[0])
+    return ra, dec
+
+
+def healpix_index(ra, dec) -> Union[int, None]:
+    """
+    Get the value for the spatial index column of a header.
+
+    Parameters
+    ----------
+    ra : float
+        Right Ascension in decimal degrees, may be None
+    dec : float
+        Declination in decimal degrees, may be None
+
+    Returns
+    -------
+    int or None
+        NESTED pixel number at :data:`HEALPIX_ORDER`, or None if the position is missing or invalid
+    """
+    if ra is None or dec is None:
+        return None
+    ra = float(ra)
+    dec = float(dec)
+    if not (math.isfinite(ra) and -90.0 <= dec <= 90.0):
+        return None
+    return ang2pix_nest(HEALPIX_ORDER, ra, dec)
+
+
+def _angular_distance(ra1, dec1, ra2, dec2):
+    """
+    Angular distance in radians between positions given in degrees, by the haversine formula.
+    """
+    ra1, dec1, ra2, dec2 = (np.radians(v) for v in (ra1, dec1, ra2, dec2))
+    a = np.sin((dec2 - dec1) / 2.0) ** 2 + np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2.0) ** 2
+    return 2.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = list()
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def cone_pixel_ranges(ra: float, dec: float, radius: float, order: int = HEALPIX_ORDER) -> List[Tuple[int, int]]:
+    """
+    Get ranges of NESTED pixel numbers at `order` that cover a cone.
+
+    We walk down the pixel hierarchy from the 12 base pixels.  A pixel that is
+    entirely outside the cone is dropped, one that is entirely inside is kept
+    whole, and the rest are split into their 4 children.  We stop splitting
+    once the pixels are a few times smaller than the cone, so the cover is a
+    little generous but only needs a handful of ranges.
+
+    Parameters
+    ----------
+    ra : float
+        Right Ascension of the cone center in decimal degrees
+    dec : float
+        Declination of the cone center in decimal degrees
+    radius : float
+        Radius of the cone in decimal degrees
+    order : int
+        Order of the pixel numbers to return the ranges in, defaults to :data:`HEALPIX_ORDER`
+
+    Returns
+    -------
+    list of tuple of int
+        Sorted, non-overlapping, half-open ``(start, end)`` pixel number ranges
+    """
+    radius_rad = math.radians(radius)
+    if radius_rad >= math.pi:
+        return [(0, 12 << (2 * order))]
+
+    # Finest order to split down to, where pixels are a fraction of the cone radius
+    refine_order = 0
+    while refine_order < order and \
+            _MAX_PIXRAD_FACTOR / (1 << refine_order) > radius_rad / _CONE_REFINE_PIXELS:
+        refine_order += 1
+
+    ranges = list()
+    pixels = np.arange(12, dtype=np.int64)
+    for k in range(refine_order + 1):
+        pixrad = _MAX_PIXRAD_FACTOR / (1 << k)
+        centers_ra, centers_dec = pix2ang_nest(k, pixels)
+        dist = _angular_distance(ra, dec, centers_ra, centers_dec)
+        overlap = dist <= radius_rad + pixrad
+        inside = dist + pixrad <= radius_rad
+        keep = inside if k < refine_order else overlap
+        shift = 2 * (order - k)
+        ranges.extend((int(p) << shift, (int(p) + 1) << shift) for p in pixels[keep])
+        partial = pixels[overlap & ~keep]
+        pixels = (partial[:, None] * 4 + np.arange(4, dtype=np.int64)).ravel()
+        if not len(pixels):
+            break
+    return _merge_ranges(ranges)
+
+
+def box_pixel_ranges(ra_min: float, ra_max: float, dec_min: float, dec_max: float,
+                     order: int = HEALPIX_ORDER) -> List[Tuple[int, int]]:
+    """
+    Get ranges of NESTED pixel numbers at `order` that cover an RA/Dec box.
+
+    If `ra_min` is greater than `ra_max`, the box wraps through RA 0.  The box
+    is covered by the cone circumscribing it.  Along a line of constant
+    declination the distance to the box center grows with the RA offset, so
+    the corners are the furthest points from the center.
+
+    Parameters
+    ----------
+    ra_min, ra_max : float
+        RA limits of the box in decimal degrees
+    dec_min, dec_max : float
+        Dec limits of the box in decimal degrees
+    order : int
+        Order of the pixel numbers to return the ranges in, defaults to :data:`HEALPIX_ORDER`
+
+    Returns
+    -------
+    list of tuple of int
+        Sorted, non-overlapping, half-open ``(start, end)`` pixel number ranges
+    """
+    ra_width = (ra_max - ra_min) % 360.0
+    if ra_width == 0.0 and ra_max != ra_min:
+        ra_width = 360.0
+    center_ra = (ra_min + ra_width / 2.0) % 360.0
+    center_dec = (dec_min + dec_max) / 2.0
+    corners_ra = np.array([ra_min, ra_min, ra_max, ra_max])
+    corners_dec = np.array([dec_min, dec_max, dec_min, dec_max])
+    radius = np.degrees(np.max(_angular_distance(center_ra, center_dec, corners_ra, corners_dec)))
+    if ra_width > 180.0:
+        # The circumscribing cone of a very wide box is not centered on the box, use the whole sky
+        radius = 180.0
+    return cone_pixel_ranges(center_ra, center_dec, radius, order)
+
+
+def _header_class(orm_class):
+    # Imported here as the header module uses this one to fill in its spatial index
+    if orm_class is None:
+        from gemini_obs_db.orm.header import Header
+        return Header
+    return orm_class
+
+
+def _pixel_filter(column, ranges: List[Tuple[int, int]]):
+    return or_(*[and_(column >= start, column < end) for start, end in ranges])
+
+
+def cone_search(query: Query, ra: float, dec: float, radius: float, orm_class=None) -> Query:
+    """
+    Restrict a query to records within a cone.
+
+    This adds a filter on the indexed HEALPix column to prune to the pixels
+    covering the cone, then the exact angular distance test, done in SQL with
+    the haversine formula.
+
+    Parameters
+    ----------
+    query : :class:`~sqlalchemy.orm.Query`
+        Query to restrict, it must select from the header table
+    ra : float
+        Right Ascension of the cone center in decimal degrees
+    dec : float
+        Declination of the cone center in decimal degrees
+    radius : float
+        Radius of the cone in decimal degrees
+    orm_class : class
+        Class holding the `ra`, `dec` and `healpix` columns, defaults to :class:`~gemini_obs_db.orm.header.Header`
+
+    Returns
+    -------
+    :class:`~sqlalchemy.orm.Query`
+        The query with the cone search criteria added
+    """
+    orm_class = _header_class(orm_class)
+    half_chord = math.sin(math.radians(min(radius, 180.0)) / 2.0) ** 2
+    haversine = func.power(func.sin(func.radians(orm_class.dec - dec) / 2.0), 2) + \
+        math.cos(math.radians(dec)) * func.cos(func.radians(orm_class.dec)) * \
+        func.power(func.sin(func.radians(orm_class.ra - ra) / 2.0), 2)
+    return query.filter(_pixel_filter(orm_class.healpix, cone_pixel_ranges(ra, dec, radius))) \
+        .filter(haversine <= half_chord)
+
+
+def box_search(query: Query, ra_min: float, ra_max: float, dec_min: float, dec_max: float,
+               orm_class=None) -> Query:
+    """
+    Restrict a query to records within an RA/Dec box.
+
+    If `ra_min` is greater than `ra_max`, the box wraps through RA 0.  This adds
+    a filter on the indexed HEALPix column to prune to the pixels covering the
+    box, then the exact RA and Dec limits.
+
+    Parameters
+    ----------
+    query : :class:`~sqlalchemy.orm.Query`
+        Query to restrict, it must select from the header table
+    ra_min, ra_max : float
+        RA limits of the box in decimal degrees
+    dec_min, dec_max : float
+        Dec limits of the box in decimal degrees
+    orm_class : class
+        Class holding the `ra`, `dec` and `healpix` columns, defaults to :class:`~gemini_obs_db.orm.header.Header`
+
+    Returns
+    -------
+    :class:`~sqlalchemy.orm.Query`
+        The query with the box search criteria added
+    """
+    orm_class = _header_class(orm_class)
+    if ra_min <= ra_max:
+        ra_filter = and_(orm_class.ra >= ra_min, orm_class.ra <= ra_max)
+    else:
+        ra_filter = or_(orm_class.ra >= ra_min, orm_class.ra <= ra_max)
+    return query.filter(_pixel_filter(orm_class.healpix, box_pixel_ranges(ra_min, ra_max, dec_min, dec_max))) \
+        .filter(ra_filter).filter(orm_class.dec >= dec_min).filter(orm_class.dec <= dec_max)
+
+
+def update_healpix(session: Session, batch_size: int = 10000, orm_class=None) -> int:
+    """
+    Fill in the HEALPix column for records that have a position but no pixel yet.
+
+    This is for backfilling rows ingested before the spatial index existed.
+    Rows are processed in batches and each batch is committed.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to update with
+    batch_size : int
+        Number of rows to update per batch
+    orm_class : class
+        Class holding the `ra`, `dec` and `healpix` columns, defaults to :class:`~gemini_obs_db.orm.header.Header`
+
+    Returns
+    -------
+    int
+        Number of rows updated
+    """
+    orm_class = _header_class(orm_class)
+    table = orm_class.__table__
+    stmt = table.update().where(table.c.id == bindparam('_id')).values(healpix=bindparam('_healpix'))
+    updated = 0
+    last_id = 0
+    while True:
+        rows = session.execute(select([table.c.id, table.c.ra, table.c.dec])
+                               .where(table.c.id > last_id)
+                               .where(table.c.healpix == None)
+                               .where(table.c.ra != None).where(table.c.dec != None)
+                               .order_by(table.c.id).limit(batch_size)).fetchall()
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        ra = np.array([float(r[1]) for r in rows])
+        dec = np.array([float(r[2]) for r in rows])
+        valid = np.isfinite(ra) & (dec >= -90.0) & (dec <= 90.0)
+        pixels = ang2pix_nest(HEALPIX_ORDER, ra[valid], dec[valid])
+        params = [{'_id': int(i), '_healpix': int(p)} for i, p in zip(ids[valid], pixels)]
+        if params:
+            session.execute(stmt, params)
+        session.commit()
+        updated += len(params)
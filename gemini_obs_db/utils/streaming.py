@@ -0,0 +1,130 @@
+"""
+This module provides helpers for scanning very large tables in bounded memory.
+
+A plain ``session.query(Header).all()`` loads every row, and every row stays in
+the session identity map until the session closes.  The generators here hand
+back the rows in batches instead.  On PostgreSQL the rows are read through a
+server-side cursor, so only one batch is ever held on the client.  On other
+databases, such as SQLite, we page through the table on the primary key
+(keyset pagination), which stays fast however deep into the table we are.
+
+Every batch is ordered by id, so a scan that is interrupted can be resumed by
+passing the id of the last row it processed as `after_id`.
+"""
+from typing import Iterable, Iterator, List, Union
+
+from sqlalchemy.orm import Session
+
+from gemini_obs_db.orm.header import Header
+
+
+__all__ = ["iter_batches", "iter_headers"]
+
+
+def _use_server_side(session: Session, server_side: Union[bool, None]) -> bool:
+    if server_side is not None:
+        return server_side
+    return session.get_bind().dialect.name == 'postgresql'
+
+
+def iter_batches(session: Session, orm_class, *criteria, batch_size: int = 1000, after_id: int = None,
+                 joins: Iterable = None, server_side: bool = None, expunge: bool = True) -> Iterator[List]:
+    """
+    Iterate over the records of an ORM class in batches, ordered by id.
+
+    With a server-side cursor, the scan holds a cursor open in the session's
+    transaction.  Do not commit or roll back that session until the scan is
+    done, write any changes through a different session instead.  Keyset
+    pagination has no such restriction.
+
+    Parameters
+    ----------
+    session : :class:`~sqlalchemy.orm.Session`
+        Session to query with
+    orm_class : class
+        ORM class to scan, it must have an integer `id` primary key
+    criteria : SQLAlchemy expressions
+        Filter criteria, for example ``Header.instrument == 'GMOS-N'``
+    batch_size : int
+        Number of records per batch
+    after_id : int
+        Only return records with an id greater than this, used to resume a scan
+    joins : list
+        Entities or relationships to join to, for criteria on related tables
+    server_side : bool
+        True to use a server-side cursor, False to use keyset pagination.  By default
+        we use a server-side cursor on PostgreSQL and keyset pagination elsewhere.
+    expunge : bool
+        If True, the default, each batch is expunged from the session once the caller
+        asks for the next one, so the identity map does not grow with the scan.  The
+        records stay usable, but changes to them will not be flushed.
+
+    Returns
+    -------
+    iterator of list
+        Batches of at most `batch_size` records
+    """
+    id_column = orm_class.id
+    query = session.query(orm_class)
+    for join in joins or ():
+        query = query.join(join)
+    if criteria:
+        query = query.filter(*criteria)
+
+    def _release(batch):
+        if expunge:
+            for record in batch:
+                session.expunge(record)
+
+    if _use_server_side(session, server_side):
+        if after_id is not None:
+            query = query.filter(id_column > after_id)
+        query = query.order_by(id_column).execution_options(stream_results=True).yield_per(batch_size)
+        batch = list()
+        for record in query:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                _release(batch)
+                batch = list()
+        if batch:
+            yield batch
+            _release(batch)
+    else:
+        last_id = after_id
+        while True:
+            page = query
+            if last_id is not None:
+                page = page.filter(id_column > last_id)
+            batch = page.order_by(id_column).limit(batch_size).all()
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+            _release(batch)
+            if len(batch) < batch_size:
+                return
+
+
+def iter_headers(session: Session, *criteria, batch_size: int = 1000, after_id: int = None,
+                 joins: Iterable = None, server_side: bool = None, expunge: bool = True) -> Iterator[List[Header]]:
+    """
+    Iterate over :class:`~gemini_obs_db.orm.header.Header` records in batches, ordered by id.
+
+    This is a convenience wrapper around :func:`iter_batches` for the header table,
+    see there for a description of the parameters.  For example, to walk through
+    the canonical GMOS-N headers, resuming after a previous run::
+
+        for batch in iter_headers(session, Header.instrument == 'GMOS-N', DiskFile.canonical == True,
+                                  joins=[Header.diskfile], after_id=last_id):
+            for header in batch:
+                ...
+            last_id = batch[-1].id
+
+    Returns
+    -------
+    iterator of list of :class:`~gemini_obs_db.orm.header.Header`
+        Batches of at most `batch_size` headers
+    """
+    return iter_batches(session, Header, *criteria, batch_size=batch_size, after_id=after_id, joins=joins,
+                        server_side=server_side, expunge=expunge)
@@ -0,0 +1,132 @@
+"""
+This module provides a vectorized gnomonic (TAN) projection for footprints.
+
+Building an :class:`astropy.wcs.WCS` for every extension of every file is the
+main cost of calculating footprints across the archive.  Most Gemini data has a
+plain RA---TAN/DEC--TAN WCS with no distortion terms, and for those the
+corners can be worked out directly from CRVAL, CRPIX and the CD matrix.  The
+functions here do that for any number of extensions at once, as a handful of
+NumPy array operations.
+
+The results agree with :meth:`astropy.wcs.WCS.calc_footprint` to well under a
+milliarcsecond.  Headers with anything beyond a plain TAN projection, such as
+SIP or lookup table distortions, PV terms, a non-default LONPOLE or a
+reference point at a pole, are rejected by :func:`tan_parameters` and should
+go through astropy instead.  So are headers that give the rotation with the
+old CROTAn keywords, and headers with both a CD and a PC matrix, of which
+wcslib uses the PC matrix.
+"""
+import re
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+
+__all__ = ["tan_parameters", "tan_footprints"]
+
+
+# Keywords that mean the WCS is not a plain TAN projection
+_distortion_re = re.compile(r'^(?:A_ORDER|B_ORDER|AP_ORDER|BP_ORDER|P[VS]\d+_\d+|CPDIS\d|D2IMDIS\d|D2IMFILE)$')
+# Old style rotation, which wcslib applies along with CDELT
+_crota_re = re.compile(r'^CROTA\d+$')
+
+
+def tan_parameters(hdr) -> Union[Tuple[np.ndarray, np.ndarray, np.ndarray], None]:
+    """
+    Read the parameters of a plain TAN projection from a FITS header.
+
+    Only the first two axes are read, so a cube with a single plane can use
+    this too.
+
+    Parameters
+    ----------
+    hdr : :class:`astropy.io.fits.Header`
+        Header to read
+
+    Returns
+    -------
+    tuple or None
+        (crval, crpix, cd) as arrays of shape (2,), (2,) and (2, 2), or None if the
+        header does not describe a plain, non-degenerate RA---TAN/DEC--TAN projection
+    """
+    if hdr.get('CTYPE1') != 'RA---TAN' or hdr.get('CTYPE2') != 'DEC--TAN':
+        return None
+    for key in hdr.keys():
+        if _distortion_re.match(key) or _crota_re.match(key):
+            return None
+    for i in (1, 2):
+        if str(hdr.get('CUNIT%d' % i, 'deg')).strip() not in ('deg', ''):
+            return None
+    try:
+        if float(hdr.get('LONPOLE', 180.0)) != 180.0:
+            return None
+        crval = np.array([float(hdr.get('CRVAL1', 0.0)), float(hdr.get('CRVAL2', 0.0))])
+        crpix = np.array([float(hdr.get('CRPIX1', 0.0)), float(hdr.get('CRPIX2', 0.0))])
+        has_cd = any('CD%d_%d' % (i, j) in hdr for i in (1, 2) for j in (1, 2))
+        if has_cd and any('PC%d_%d' % (i, j) in hdr for i in (1, 2) for j in (1, 2)):
+            return None
+        if has_cd:
+            cd = np.array([[float(hdr.get('CD%d_%d' % (i, j), 0.0)) for j in (1, 2)] for i in (1, 2)])
+        else:
+            pc = np.array([[float(hdr.get('PC%d_%d' % (i, j), 1.0 if i == j else 0.0)) for j in (1, 2)]
+                           for i in (1, 2)])
+            cdelt = np.array([float(hdr.get('CDELT1', 1.0)), float(hdr.get('CDELT2', 1.0))])
+            cd = pc * cdelt[:, np.newaxis]
+    except (TypeError, ValueError):
+        return None
+    if not (np.all(np.isfinite(crval)) and np.all(np.isfinite(crpix)) and np.all(np.isfinite(cd))):
+        return None
+    if abs(crval[1]) >= 90.0 or np.linalg.det(cd) == 0.0:
+        return None
+    return crval, crpix, cd
+
+
+def tan_footprints(crval: Sequence, crpix: Sequence, cd: Sequence, naxis: Sequence) -> np.ndarray:
+    """
+    Calculate the corner coordinates of many TAN projected images at once.
+
+    The corners come out in the same order as from
+    :meth:`astropy.wcs.WCS.calc_footprint` with its default arguments: the
+    centres of the corner pixels, clockwise from (1, 1).
+
+    Parameters
+    ----------
+    crval : array
+        Reference (RA, Dec) in degrees, shape (N, 2)
+    crpix : array
+        Reference pixels, 1 based, shape (N, 2)
+    cd : array
+        CD matrices in degrees per pixel, shape (N, 2, 2)
+    naxis : array
+        Image sizes as (NAXIS1, NAXIS2), shape (N, 2)
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        (RA, Dec) of the corners in degrees, shape (N, 4, 2), with RA in [0, 360)
+    """
+    crval = np.asarray(crval, dtype=np.float64).reshape(-1, 2)
+    crpix = np.asarray(crpix, dtype=np.float64).reshape(-1, 2)
+    cd = np.asarray(cd, dtype=np.float64).reshape(-1, 2, 2)
+    naxis = np.asarray(naxis, dtype=np.float64).reshape(-1, 2)
+
+    ones = np.ones(len(naxis))
+    # (N, 4, 2) pixel coordinates of the corners
+    corners = np.stack([np.column_stack((ones, ones)),
+                        np.column_stack((ones, naxis[:, 1])),
+                        naxis,
+                        np.column_stack((naxis[:, 0], ones))], axis=1)
+    # Intermediate world coordinates, which for TAN are the standard coordinates
+    xy = np.radians(np.einsum('nij,nkj->nki', cd, corners - crpix[:, np.newaxis, :]))
+    xi = xy[..., 0]
+    eta = xy[..., 1]
+
+    ra0 = np.radians(crval[:, 0])[:, np.newaxis]
+    dec0 = np.radians(crval[:, 1])[:, np.newaxis]
+    sin_dec0 = np.sin(dec0)
+    cos_dec0 = np.cos(dec0)
+    denom = cos_dec0 - eta * sin_dec0
+    ra = ra0 + np.arctan2(xi, denom)
+    dec = np.arctan2(sin_dec0 + eta * cos_dec0, np.hypot(xi, denom))
+
+    return np.stack((np.degrees(ra) % 360.0, np.degrees(dec)), axis=-1)
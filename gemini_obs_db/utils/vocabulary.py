@@ -0,0 +1,221 @@
+"""
+This module provides a registry of the controlled vocabularies used in the headers.
+
+Many header values can only take one of a fixed set of values, such as the
+observation type or a MICHELLE filter.  Each of these sets is a
+:class:`Vocabulary`.  A vocabulary does its membership tests with a frozenset,
+maps loosely written values to their official form with a dict built once up
+front, gives each value a stable integer code, and builds the matching
+SQLAlchemy :class:`~sqlalchemy.types.Enum`.  The strings are interned, so the
+many copies of them that an ingest or a bulk query makes all share one object.
+
+Every vocabulary is registered under its name, which is also the name of its
+database enum type, and can be looked up with :func:`get_vocabulary`.
+"""
+import sys
+from typing import Callable, Dict, Iterable, Iterator, Union
+
+from sqlalchemy import Enum
+
+
+__all__ = ["Vocabulary", "get_vocabulary", "vocabularies"]
+
+
+_registry: Dict[str, 'Vocabulary'] = dict()
+
+
+class Vocabulary:
+    """
+    An ordered, immutable set of allowed values.
+
+    A vocabulary can be used where a tuple or list of the values was used
+    before: it supports `in`, iteration, `len` and indexing.  The integer code
+    of a value is its position in the vocabulary, so new values must only
+    ever be added at the end.
+
+    Parameters
+    ----------
+    name : str
+        Name of the vocabulary, used for the registry and as the name of the database enum type
+    values : iterable of str
+        The allowed values, in order
+    normalize : callable
+        Optional function mapping a value to a lookup key, such as `str.lower` for
+        case insensitive matching in :meth:`normalize`
+    aliases : dict
+        Optional extra lookup keys, already normalized, mapping to official values
+    """
+    __slots__ = ('name', 'values', '_set', '_codes', '_key', '_lookup')
+
+    def __init__(self, name: str, values: Iterable[str], normalize: Callable[[str], str] = None,
+                 aliases: Dict[str, str] = None):
+        values = tuple(sys.intern(v) if isinstance(v, str) else v for v in values)
+        self.name = name
+        self.values = values
+        self._set = frozenset(values)
+        self._codes = {v: i for i, v in enumerate(values)}
+        self._key = normalize
+        self._lookup = dict()
+        if normalize is not None:
+            self._lookup = {normalize(v): v for v in values}
+        if aliases:
+            self._lookup.update({k: sys.intern(v) for k, v in aliases.items()})
+        if name in _registry and _registry[name].values != values:
+            # the same definition again is fine, such as when a module is reloaded
+            raise ValueError("Vocabulary %s is already registered with different values" % name)
+        _registry[name] = self
+
+    def __repr__(self):
+        return "<Vocabulary('%s', %d values)>" % (self.name, len(self.values))
+
+    def __contains__(self, value) -> bool:
+        try:
+            return value in self._set
+        except TypeError:
+            # unhashable, so certainly not one of ours
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def get(self, value, default=None):
+        """
+        Get the value if it is in the vocabulary, as its interned copy.
+
+        Parameters
+        ----------
+        value : str
+            Value to check
+        default
+            Value to return if it is not in the vocabulary, defaults to None
+
+        Returns
+        -------
+        str
+            The official value, or `default`
+        """
+        code = self.code(value)
+        return default if code is None else self.values[code]
+
+    def normalize(self, value, default=None):
+        """
+        Map a loosely written value to its official form.
+
+        The value is first checked as is, then by its normalized key and any aliases.
+
+        Parameters
+        ----------
+        value : str
+            Value to look up
+        default
+            Value to return if there is no match, defaults to None
+
+        Returns
+        -------
+        str
+            The official value, or `default`
+        """
+        if value in self:
+            return self.values[self._codes[value]]
+        if self._key is not None and isinstance(value, str):
+            return self._lookup.get(self._key(value), default)
+        if isinstance(value, str):
+            return self._lookup.get(value, default)
+        return default
+
+    def code(self, value) -> Union[int, None]:
+        """
+        Get the integer code for a value.
+
+        Parameters
+        ----------
+        value : str
+            Value to encode
+
+        Returns
+        -------
+        int or None
+            The code of the value, or None if it is not in the vocabulary
+        """
+        try:
+            return self._codes.get(value)
+        except TypeError:
+            return None
+
+    def from_code(self, code: int) -> Union[str, None]:
+        """
+        Get the value for an integer code.
+
+        Parameters
+        ----------
+        code : int
+            Code to decode
+
+        Returns
+        -------
+        str or None
+            The value, or None if the code is None
+        """
+        if code is None:
+            return None
+        return self.values[code]
+
+    def enum(self, *extra: str) -> Enum:
+        """
+        Build a SQLAlchemy :class:`~sqlalchemy.types.Enum` for this vocabulary.
+
+        Parameters
+        ----------
+        extra : str
+            Extra values allowed in the column but not part of the vocabulary,
+            placed before the vocabulary values, for example 'None'
+
+        Returns
+        -------
+        :class:`~sqlalchemy.types.Enum`
+            Enum type named after the vocabulary
+        """
+        return Enum(*extra, *self.values, name=self.name)
+
+
+def get_vocabulary(name: str) -> Vocabulary:
+    """
+    Look up a registered vocabulary by name.
+
+    Parameters
+    ----------
+    name : str
+        Name of the vocabulary, which is the name of its database enum type
+
+    Returns
+    -------
+    :class:`Vocabulary`
+        The vocabulary
+
+    Raises
+    ------
+    KeyError
+        If there is no vocabulary with that name
+    """
+    return _registry[name]
+
+
+def vocabularies() -> Dict[str, Vocabulary]:
+    """
+    Get all the registered vocabularies.
+
+    Vocabularies are registered when the module defining them is imported, so
+    import the ORM modules first to see the instrument specific ones.
+
+    Returns
+    -------
+    dict
+        Vocabularies keyed by name
+    """
+    return dict(_registry)
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.canonical_header import CanonicalHeader, canonical_header_select, create_canonical_header, \
+    drop_canonical_header, maintain_canonical_header, refresh_canonical_header, update_canonical_header
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.header import Header
+
+
+def _add(session, file_id, name, instrument, canonical=True, present=True):
+    df_id = session.execute(DiskFile.__table__.insert(),
+                            dict(file_id=file_id, filename=name, path='', canonical=canonical, present=present)) \
+        .inserted_primary_key[0]
+    session.execute(Header.__table__.insert(),
+                    dict(diskfile_id=df_id, instrument=instrument, ut_datetime=datetime(2020, 1, 1),
+                         observation_type='OBJECT', observation_class='science', program_id='GN-2019B-Q-1'))
+    return session.query(DiskFile).get(df_id)
+
+
+def test_canonical_header():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    try:
+        names = ['N20200101S%04d.fits' % i for i in range(1, 4)]
+        file_ids = [session.execute(File.__table__.insert(), dict(name=n)).inserted_primary_key[0] for n in names]
+        _add(session, file_ids[0], names[0], 'NIRI')
+        _add(session, file_ids[1], names[1], 'GMOS-N', present=False)
+        _add(session, file_ids[2], names[2], 'F2', canonical=False)
+        session.commit()
+
+        create_canonical_header(session)
+        # creating again leaves it alone
+        create_canonical_header(session)
+        rows = session.query(CanonicalHeader).all()
+        assert [(r.filename, r.instrument) for r in rows] == [(names[0], 'NIRI')]
+        assert rows[0].observation_type == 'OBJECT'
+
+        # A new version of the first file replaces the old one in the view
+        session.execute(DiskFile.__table__.update().where(DiskFile.__table__.c.file_id == file_ids[0])
+                        .values(canonical=False))
+        new = _add(session, file_ids[0], names[0], 'NIRI')
+        restored = _add(session, file_ids[2], names[2], 'F2')
+        assert update_canonical_header(session, [new, restored]) == 2
+        rows = session.query(CanonicalHeader).order_by(CanonicalHeader.file_id).all()
+        assert [(r.filename, r.diskfile_id) for r in rows] == [(names[0], new.id), (names[2], restored.id)]
+        assert update_canonical_header(session, []) == 0
+
+        # A full refresh gives the same rows
+        refresh_canonical_header(session)
+        assert [r.header_id for r in session.query(CanonicalHeader).order_by(CanonicalHeader.file_id)] == \
+            [r.header_id for r in rows]
+        session.commit()
+
+        drop_canonical_header(engine)
+        assert not engine.dialect.has_table(engine.connect(), 'canonical_header')
+    finally:
+        session.close()
+
+
+def test_maintain_canonical_header():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    create_canonical_header(engine)
+    session = sessionmaker(engine)()
+    try:
+        maintain_canonical_header(session)
+        file_id = session.execute(File.__table__.insert(), dict(name='N20200101S0001.fits')).inserted_primary_key[0]
+        diskfile = _add(session, file_id, 'N20200101S0001.fits', 'NIRI')
+        assert session.query(CanonicalHeader).count() == 0
+
+        # Flushing an ORM change to the diskfile updates its rows
+        diskfile.present = False
+        session.flush()
+        assert session.query(CanonicalHeader).count() == 0
+        diskfile.present = True
+        session.flush()
+        assert [r.diskfile_id for r in session.query(CanonicalHeader)] == [diskfile.id]
+
+        maintain_canonical_header(session, enable=False)
+        diskfile.canonical = False
+        session.flush()
+        assert session.query(CanonicalHeader).count() == 1
+    finally:
+        session.close()
+
+
+def test_canonical_header_postgres_view():
+    # The view definition has to compile to plain SQL for CREATE MATERIALIZED VIEW
+    sql = str(canonical_header_select().compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    assert 'diskfile.canonical = true AND diskfile.present = true' in sql
+    assert 'JOIN file ON diskfile.file_id = file.id' in sql
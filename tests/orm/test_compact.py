@@ -0,0 +1,232 @@
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+from sqlalchemy import Column, Float, Integer, MetaData, Numeric, SmallInteger, Table, Text, create_engine, func, \
+    select
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db import db_config
+from gemini_obs_db.orm.compact import TEXT_CODES, CodedText, TextCode, coded_text_type, coordinate_type, \
+    measurement_type, seed_text_codes
+from gemini_obs_db.utils.gemini_metadata_utils import INSTRUMENTS
+
+
+def test_profile_types(monkeypatch):
+    assert isinstance(coordinate_type(), Numeric) and coordinate_type().asdecimal
+    assert isinstance(coded_text_type('filter_name'), Text)
+    monkeypatch.setattr(db_config, 'compact_schema', True)
+    assert isinstance(coordinate_type(), Float) and not coordinate_type().asdecimal
+    assert not measurement_type(8, 4).asdecimal
+    assert coded_text_type('filter_name').dictionary == 'filter_name'
+
+
+def _engine(directory):
+    # A file, as the codes are read on connections of their own
+    engine = create_engine('sqlite:///' + os.path.join(directory, 'compact.db'))
+    TextCode.__table__.create(bind=engine)
+    TEXT_CODES.bind(engine)
+    return engine
+
+
+def test_coded_text():
+    metadata = MetaData()
+    table = Table('coded', metadata, Column('id', Integer, primary_key=True),
+                  Column('filter_name', CodedText('test_filter')))
+    with tempfile.TemporaryDirectory() as directory:
+        engine = _engine(directory)
+        try:
+            metadata.create_all(bind=engine)
+            with engine.begin() as connection:
+                connection.execute(table.insert(), [dict(filter_name=f) for f in ('r_G0303', 'g_G0301', 'r_G0303')])
+                connection.execute(table.insert().values(filter_name='Ha_G0310'))
+                connection.execute(table.insert(), dict(filter_name=None))
+            with engine.connect() as connection:
+                assert [r[0] for r in connection.execute(select([table.c.filter_name]).order_by(table.c.id))] == \
+                    ['r_G0303', 'g_G0301', 'r_G0303', 'Ha_G0310', None]
+                raw = Table('coded', MetaData(), Column('filter_name', SmallInteger))
+                assert [r[0] for r in connection.execute(select([raw.c.filter_name]))] == [1, 2, 1, 3, None]
+                assert connection.execute(select([table.c.id]).where(table.c.filter_name == 'r_G0303')
+                                          .order_by(table.c.id)).fetchall() == [(1, ), (3, )]
+                assert len(connection.execute(select([table.c.id]).where(
+                    table.c.filter_name.in_(['g_G0301', 'Ha_G0310']))).fetchall()) == 2
+                # Searching does not add codes
+                assert connection.execute(select([table.c.id]).where(table.c.filter_name == 'nope')).fetchall() == []
+                assert connection.execute(select([TextCode.__table__.c.value])
+                                          .where(TextCode.__table__.c.value == 'nope')).fetchall() == []
+
+            # Codes added in a transaction that is rolled back are forgotten
+            connection = engine.connect()
+            transaction = connection.begin()
+            connection.execute(table.insert(), dict(filter_name='Z_G0322'))
+            # and until then, only the connection that added them uses them
+            assert TEXT_CODES.code('test_filter', 'Z_G0322', connection) == 4
+            assert connection.execute(select([table.c.filter_name]).where(table.c.filter_name == 'Z_G0322')) \
+                .fetchall() == [('Z_G0322', )]
+            assert TEXT_CODES._codes['test_filter'].get('Z_G0322') is None
+            transaction.rollback()
+            connection.close()
+            assert TEXT_CODES.code('test_filter', 'Z_G0322') is None
+
+            # Several rows in one multi-VALUES INSERT
+            with engine.begin() as connection:
+                connection.execute(table.insert().values([dict(filter_name='OTHER'), dict(filter_name='OTHER'),
+                                                          dict(filter_name='Y_G0323')]))
+            with engine.connect() as connection:
+                assert connection.execute(select([func.count()]).select_from(table)
+                                          .where(table.c.filter_name == 'OTHER')).scalar() == 2
+                assert [r[0] for r in connection.execute(select([table.c.filter_name]).where(table.c.id > 5)
+                                                         .order_by(table.c.id))] == ['OTHER', 'OTHER', 'Y_G0323']
+
+            # A code added by another process is read again when searched for
+            with engine.begin() as connection:
+                connection.execute(TextCode.__table__.insert(), dict(dictionary='test_filter', code=50, value='far'))
+                connection.execute(raw.insert(), dict(filter_name=50))
+            with engine.connect() as connection:
+                assert connection.execute(select([table.c.filter_name])
+                                          .where(table.c.filter_name == 'far')).fetchall() == [('far', )]
+        finally:
+            TEXT_CODES.bind(None)
+
+
+def test_coded_text_concurrent_writers():
+    metadata = MetaData()
+    table = Table('coded', metadata, Column('id', Integer, primary_key=True),
+                  Column('filter_name', CodedText('test_concurrent')))
+    with tempfile.TemporaryDirectory() as directory:
+        engine = _engine(directory)
+        try:
+            metadata.create_all(bind=engine)
+            # Writer A adds a code, and rolls back after writer B has started writing the same string
+            a = engine.connect()
+            transaction = a.begin()
+            a.execute(table.insert(), dict(filter_name='X'))
+            errors = list()
+
+            def write():
+                try:
+                    with engine.begin() as b:
+                        b.execute(table.insert(), dict(filter_name='X'))
+                except Exception as e:
+                    errors.append(e)
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            time.sleep(0.2)
+            transaction.rollback()
+            a.close()
+            writer.join()
+            assert errors == []
+            with engine.connect() as connection:
+                assert connection.execute(select([table.c.filter_name])).fetchall() == [('X', )]
+                assert connection.execute(select([TextCode.__table__.c.code, TextCode.__table__.c.value])
+                                          .where(TextCode.__table__.c.dictionary == 'test_concurrent')) \
+                    .fetchall() == [(1, 'X')]
+        finally:
+            TEXT_CODES.bind(None)
+
+
+def test_coded_text_savepoints():
+    metadata = MetaData()
+    table = Table('coded', metadata, Column('id', Integer, primary_key=True),
+                  Column('filter_name', CodedText('test_savepoint')))
+    with tempfile.TemporaryDirectory() as directory:
+        engine = _engine(directory)
+        try:
+            metadata.create_all(bind=engine)
+            connection = engine.connect()
+            transaction = connection.begin()
+            connection.execute(table.insert(), dict(filter_name='kept'))
+            savepoint = connection.begin_nested()
+            connection.execute(table.insert(), dict(filter_name='dropped'))
+            savepoint.rollback()
+            savepoint = connection.begin_nested()
+            connection.execute(table.insert(), dict(filter_name='released'))
+            savepoint.commit()
+            assert TEXT_CODES.code('test_savepoint', 'kept', connection) == 1
+            assert TEXT_CODES.code('test_savepoint', 'released', connection) == 2
+            transaction.commit()
+            connection.close()
+            assert TEXT_CODES._codes['test_savepoint'] == {'kept': 1, 'released': 2}
+
+            # A savepoint rolled back does not lose track of the codes added before it
+            connection = engine.connect()
+            transaction = connection.begin()
+            connection.execute(table.insert(), dict(filter_name='outer'))
+            savepoint = connection.begin_nested()
+            connection.execute(table.insert(), dict(filter_name='inner'))
+            savepoint.rollback()
+            assert connection.execute(select([table.c.filter_name]).where(table.c.filter_name == 'outer')) \
+                .fetchall() == [('outer', )]
+            transaction.rollback()
+            connection.close()
+            assert 'outer' not in TEXT_CODES._codes['test_savepoint']
+            assert TEXT_CODES.code('test_savepoint', 'outer') is None
+        finally:
+            TEXT_CODES.bind(None)
+
+
+def test_coded_text_bind():
+    coded = CodedText('test_bind')
+    dialect = create_engine('sqlite://').dialect
+    # Written values must have had a code added, searched for ones need not
+    with pytest.raises(ValueError):
+        coded.process_bind_param('unknown', dialect)
+    search = (Column('filter_name', coded) == 'unknown').right.type
+    assert search.search and search.dictionary == 'test_bind'
+    assert search.process_bind_param('unknown', dialect) == -1
+
+
+def test_coded_text_search_in_transaction():
+    metadata = MetaData()
+    table = Table('coded', metadata, Column('id', Integer, primary_key=True),
+                  Column('instrument', CodedText('test_instrument')))
+    # In memory, so a search that read the codes on a connection of its own would lose the transaction
+    engine = create_engine('sqlite://')
+    TextCode.__table__.create(bind=engine)
+    metadata.create_all(bind=engine)
+    TEXT_CODES.bind(engine)
+    try:
+        connection = engine.connect()
+        transaction = connection.begin()
+        connection.execute(table.insert(), dict(instrument='GMOS-N'))
+        assert connection.execute(select([table.c.id]).where(table.c.instrument == 'NOPE')).fetchall() == []
+        assert connection.execute(select([func.count()]).select_from(table)).scalar() == 1
+        transaction.commit()
+        assert connection.execute(select([table.c.instrument])).fetchall() == [('GMOS-N', )]
+        connection.close()
+    finally:
+        TEXT_CODES.bind(None)
+
+
+def test_coded_text_orm():
+    Base = declarative_base()
+
+    class Observation(Base):
+        __tablename__ = 'observation'
+        id = Column(Integer, primary_key=True)
+        instrument = Column(CodedText('instrument'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = _engine(directory)
+        try:
+            Base.metadata.create_all(bind=engine)
+            seed_text_codes(engine)
+            assert TEXT_CODES.code('instrument', INSTRUMENTS.values[0]) == 1
+            assert TEXT_CODES.code('instrument', INSTRUMENTS.values[-1]) == len(INSTRUMENTS)
+            session = sessionmaker(engine)()
+            session.add_all([Observation(instrument='GMOS-N'), Observation(instrument='new instrument')])
+            session.commit()
+            assert TEXT_CODES.code('instrument', 'new instrument') == len(INSTRUMENTS) + 1
+            observation = session.query(Observation).filter(Observation.instrument == 'GMOS-N').one()
+            assert observation.instrument == 'GMOS-N'
+            observation.instrument = 'another'
+            session.commit()
+            session.expire_all()
+            assert session.query(Observation).get(observation.id).instrument == 'another'
+            session.close()
+        finally:
+            TEXT_CODES.bind(None)
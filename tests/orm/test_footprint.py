@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.orm.footprint import Footprint, overlapping_footprints, footprints_containing
+
+
+def _square(ra, dec, half):
+    return [(ra - half, dec - half), (ra - half, dec + half), (ra + half, dec + half), (ra + half, dec - half)]
+
+
+def test_footprint_bounding_box():
+    h = Header.__new__(Header)
+    fp = Footprint(h, 'SCI,1', _square(10.0, 20.0, 0.1))
+    assert abs(fp.ra_min - 9.9) < 1e-9
+    assert abs(fp.ra_max - 10.1) < 1e-9
+    assert abs(fp.dec_min - 19.9) < 1e-9
+    assert fp.polar is False
+    assert len(fp.polygon()) == 4
+
+    # straddling RA 0
+    fp = Footprint(h, 'SCI,1', _square(0.0, 0.0, 0.1))
+    assert abs(fp.ra_min - 359.9) < 1e-9
+    assert abs(fp.ra_max - 360.1) < 1e-9
+
+    # around the pole
+    fp = Footprint(h, 'PHU', [(0.0, 89.9), (90.0, 89.9), (180.0, 89.9), (270.0, 89.9)])
+    assert fp.polar is True
+    assert fp.dec_max == 90.0
+
+
+def test_overlapping_footprints():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    try:
+        f = File('N20200101S0001.fits')
+        session.add(f)
+        session.flush()
+        df_id = session.execute(DiskFile.__table__.insert(), dict(file_id=f.id, filename=f.name, path='')) \
+            .inserted_primary_key[0]
+        h_id = session.execute(Header.__table__.insert(), dict(diskfile_id=df_id)).inserted_primary_key[0]
+        header = session.query(Header).get(h_id)
+        session.add(Footprint(header, 'SCI,1', _square(10.0, 20.0, 0.1)))
+        session.add(Footprint(header, 'SCI,2', _square(10.3, 20.0, 0.1)))
+        session.add(Footprint(header, 'SCI,3', _square(0.0, 0.0, 0.1)))
+        session.add(Footprint(header, 'SCI,4', _square(200.0, 89.95, 0.02)))
+        session.commit()
+
+        found = overlapping_footprints(session, _square(10.15, 20.0, 0.06))
+        assert sorted(fp.extension for fp in found) == ['SCI,1', 'SCI,2']
+        found = overlapping_footprints(session, _square(359.95, 0.05, 0.02))
+        assert [fp.extension for fp in found] == ['SCI,3']
+        # the bounding boxes overlap, but the rotated polygon misses the corner
+        diamond = [(10.2, 20.15), (10.25, 20.2), (10.2, 20.25), (10.15, 20.2)]
+        assert overlapping_footprints(session, diamond) == []
+        # a search around the pole matches at any RA
+        found = overlapping_footprints(session, [(0.0, 89.9), (90.0, 89.9), (180.0, 89.9), (270.0, 89.9)])
+        assert [fp.extension for fp in found] == ['SCI,4']
+
+        assert [fp.extension for fp in footprints_containing(session, 0.05, -0.05)] == ['SCI,3']
+        assert footprints_containing(session, 10.2, 20.0) == []
+    finally:
+        session.close()
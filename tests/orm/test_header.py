@@ -0,0 +1,63 @@
+import numpy as np
+from astropy import wcs as pywcs
+from astropy.io import fits
+
+from gemini_obs_db.orm.header import Header, _header_shape
+
+
+class _FakeAstroData:
+    # Just enough of AstroData for Header.footprints, there is no data at all
+    def __init__(self, tags, phu, hdrs):
+        self.tags = set(tags)
+        self.phu = phu
+        self.hdr = hdrs
+
+
+def _tan_header(naxis1, naxis2, extver, ra=150.0, dec=2.0):
+    hdr = fits.Header()
+    hdr['NAXIS'] = 2
+    hdr['NAXIS1'] = naxis1
+    hdr['NAXIS2'] = naxis2
+    hdr['EXTNAME'] = 'SCI'
+    hdr['EXTVER'] = extver
+    hdr['CTYPE1'] = 'RA---TAN'
+    hdr['CTYPE2'] = 'DEC--TAN'
+    hdr['CRVAL1'] = ra
+    hdr['CRVAL2'] = dec
+    hdr['CRPIX1'] = naxis1 / 2.0
+    hdr['CRPIX2'] = naxis2 / 2.0
+    hdr['CD1_1'] = -4e-5
+    hdr['CD1_2'] = 0.0
+    hdr['CD2_1'] = 0.0
+    hdr['CD2_2'] = 4e-5
+    return hdr
+
+
+def test_header_shape():
+    assert _header_shape(_tan_header(100, 200, 1)) == (200, 100)
+    hdr = fits.Header()
+    hdr['NAXIS'] = 0
+    assert _header_shape(hdr) is None
+
+
+def test_footprints_from_headers():
+    hdrs = [_tan_header(512, 1024, i, ra=150.0 + 0.01 * i) for i in range(1, 4)]
+    ad = _FakeAstroData(['GMOS'], fits.Header(), hdrs)
+    fps = Header.footprints(None, ad)
+    assert sorted(fps.keys()) == ['SCI,1', 'SCI,2', 'SCI,3']
+    expected = pywcs.WCS(hdrs[1]).calc_footprint(axes=(512, 1024))
+    np.testing.assert_allclose(fps['SCI,2'], expected)
+
+
+def test_footprints_phu_wcs():
+    phu = _tan_header(0, 0, 0)
+    del phu['NAXIS1'], phu['NAXIS2'], phu['EXTNAME'], phu['EXTVER']
+    phu['NAXIS'] = 0
+    ext = fits.Header()
+    ext['NAXIS'] = 2
+    ext['NAXIS1'] = 256
+    ext['NAXIS2'] = 128
+    ad = _FakeAstroData(['GNIRS'], phu, [ext])
+    fps = Header.footprints(None, ad)
+    assert list(fps.keys()) == ['PHU']
+    np.testing.assert_allclose(fps['PHU'], pywcs.WCS(phu).calc_footprint(axes=(256, 128)))
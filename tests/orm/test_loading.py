@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.db.query_stats import QueryStats
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.footprint import Footprint
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.orm.loading import apply_loading_profile, loading_options, query_diskfiles, query_headers
+from gemini_obs_db.orm.preview import Preview
+from gemini_obs_db.orm.provenance import Provenance, ProvenanceHistory
+
+
+ROWS = 20
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    for i in range(ROWS):
+        name = 'N20200101S%04d.fits' % i
+        file_id = session.execute(File.__table__.insert(), dict(name=name)).inserted_primary_key[0]
+        df_id = session.execute(DiskFile.__table__.insert(), dict(file_id=file_id, filename=name, path='',
+                                                                  canonical=True, present=True)) \
+            .inserted_primary_key[0]
+        session.execute(Header.__table__.insert(), dict(diskfile_id=df_id, instrument='NIRI'))
+        session.execute(Preview.__table__.insert(), dict(diskfile_id=df_id, filename=name + '.jpg'))
+        session.execute(Provenance.__table__.insert(), dict(diskfile_id=df_id, timestamp=datetime(2020, 1, 2),
+                                                            filename='input.fits', md5='md5',
+                                                            primitive='stackFrames'))
+        session.execute(ProvenanceHistory.__table__.insert(),
+                        dict(diskfile_id=df_id, timestamp_start=datetime(2020, 1, 2),
+                             timestamp_end=datetime(2020, 1, 2), primitive='stackFrames', args=''))
+    session.commit()
+    session.close()
+    return engine
+
+
+def _count_queries(engine, fn):
+    stats = QueryStats()
+    stats.attach(engine)
+    session = sessionmaker(engine)()
+    try:
+        fn(session)
+    finally:
+        session.close()
+        stats.detach(engine)
+    return sum(r['count'] for r in stats.snapshot())
+
+
+def _summary(query):
+    return [h.diskfile.file.name for h in query]
+
+
+def _detail(query):
+    return [(h.diskfile.file.name, [p.filename for p in h.diskfile.previews], len(h.diskfile.provenance),
+             len(h.diskfile.provenance_history)) for h in query]
+
+
+def test_summary_profile(engine):
+    assert _count_queries(engine, lambda s: _summary(query_headers(s, 'lazy'))) == 1 + 2 * ROWS
+    assert _count_queries(engine, lambda s: _summary(query_headers(s, 'summary'))) == 1
+
+
+def test_detail_profile(engine):
+    assert _count_queries(engine, lambda s: _detail(query_headers(s, 'lazy'))) == 1 + 5 * ROWS
+    assert _count_queries(engine, lambda s: _detail(query_headers(s, 'summary'))) == 1 + 3 * ROWS
+    assert _count_queries(engine, lambda s: _detail(query_headers(s, 'detail'))) == 4
+
+
+def test_diskfile_profiles(engine):
+    def detail(session):
+        return [(df.file.name, len(df.previews), len(df.provenance)) for df in query_diskfiles(session, 'detail')]
+    assert _count_queries(engine, detail) == 4
+    assert _count_queries(engine, lambda s: [df.file.name for df in query_diskfiles(s)]) == 1
+
+
+def test_related_table_profile(engine):
+    # Anything with a header relation can use the profiles
+    assert len(loading_options(Footprint, 'detail')) == 4
+    query = apply_loading_profile(sessionmaker(engine)().query(Footprint), 'summary')
+    assert 'JOIN diskfile' in str(query)
+
+
+def test_bad_profile():
+    with pytest.raises(ValueError):
+        loading_options(Header, 'everything')
+    with pytest.raises(ValueError):
+        loading_options(File, 'summary')
+    assert loading_options(File, 'lazy') == []
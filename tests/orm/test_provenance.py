@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.provenance import Provenance, ProvenanceHistory, bulk_ingest_provenance, \
+    parse_provenance_timestamp
+
+
+class _FakeAD:
+    def __init__(self, provenance, history):
+        self.PROVENANCE = provenance
+        self.PROVENANCE_HISTORY = history
+
+
+def test_parse_provenance_timestamp():
+    assert parse_provenance_timestamp('2020-01-02 03:04:05.123456') == datetime(2020, 1, 2, 3, 4, 5, 123456)
+    assert parse_provenance_timestamp('2020-01-02T03:04:05.12') == datetime(2020, 1, 2, 3, 4, 5, 120000)
+
+
+def test_bulk_ingest_provenance():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    try:
+        diskfiles = list()
+        for i in range(1, 3):
+            f = File('N20200101S%04d_flat.fits' % i)
+            session.add(f)
+            session.flush()
+            df_id = session.execute(DiskFile.__table__.insert(), dict(file_id=f.id, filename=f.name, path='')) \
+                .inserted_primary_key[0]
+            df = session.query(DiskFile).get(df_id)
+            df.ad_object = _FakeAD(
+                [('2020-01-02 03:04:%02d.000001' % j, 'N20200101S%04d.fits' % j, 'abc%d' % j, 'prepare')
+                 for j in range(10)],
+                [('2020-01-02T03:04:05.000000', '2020-01-02T03:04:06.500000', 'prepare', '{}')])
+            diskfiles.append(df)
+
+        assert bulk_ingest_provenance(session, diskfiles) == (20, 2)
+        # a second run finds everything already there
+        assert bulk_ingest_provenance(session, diskfiles) == (0, 0)
+        session.commit()
+
+        assert session.query(Provenance).count() == 20
+        assert session.query(ProvenanceHistory).count() == 2
+        assert len(diskfiles[0].provenance) == 10
+        assert diskfiles[0].provenance_history[0].timestamp_end == datetime(2020, 1, 2, 3, 4, 6, 500000)
+    finally:
+        session.close()
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.provenance import Provenance
+from gemini_obs_db.orm.provenance_graph import build_provenance_edges, resolve_provenance_edges, ancestors, \
+    descendants
+
+
+def _add_file(session, name, inputs=()):
+    f = File(name)
+    session.add(f)
+    session.flush()
+    df_id = session.execute(DiskFile.__table__.insert(),
+                            dict(file_id=f.id, filename=name, path='', canonical=True, data_md5='md5-%s' % name)) \
+        .inserted_primary_key[0]
+    for i, inp in enumerate(inputs):
+        session.execute(Provenance.__table__.insert(),
+                        dict(diskfile_id=df_id, timestamp=datetime(2020, 1, 2, 0, 0, i), filename=inp,
+                             md5='md5-%s' % inp, primitive='stackFrames'))
+    return f.id, session.query(DiskFile).get(df_id)
+
+
+def test_lineage():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    try:
+        raw1, _ = _add_file(session, 'N20200101S0001.fits')
+        raw2, _ = _add_file(session, 'N20200101S0002.fits')
+        flat, df_flat = _add_file(session, 'N20200101S0001_flat.fits', ['N20200101S0001.fits', 'N20200101S0002.fits'])
+        stack, df_stack = _add_file(session, 'N20200101S0003_stack.fits',
+                                    ['N20200101S0001_flat.fits', 'N20200101S0002.fits', 'N20200101S0009.fits'])
+        assert build_provenance_edges(session, [df_flat, df_stack]) == 5
+        # rebuilding replaces the edges
+        assert build_provenance_edges(session, [df_flat, df_stack]) == 5
+
+        assert ancestors(session, stack) == [(raw2, 1), (flat, 1), (raw1, 2)]
+        assert ancestors(session, stack, max_depth=1) == [(raw2, 1), (flat, 1)]
+        assert descendants(session, raw1) == [(flat, 1), (stack, 2)]
+        assert descendants(session, stack) == []
+
+        # the missing input turns up later
+        raw9, _ = _add_file(session, 'N20200101S0009.fits')
+        assert resolve_provenance_edges(session) == 1
+        assert (raw9, 1) in ancestors(session, stack)
+    finally:
+        session.close()
@@ -0,0 +1,71 @@
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.orm.gmos import Gmos
+from gemini_obs_db.utils.export import export_headers, read_watermark
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.dataset
+
+
+def _add_header(session, n, instrument, ut_datetime):
+    f = File('N20200101S%04d.fits' % n)
+    session.add(f)
+    session.flush()
+    df_id = session.execute(DiskFile.__table__.insert(), dict(file_id=f.id, filename=f.name, path='',
+                                                              present=True, canonical=True)).inserted_primary_key[0]
+    h_id = session.execute(Header.__table__.insert(), dict(diskfile_id=df_id, instrument=instrument,
+                                                           ut_datetime=ut_datetime, ra=10.5 + n,
+                                                           dec=-20.25)).inserted_primary_key[0]
+    if instrument.startswith('GMOS'):
+        session.execute(Gmos.__table__.insert(), dict(header_id=h_id, disperser='R400'))
+    return h_id
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_export_headers(session, tmp_path, fmt):
+    _add_header(session, 1, 'GMOS-N', datetime(2020, 1, 1, 5))
+    _add_header(session, 2, 'GMOS-N', datetime(2020, 1, 2, 5))
+    last = _add_header(session, 3, 'TEXES', datetime(2020, 1, 2, 6))
+    session.commit()
+
+    destination = str(tmp_path)
+    assert export_headers(session, destination, fmt=fmt, batch_size=2) == last
+    assert read_watermark(destination) == last
+    assert os.path.isdir(os.path.join(destination, 'instrument=GMOS-N', 'ut_date=2020-01-02'))
+
+    fmt_name = 'ipc' if fmt == 'arrow' else fmt
+    gmos = pyarrow.dataset.dataset(os.path.join(destination, 'instrument=GMOS-N'), format=fmt_name,
+                                   partitioning='hive').to_table()
+    assert gmos.num_rows == 2
+    assert gmos.column('gmos_disperser').to_pylist() == ['R400', 'R400']
+    assert sorted(gmos.column('ra').to_pylist()) == [11.5, 12.5]
+
+    # incremental export only picks up the new header
+    newest = _add_header(session, 4, 'TEXES', datetime(2020, 1, 3, 6))
+    session.commit()
+    assert export_headers(session, destination, fmt=fmt) == newest
+    texes = pyarrow.dataset.dataset(os.path.join(destination, 'instrument=TEXES'), format=fmt_name,
+                                    partitioning='hive').to_table()
+    assert sorted(texes.column('id').to_pylist()) == [last, newest]
+
+    # and with nothing new, the watermark stays put
+    assert export_headers(session, destination, fmt=fmt) == newest
+    assert read_watermark(destination) == newest
@@ -1,11 +1,17 @@
 import os
+import pickle
 import time
+import datetime
 
+import numpy as np
 import pytest
+from astropy.coordinates import Angle
 
 from gemini_obs_db import db_config
 from gemini_obs_db.utils.gemini_metadata_utils import ratodeg, ratodeg_old, dectodeg, dectodeg_old, GeminiProgram, \
-    GeminiDataLabel, GeminiObservation, gemini_date, get_date_offset
+    GeminiDataLabel, GeminiObservation, gemini_date, get_date_offset, parse_program_ids, parse_datalabels, \
+    PROGRAM_ID_FIELDS, DATALABEL_FIELDS, ratodeg_array, dectodeg_array, ut_datetime_secs_array, gemini_semester_array, \
+    gemini_semester, UT_DATETIME_SECS_EPOCH
 
 
 def test_ratodeg():
@@ -141,5 +147,93 @@ def test_get_date_chile_utc(monkeypatch):
     time.tzset()
 
 
+def test_parsers_cached_and_immutable():
+    gp = GeminiProgram(' GN-2020A-Q-123 ')
+    assert gp is GeminiProgram('GN-2020A-Q-123')
+    with pytest.raises(AttributeError):
+        gp.valid = False
+    obs = GeminiObservation('bogus')
+    assert not obs.valid
+    assert obs.program == ''
+    dl = GeminiDataLabel('GN-2020A-Q-123-45-006')
+    assert dl is GeminiDataLabel('GN-2020A-Q-123-45-006')
+    assert dl.project is GeminiProgram('GN-2020A-Q-123')
+    assert pickle.loads(pickle.dumps(dl)).datalabel_noextension == 'GN-2020A-Q-123-45-006'
+    with pytest.deprecated_call():
+        dl.parse()
+    assert dl.dlnum == '006'
+
+
+def test_batch_parsers_match_classes():
+    program_ids = ['GN-2020A-Q-123', 'GN-2020A-DS-0123', 'G-2020A-Q-123', 'GN-CAL20200123', 'GS-2022A-ENG-51',
+                   'made up', None, 'GN-2020A-Q-123']
+    parsed = parse_program_ids(program_ids)
+    assert parsed.shape == (8, )
+    for pid, row in zip(program_ids, parsed):
+        if pid is None:
+            continue
+        gp = GeminiProgram(pid)
+        for field in PROGRAM_ID_FIELDS:
+            assert row[field] == (getattr(gp, field) or False), (pid, field)
+
+    datalabels = np.array(['GN-2020A-Q-123-45-006', 'GN-CAL20220502-5-001', 'GN-2020A-Q-123-45-006-BIAS', 'junk'])
+    parsed = parse_datalabels(datalabels)
+    for dl, row in zip(datalabels, parsed):
+        gdl = GeminiDataLabel(dl)
+        for field in DATALABEL_FIELDS:
+            assert row[field] == (getattr(gdl, field) or type(row[field])()), (dl, field)
+    assert list(parsed['is_cal']) == [False, True, False, False]
+
+
+def test_sexagesimal_array_parsers():
+    ras = ['03:48:30.113', ' 12:00:00 ', '23:59:59.99999', '00:00:00.', '123.456', 45.0, None, 'junk', '1:02:03']
+    decs = ['+24:20:43.00', '-00:30:00', '89:59:59.9', '-45.5', None, 'junk', '+95:00:00']
+    assert np.array_equal(ratodeg_array(ras), [np.nan if ratodeg(r) is None else ratodeg(r) for r in ras],
+                          equal_nan=True)
+    assert np.array_equal(dectodeg_array(decs), [np.nan if dectodeg(d) is None else dectodeg(d) for d in decs],
+                          equal_nan=True)
+    assert dectodeg('-00:30:00') == -0.5
+    assert ratodeg('12:00:00') == 180.0
+    # the fraction of a second has to start with a point
+    assert ratodeg('12:34:567') is None
+    # but the deprecated parser still takes it, as it always has
+    assert ratodeg_old('12:34:567') is not None
+
+
+def _angle_ra(string):
+    try:
+        return Angle("%s hours" % string).degree
+    except Exception:
+        return None
+
+
+def test_ra_out_of_range():
+    # hours of 24 and over are handled as astropy does, so 29:59:59 is rejected
+    ras = ['29:59:59', '24:00:00', '24:30:00.5', '25:00:00', '23:59:59.999']
+    expected = [_angle_ra(r) for r in ras]
+    assert expected[0] is None
+    assert [ratodeg(r) for r in ras] == expected
+    assert np.array_equal(ratodeg_array(ras), [np.nan if e is None else e for e in expected], equal_nan=True)
+
+
+def test_gemini_date_fast_paths():
+    assert gemini_date('20200415') == '20200415'
+    assert gemini_date('2019-12-10T11:22:33.25', as_datetime=True) == datetime.datetime(2019, 12, 10, 11, 22, 33,
+                                                                                        250000)
+    assert gemini_date('20191210T112233') == '2019-12-10T11:22:33'
+    assert gemini_date('20201301') == ''
+    # relative terms are not cached
+    assert gemini_date('yesterday', as_datetime=True) == \
+        gemini_date('today', as_datetime=True) - datetime.timedelta(days=1)
+
+
+def test_datetime_arrays():
+    dts = [datetime.datetime(2020, 1, 5, 3, 4, 5, 500000), datetime.datetime(1999, 12, 31, 23, 59, 59, 500000), None,
+           datetime.datetime(2021, 7, 31)]
+    secs = ut_datetime_secs_array(dts).tolist()
+    assert secs == [int((d - UT_DATETIME_SECS_EPOCH).total_seconds()) if d else None for d in dts]
+    assert list(gemini_semester_array(dts)) == [gemini_semester(d) if d else '' for d in dts]
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,55 @@
+from sqlalchemy import create_engine, inspect
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.utils.indexes import CURATED_INDEXES, RETIRED_INDEXES, build_indexes, index_changes, \
+    migrate_indexes, without_secondary_indexes
+
+
+def _indexes(engine):
+    inspector = inspect(engine)
+    return set(i['name'] for t in ('header', 'diskfile') for i in inspector.get_indexes(t))
+
+
+def test_migrate_indexes():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    curated = _indexes(engine)
+    assert set(CURATED_INDEXES) <= curated
+    assert not curated & set(RETIRED_INDEXES)
+    assert index_changes(engine) == ([], [])
+
+    # Back to the old indexes, as in a database from before the change
+    statements = migrate_indexes(engine, reverse=True, dry_run=True)
+    assert len(statements) == len(RETIRED_INDEXES) + len(CURATED_INDEXES)
+    assert _indexes(engine) == curated
+    assert migrate_indexes(engine, reverse=True) == statements
+    old = _indexes(engine)
+    assert set(RETIRED_INDEXES) <= old
+    assert not old & set(CURATED_INDEXES)
+
+    # and forward again, creating before dropping
+    statements = migrate_indexes(engine)
+    assert statements[0].startswith('CREATE INDEX')
+    assert statements[-1].startswith('DROP INDEX')
+    assert _indexes(engine) == curated
+    assert migrate_indexes(engine) == []
+
+
+def test_build_indexes():
+    engine = create_engine('sqlite://')
+    without_secondary_indexes(Base.metadata).create_all(bind=engine)
+    deferred = _indexes(engine)
+    assert not deferred & set(CURATED_INDEXES)
+    assert 'ix_header_data_label' not in deferred
+    # Unique indexes are kept, so the load is still checked
+    assert 'ix_file_name' in set(i['name'] for i in inspect(engine).get_indexes('file'))
+
+    statements = build_indexes(engine, jobs=4, dry_run=True)
+    assert all(s.startswith('CREATE INDEX') for s in statements)
+    assert _indexes(engine) == deferred
+    assert build_indexes(engine, jobs=4) == statements
+
+    full = create_engine('sqlite://')
+    Base.metadata.create_all(bind=full)
+    assert _indexes(engine) == _indexes(full)
+    assert build_indexes(engine) == []
@@ -0,0 +1,133 @@
+import logging
+import socket
+
+import pytest
+
+from gemini_obs_db.utils import instrumentation
+from gemini_obs_db.utils.instrumentation import Sink, LoggingSink, StatsdSink, PrometheusTextfileSink, add_sink, \
+    clear_sinks, count, enabled, stage, timed, timed_parser
+
+
+class RecordingSink(Sink):
+    def __init__(self):
+        self.timings = list()
+        self.counts = list()
+
+    def timing(self, name, seconds, tags):
+        self.timings.append((name, seconds, tags))
+
+    def count(self, name, value, tags):
+        self.counts.append((name, value, tags))
+
+
+@pytest.fixture
+def sink():
+    clear_sinks()
+    sink = RecordingSink()
+    add_sink(sink)
+    yield sink
+    clear_sinks()
+
+
+def test_disabled():
+    clear_sinks()
+    assert not enabled()
+    # The shared do nothing stage
+    assert stage('test') is stage('other')
+    count('bytes', 100)
+    parser = object()
+    assert timed_parser(parser) is parser
+
+
+def test_stage(sink):
+    assert enabled()
+    with stage('diskfile.md5', instrument='NIRI'):
+        pass
+    with pytest.raises(ValueError):
+        with stage('failing'):
+            raise ValueError()
+    assert [(name, tags) for name, _, tags in sink.timings] == \
+        [('diskfile.md5', {'instrument': 'NIRI'}), ('failing', {'error': 'ValueError'})]
+    assert all(seconds >= 0 for _, seconds, _ in sink.timings)
+
+
+def test_count(sink):
+    count('diskfile.bytes_read', 1024)
+    count('diskfile.bytes_read', 0)
+    assert sink.counts == [('diskfile.bytes_read', 1024, {})]
+
+
+def test_timed(sink):
+    @timed('populate', instrument='niri')
+    def populate(value):
+        return value * 2
+    assert populate(2) == 4
+    assert sink.timings[0][0] == 'populate'
+    assert sink.timings[0][2] == {'instrument': 'niri'}
+
+
+def test_timed_parser(sink):
+    class Parser:
+        name = 'parser'
+
+        def ra(self):
+            return 10.0
+
+        def _private(self):
+            return 1
+    parser = timed_parser(Parser())
+    assert parser.ra() == 10.0
+    assert parser.name == 'parser'
+    assert parser._private() == 1
+    assert sink.timings == [('descriptor', sink.timings[0][1], {'descriptor': 'ra', 'parser': 'Parser'})]
+
+
+def test_logging_sink(caplog):
+    clear_sinks()
+    add_sink(LoggingSink(logging.getLogger('test_instrumentation'), level=logging.INFO))
+    try:
+        with caplog.at_level(logging.INFO, logger='test_instrumentation'):
+            with stage('header.populate_fits'):
+                pass
+            count('diskfile.bytes_read', 10, compressed=True)
+    finally:
+        clear_sinks()
+    assert 'header.populate_fits []' in caplog.text
+    assert 'diskfile.bytes_read [compressed=True]: +10' in caplog.text
+
+
+def test_statsd_sink():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    try:
+        sink = StatsdSink('127.0.0.1', server.getsockname()[1], prefix='test')
+        sink.count('bytes_read', 10, {})
+        assert server.recv(1024) == b'test.bytes_read:10|c'
+        sink.timing('descriptor', 0.0015, {'descriptor': 'ra'})
+        assert server.recv(1024) == b'test.descriptor:1.500|ms|#descriptor:ra'
+    finally:
+        server.close()
+
+
+def test_prometheus_sink(tmp_path):
+    path = str(tmp_path / 'ingest.prom')
+    clear_sinks()
+    sink = PrometheusTextfileSink(path, prefix='test')
+    add_sink(sink)
+    try:
+        sink.timing('diskfile.md5', 0.5, {})
+        sink.timing('diskfile.md5', 0.25, {})
+        sink.timing('descriptor', 0.125, {'descriptor': 'ra'})
+        count('diskfile.bytes_read', 100)
+        instrumentation.flush()
+    finally:
+        clear_sinks()
+    with open(path) as f:
+        text = f.read()
+    assert '# TYPE test_diskfile_md5_seconds summary' in text
+    assert 'test_diskfile_md5_seconds_sum 0.75' in text
+    assert 'test_diskfile_md5_seconds_count 2' in text
+    assert 'test_descriptor_seconds_count{descriptor="ra"} 1' in text
+    assert '# TYPE test_diskfile_bytes_read_total counter' in text
+    assert 'test_diskfile_bytes_read_total 100' in text
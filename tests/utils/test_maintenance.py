@@ -0,0 +1,41 @@
+import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.header import Header
+from gemini_obs_db.utils.maintenance import recompute_derived_columns
+
+
+def test_recompute_derived_columns():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    try:
+        rows = [
+            dict(program_id='GN-2020A-Q-123', ut_datetime=datetime.datetime(2020, 3, 1, 12, 0, 0, 750000)),
+            dict(program_id='GN-2020A-SV-1', ut_datetime=datetime.datetime(2020, 3, 1)),
+            dict(program_id='GN-CAL20200301', ut_datetime=None),
+            dict(program_id='made up', ut_datetime=datetime.datetime(2000, 1, 1, 0, 0, 10)),
+            dict(program_id=None, ut_datetime=datetime.datetime(2000, 1, 1, 0, 0, 10), calibration_program=True),
+        ]
+        for row in rows:
+            session.execute(Header.__table__.insert(), dict(row, diskfile_id=1))
+        session.commit()
+
+        assert recompute_derived_columns(session, batch_size=2) == 5
+        # nothing changes the second time
+        assert recompute_derived_columns(session, batch_size=2) == 0
+
+        result = session.query(Header.ut_datetime_secs, Header.engineering, Header.science_verification,
+                               Header.calibration_program).order_by(Header.id).all()
+        assert result == [
+            (int((rows[0]['ut_datetime'] - datetime.datetime(2000, 1, 1)).total_seconds()), False, False, False),
+            (int((rows[1]['ut_datetime'] - datetime.datetime(2000, 1, 1)).total_seconds()), False, True, False),
+            (None, False, False, True),
+            (10, True, False, False),
+            (10, True, False, True),
+        ]
+    finally:
+        session.close()
@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+import gemini_obs_db.utils.createtables  # noqa: F401, registers all the tables
+from gemini_obs_db.orm import Base
+from gemini_obs_db.utils.partitioning import _periods, date_range_filter, partition_bounds, partition_name, \
+    partitioned_metadata
+
+
+def test_partition_bounds():
+    assert partition_bounds(datetime.datetime(2024, 1, 31, 23), 'semester') == \
+        (datetime.datetime(2023, 8, 1), datetime.datetime(2024, 2, 1), '2023b')
+    assert partition_bounds(datetime.datetime(2024, 2, 1), 'semester') == \
+        (datetime.datetime(2024, 2, 1), datetime.datetime(2024, 8, 1), '2024a')
+    assert partition_bounds(datetime.datetime(2024, 12, 5), 'month') == \
+        (datetime.datetime(2024, 12, 1), datetime.datetime(2025, 1, 1), '2024_12')
+    assert partition_name('diskfile', datetime.datetime(2024, 9, 1), 'semester') == 'diskfile_2024b'
+    with pytest.raises(ValueError):
+        partition_bounds(datetime.datetime(2024, 1, 1), 'year')
+
+
+def test_periods():
+    now = datetime.datetime(2024, 3, 15)
+    assert [p[2] for p in _periods('semester', None, 2, now)] == ['2024a', '2024b', '2025a']
+    assert [p[2] for p in _periods('month', datetime.datetime(2023, 12, 3), 1, now)] == \
+        ['2023_12', '2024_01', '2024_02', '2024_03', '2024_04']
+    assert [p[2] for p in _periods('month', None, 0, now)] == ['2024_03']
+
+
+def test_partitioned_metadata():
+    metadata = partitioned_metadata()
+    dialect = postgresql.dialect()
+    header = str(CreateTable(metadata.tables['header']).compile(dialect=dialect))
+    assert 'PARTITION BY RANGE (ut_datetime)' in header
+    assert 'UNIQUE (id, ut_datetime)' in header
+    assert 'PRIMARY KEY' not in header
+    assert "nextval('header_id_seq'::regclass)" in header
+    assert 'REFERENCES' not in header
+    diskfile = str(CreateTable(metadata.tables['diskfile']).compile(dialect=dialect))
+    assert 'PARTITION BY RANGE (datafile_timestamp)' in diskfile
+    assert 'REFERENCES file (id)' in diskfile
+    # No foreign keys can point at the partitioned tables
+    for table in metadata.tables.values():
+        assert not [fk for fk in table.foreign_keys if fk.column.table.name in ('header', 'diskfile')]
+    assert set(i.name for i in metadata.tables['header'].indexes) == \
+        set(i.name for i in Base.metadata.tables['header'].indexes)
+    # The ORM tables are untouched
+    assert Base.metadata.tables['header'].primary_key.columns.keys() == ['id']
+    assert Base.metadata.tables['header'].foreign_keys
+
+
+def test_date_range_filter():
+    start = datetime.datetime(2024, 3, 1)
+    compiled = date_range_filter(start, start + datetime.timedelta(days=2)).compile(dialect=postgresql.dialect())
+    # Plain comparisons on the partition keys, which the planner can prune on
+    assert str(compiled) == 'header.ut_datetime >= %(ut_datetime_1)s AND header.ut_datetime < %(ut_datetime_2)s ' \
+        'AND diskfile.datafile_timestamp >= %(datafile_timestamp_1)s ' \
+        'AND diskfile.datafile_timestamp < %(datafile_timestamp_2)s'
+    assert compiled.params == dict(ut_datetime_1=start, ut_datetime_2=datetime.datetime(2024, 3, 3),
+                                   datafile_timestamp_1=datetime.datetime(2024, 2, 29),
+                                   datafile_timestamp_2=datetime.datetime(2024, 3, 4))
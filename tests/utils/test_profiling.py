@@ -0,0 +1,83 @@
+import pytest
+
+from gemini_obs_db.utils.file_parser import FileParser
+from gemini_obs_db.utils.profiling import LatencyHistogram, DescriptorProfiler, enable_descriptor_profiling, \
+    disable_descriptor_profiling, descriptor_profiler
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.mean is None
+    values = [i * 1e-4 for i in range(1, 1001)]
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == 1000
+    assert histogram.total == pytest.approx(sum(values))
+    assert histogram.min == values[0]
+    assert histogram.max == values[-1]
+    for q in (50, 95, 99):
+        assert histogram.percentile(q) == pytest.approx(q * 1e-3, rel=0.06)
+    assert histogram.percentile(100) == pytest.approx(0.1)
+    # Bounded, however many values go in
+    assert len(histogram.buckets) == 161
+    histogram.record(1000.0)
+    histogram.record(0.0)
+    assert len(histogram.buckets) == 161
+    assert histogram.max == 1000.0
+
+
+def test_latency_histogram_merge():
+    a = LatencyHistogram()
+    b = LatencyHistogram()
+    a.record(0.001)
+    b.record(0.01)
+    a.merge(b)
+    assert a.count == 2
+    assert a.min == 0.001
+    assert a.max == 0.01
+    with pytest.raises(ValueError):
+        a.merge(LatencyHistogram(per_decade=10))
+
+
+def test_descriptor_profiler():
+    profiler = DescriptorProfiler()
+    profiler.record('NIRI', 'ra', 0.001, value=10.0)
+    profiler.record('NIRI', 'ra', 0.002, value=None)
+    profiler.record('NIRI', 'ra', 0.003, error=KeyError('RA'))
+    profiler.record('GMOS-N', 'dec', 0.5, value=1.0)
+    rows = profiler.rows()
+    assert [r[:5] for r in rows] == [('GMOS-N', 'dec', 1, 0, 0), ('NIRI', 'ra', 3, 1, 1)]
+    assert rows[1][9] == {'KeyError': 1}
+    report = profiler.report()
+    assert 'KeyError: 1' in report
+    assert report.splitlines()[1].startswith('GMOS-N')
+    profiler.reset()
+    assert profiler.rows() == []
+
+
+def test_try_or_none_profiled():
+    class Parser(FileParser):
+        def ra(self):
+            return self._try_or_none(lambda: 10.0, "pytest")
+
+        def dec(self):
+            return self._try_or_none(lambda: {}['DEC'], "pytest")
+
+    profiler = enable_descriptor_profiling(report_at_exit=False)
+    try:
+        assert descriptor_profiler() is profiler
+        parser = Parser()
+        assert parser.ra() == 10.0
+        assert parser.dec() is None
+        assert parser.dec() is None
+        stats = profiler.stats
+        assert stats[('Parser', 'ra')].calls == 1
+        assert stats[('Parser', 'dec')].calls == 2
+        assert stats[('Parser', 'dec')].failures == {'KeyError': 2}
+        # Exceptions that are not data errors still propagate
+        with pytest.raises(RuntimeError):
+            parser._try_or_none(lambda: (_ for _ in ()).throw(RuntimeError()), "pytest")
+    finally:
+        disable_descriptor_profiling()
+    assert descriptor_profiler() is None
@@ -0,0 +1,130 @@
+import logging
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.db.query_stats import _START_KEY, QueryStats, normalize_statement
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.preview import Preview
+
+
+def test_normalize_statement():
+    assert normalize_statement("SELECT * FROM file WHERE name = 'N20200101S0001.fits' AND id = 12") == \
+        "SELECT * FROM file WHERE name = ? AND id = ?"
+    assert normalize_statement("SELECT preview.id \n  FROM preview WHERE ? = preview.diskfile_id") == \
+        "SELECT preview.id FROM preview WHERE ? = preview.diskfile_id"
+    assert normalize_statement("SELECT a FROM t WHERE t.id IN (%(id_1)s, %(id_2)s, %(id_3)s)") == \
+        "SELECT a FROM t WHERE t.id IN (?...)"
+    assert normalize_statement("SELECT a::integer FROM t1 WHERE b = $1 LIMIT 10") == \
+        "SELECT a::integer FROM t1 WHERE b = ? LIMIT ?"
+
+
+def _database(count):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    for i in range(count):
+        name = 'N20200101S%04d.fits' % i
+        file_id = session.execute(File.__table__.insert(), dict(name=name)).inserted_primary_key[0]
+        df_id = session.execute(DiskFile.__table__.insert(), dict(file_id=file_id, filename=name, path='',
+                                                                  canonical=True, present=True)) \
+            .inserted_primary_key[0]
+        session.execute(Preview.__table__.insert(), dict(diskfile_id=df_id, filename=name + '.jpg'))
+    session.commit()
+    session.close()
+    return engine
+
+
+def test_query_stats():
+    engine = _database(20)
+    stats = QueryStats(n_plus_one_threshold=10)
+    stats.attach(engine)
+    # attaching twice does not count twice
+    stats.attach(engine)
+    session = sessionmaker(engine)()
+    try:
+        diskfiles = session.query(DiskFile).all()
+        # lazy loading the previews of each diskfile is the classic N+1
+        previews = [df.previews[0].filename for df in diskfiles]
+        assert len(previews) == 20
+    finally:
+        session.close()
+
+    snapshot = stats.snapshot(order_by='count')
+    assert sum(r['count'] for r in snapshot) == 21
+    lazy = snapshot[0]
+    assert lazy['count'] == 20
+    assert 'FROM preview' in lazy['statement']
+    assert lazy['max_repeats'] == 20
+    assert lazy['n_plus_one'] == 1
+    assert lazy['p50'] <= lazy['p95'] <= lazy['p99']
+    assert [r['statement'] for r in stats.n_plus_one()] == [lazy['statement']]
+    assert 'FROM preview' in stats.report()
+
+    # A new checkout starts counting repeats again
+    session = sessionmaker(engine)()
+    try:
+        session.query(DiskFile).first().previews
+    finally:
+        session.close()
+    assert stats.snapshot(order_by='count')[0]['n_plus_one'] == 1
+
+    stats.detach(engine)
+    stats.reset()
+    session = sessionmaker(engine)()
+    try:
+        session.query(DiskFile).all()
+    finally:
+        session.close()
+    assert stats.snapshot() == []
+
+
+def test_query_stats_max_statements():
+    engine = create_engine('sqlite://')
+    stats = QueryStats(max_statements=2)
+    stats.attach(engine)
+    with engine.connect() as conn:
+        conn.execute("SELECT 1")
+        conn.execute("SELECT 1, 2")
+        conn.execute("SELECT 1, 2, 3")
+        conn.execute("SELECT 1, 2, 3, 4")
+    statements = {r['statement']: r['count'] for r in stats.snapshot()}
+    assert statements['<other>'] == 2
+    assert len(statements) == 3
+
+
+def test_query_stats_failed_statements():
+    engine = create_engine('sqlite://')
+    stats = QueryStats()
+    stats.attach(engine)
+    with engine.connect() as conn:
+        for _ in range(5):
+            with pytest.raises(OperationalError):
+                conn.execute("SELECT * FROM no_such_table")
+        assert conn.info.get(_START_KEY) == []
+        conn.execute("SELECT 1")
+    assert [r['statement'] for r in stats.snapshot()] == ['SELECT ?']
+
+
+def test_query_stats_periodic_dump(caplog):
+    engine = create_engine('sqlite://')
+    stats = QueryStats()
+    stats.attach(engine)
+    with engine.connect() as conn:
+        conn.execute("SELECT 1")
+    log = logging.getLogger('test_query_stats')
+    with caplog.at_level(logging.INFO, logger='test_query_stats'):
+        stats.start_periodic_dump(log, interval=0.05)
+        try:
+            for _ in range(100):
+                if 'Query statistics' in caplog.text:
+                    break
+                time.sleep(0.05)
+        finally:
+            stats.stop_periodic_dump()
+    assert 'SELECT ?' in caplog.text
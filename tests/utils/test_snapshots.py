@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.orm.diskfile import DiskFile
+from gemini_obs_db.utils.snapshots import snapshot_type, iter_snapshots, query_snapshots, query_arrays
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    for i in range(3):
+        f = File('N20200101S%04d.fits' % i)
+        session.add(f)
+        session.flush()
+        session.execute(DiskFile.__table__.insert(), dict(file_id=f.id, filename=f.name, path='', present=True,
+                                                          canonical=i != 1, file_size=1000 * i,
+                                                          entrytime=datetime(2020, 1, 1, i)))
+    session.commit()
+    session.expunge_all()
+    yield session
+    session.close()
+
+
+def test_snapshot_type():
+    rec = snapshot_type(File)
+    assert rec._fields == ('id', 'name')
+    assert snapshot_type(File) is rec
+    with pytest.raises(ValueError):
+        snapshot_type(File, ['nope'])
+
+
+def test_query_snapshots(session):
+    rows = query_snapshots(session, DiskFile, DiskFile.canonical == True, columns=['id', 'filename'],
+                           order_by=DiskFile.id)
+    assert [r.filename for r in rows] == ['N20200101S0000.fits', 'N20200101S0002.fits']
+    with pytest.raises(AttributeError):
+        rows[0].filename = 'changed'
+    # nothing was loaded into the identity map
+    assert len(session.identity_map) == 0
+
+
+def test_iter_snapshots_join(session):
+    rows = list(iter_snapshots(session, DiskFile, File.name == 'N20200101S0001.fits', joins=[DiskFile.file]))
+    assert len(rows) == 1
+    assert rows[0].canonical is False
+    assert len(session.identity_map) == 0
+
+
+def test_query_arrays(session):
+    arrays = query_arrays(session, DiskFile, columns=['file_size', 'canonical', 'entrytime', 'data_size'],
+                          order_by=DiskFile.id)
+    assert arrays['file_size'].dtype == np.int64
+    assert list(arrays['file_size']) == [0, 1000, 2000]
+    assert arrays['canonical'].dtype == bool
+    assert arrays['entrytime'].dtype == np.dtype('datetime64[us]')
+    assert np.isnan(arrays['data_size']).all()
@@ -0,0 +1,79 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.utils.spatial import ang2pix_nest, pix2ang_nest, healpix_index, cone_pixel_ranges, \
+    box_pixel_ranges, cone_search, box_search, update_healpix, HEALPIX_ORDER
+
+
+def test_ang2pix_nest():
+    # reference values from healpy
+    assert ang2pix_nest(14, 10.0, 20.0) == 1301766333
+    assert ang2pix_nest(14, 359.5, -89.5) == 2952807508
+    assert ang2pix_nest(3, 180.0, 45.0) == 170
+    assert list(ang2pix_nest(14, [10.0, 83.63], [20.0, 22.01])) == [1301766333, 1585026353]
+
+
+def test_pix2ang_nest():
+    ra, dec = pix2ang_nest(3, 100)
+    assert abs(ra - 123.75) < 1e-9
+    assert abs(dec - 35.68533471265204) < 1e-9
+    assert ang2pix_nest(3, ra, dec) == 100
+
+
+def test_healpix_index():
+    assert healpix_index(10.0, 20.0) == 1301766333
+    assert healpix_index(None, 20.0) is None
+    assert healpix_index(10.0, 95.0) is None
+
+
+def _covered(ranges, pix):
+    return any(start <= pix < end for start, end in ranges)
+
+
+def test_cone_pixel_ranges():
+    ranges = cone_pixel_ranges(10.0, 20.0, 0.01)
+    assert _covered(ranges, ang2pix_nest(HEALPIX_ORDER, 10.0, 20.0))
+    assert _covered(ranges, ang2pix_nest(HEALPIX_ORDER, 10.0, 20.0099))
+    assert not _covered(ranges, ang2pix_nest(HEALPIX_ORDER, 10.0, 20.1))
+    # wrapping through RA 0
+    ranges = cone_pixel_ranges(359.99, 0.0, 0.05)
+    assert _covered(ranges, ang2pix_nest(HEALPIX_ORDER, 0.03, 0.0))
+    assert _covered(ranges, ang2pix_nest(HEALPIX_ORDER, 359.95, 0.0))
+
+
+def test_box_pixel_ranges():
+    ranges = box_pixel_ranges(350.0, 10.0, -5.0, 5.0)
+    for ra, dec in [(350.0, -5.0), (0.0, 0.0), (10.0, 5.0), (355.0, 4.9)]:
+        assert _covered(ranges, ang2pix_nest(HEALPIX_ORDER, ra, dec))
+
+
+def test_cone_search():
+    from gemini_obs_db.orm.file import File
+    from gemini_obs_db.orm.diskfile import DiskFile
+    from gemini_obs_db.orm.header import Header
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    try:
+        f = File('N20200101S0001.fits')
+        session.add(f)
+        session.flush()
+        df_id = session.execute(DiskFile.__table__.insert(), dict(file_id=f.id, filename=f.name, path='')) \
+            .inserted_primary_key[0]
+        positions = [(10.0, 20.0), (10.001, 20.001), (10.0, 20.2), (200.0, -30.0), (None, None)]
+        for ra, dec in positions:
+            session.execute(Header.__table__.insert(), dict(diskfile_id=df_id, ra=ra, dec=dec))
+        session.commit()
+        assert update_healpix(session) == 4
+        assert update_healpix(session) == 0
+
+        near = cone_search(session.query(Header), 10.0, 20.0, 5.0 / 3600.0).all()
+        assert sorted((float(h.ra), float(h.dec)) for h in near) == [(10.0, 20.0), (10.001, 20.001)]
+        assert cone_search(session.query(Header), 10.0, 20.0, 0.25).count() == 3
+
+        assert box_search(session.query(Header), 9.0, 11.0, 19.0, 20.1).count() == 2
+        assert box_search(session.query(Header), 190.0, 11.0, -40.0, 30.0).count() == 4
+    finally:
+        session.close()
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gemini_obs_db.orm import Base
+from gemini_obs_db.orm.file import File
+from gemini_obs_db.utils.streaming import iter_batches
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(engine)()
+    for i in range(25):
+        session.add(File('N20200101S%04d.fits' % i))
+    session.commit()
+    session.expunge_all()
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize('server_side', [False, True])
+def test_iter_batches(session, server_side):
+    sizes = list()
+    ids = list()
+    for batch in iter_batches(session, File, batch_size=10, server_side=server_side):
+        sizes.append(len(batch))
+        ids.extend(f.id for f in batch)
+        assert len(session.identity_map) == len(batch)
+    assert sizes == [10, 10, 5]
+    assert ids == sorted(ids)
+    assert len(ids) == 25
+    assert len(session.identity_map) == 0
+
+
+@pytest.mark.parametrize('server_side', [False, True])
+def test_iter_batches_resume(session, server_side):
+    ids = [f.id for batch in iter_batches(session, File, File.name.like('%S001%'), batch_size=4,
+                                          after_id=12, server_side=server_side) for f in batch]
+    names = [session.query(File).get(i).name for i in ids]
+    # ids start at 1, so this resumes at the 13th file
+    assert names == ['N20200101S%04d.fits' % i for i in range(12, 20)]
@@ -0,0 +1,101 @@
+import numpy as np
+from astropy import wcs as pywcs
+from astropy.io import fits
+
+from gemini_obs_db.utils.tan_projection import tan_parameters, tan_footprints
+
+
+# One milliarcsecond in degrees
+MAS = 1.0 / 3600000.0
+
+
+def _header(ra, dec, rot, scale, naxis1, naxis2, use_pc=False):
+    hdr = fits.Header()
+    hdr['NAXIS'] = 2
+    hdr['NAXIS1'] = naxis1
+    hdr['NAXIS2'] = naxis2
+    hdr['CTYPE1'] = 'RA---TAN'
+    hdr['CTYPE2'] = 'DEC--TAN'
+    hdr['CRVAL1'] = ra
+    hdr['CRVAL2'] = dec
+    hdr['CRPIX1'] = naxis1 * 0.3
+    hdr['CRPIX2'] = naxis2 * 0.6
+    c, s = np.cos(rot), np.sin(rot)
+    if use_pc:
+        hdr['CDELT1'] = -scale
+        hdr['CDELT2'] = scale
+        hdr['PC1_1'] = c
+        hdr['PC1_2'] = -s
+        hdr['PC2_1'] = s
+        hdr['PC2_2'] = c
+    else:
+        hdr['CD1_1'] = -scale * c
+        hdr['CD1_2'] = scale * s
+        hdr['CD2_1'] = scale * s
+        hdr['CD2_2'] = scale * c
+    return hdr
+
+
+def _separation(a, b):
+    ra1, dec1, ra2, dec2 = np.radians(a[..., 0]), np.radians(a[..., 1]), np.radians(b[..., 0]), np.radians(b[..., 1])
+    hav = np.sin((dec2 - dec1) / 2) ** 2 + np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(hav)))
+
+
+def test_tan_footprints_match_astropy():
+    rng = np.random.RandomState(42)
+    headers = list()
+    for i in range(200):
+        dec = rng.uniform(-89.0, 89.0) if i % 10 else (89.9 if i % 20 else -89.9)
+        headers.append(_header(rng.uniform(0.0, 360.0), dec, rng.uniform(0, 2 * np.pi),
+                               rng.uniform(1e-5, 1e-3), rng.randint(10, 6000), rng.randint(10, 6000),
+                               use_pc=bool(i % 2)))
+    params = [tan_parameters(h) for h in headers]
+    assert all(p is not None for p in params)
+    fps = tan_footprints([p[0] for p in params], [p[1] for p in params], [p[2] for p in params],
+                         [(h['NAXIS1'], h['NAXIS2']) for h in headers])
+    assert fps.shape == (200, 4, 2)
+    expected = np.array([pywcs.WCS(h).calc_footprint() for h in headers])
+    assert np.max(_separation(fps, expected)) < MAS
+
+
+def test_tan_parameters_rejects():
+    hdr = _header(10.0, 20.0, 0.0, 1e-4, 100, 100)
+    assert tan_parameters(hdr) is not None
+    for key, value in (('CTYPE1', 'RA---TAN-SIP'), ('A_ORDER', 2), ('PV2_1', 0.1), ('LONPOLE', 0.0),
+                       ('CRVAL2', 90.0), ('CD1_1', 0.0)):
+        bad = hdr.copy()
+        bad[key] = value
+        if key == 'CD1_1':
+            bad['CD1_2'] = 0.0
+        assert tan_parameters(bad) is None, key
+
+
+def _fast_footprint(hdr, params):
+    return tan_footprints([params[0]], [params[1]], [params[2]], [(hdr['NAXIS1'], hdr['NAXIS2'])])[0]
+
+
+def test_tan_parameters_rejects_crota():
+    # CDELT only, with the rotation given as CROTA2
+    hdr = _header(150.0, -30.0, 0.0, 1e-4, 2000, 2000, use_pc=True)
+    for key in ('PC1_1', 'PC1_2', 'PC2_1', 'PC2_2'):
+        del hdr[key]
+    plain = tan_parameters(hdr)
+    hdr['CROTA2'] = 30.0
+    assert tan_parameters(hdr) is None
+    expected = pywcs.WCS(hdr).calc_footprint()
+    # Ignoring CROTA2 would be far off what astropy gives
+    assert np.max(_separation(_fast_footprint(hdr, plain), expected)) > 1.0 / 60.0
+
+
+def test_tan_parameters_rejects_cd_and_pc():
+    pc = _header(150.0, -30.0, 0.5, 1e-4, 2000, 2000, use_pc=True)
+    both = pc.copy()
+    cd = _header(150.0, -30.0, 1.0, 1e-4, 2000, 2000)
+    for key in ('CD1_1', 'CD1_2', 'CD2_1', 'CD2_2'):
+        both[key] = cd[key]
+    assert tan_parameters(both) is None
+    # astropy uses the PC matrix, not the CD one
+    expected = pywcs.WCS(both).calc_footprint()
+    assert np.max(_separation(_fast_footprint(pc, tan_parameters(pc)), expected)) < MAS
+    assert np.max(_separation(_fast_footprint(cd, tan_parameters(cd)), expected)) > 1.0 / 60.0
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import Enum
+
+from gemini_obs_db.utils.gemini_metadata_utils import gemini_instrument, gemini_observation_type, \
+    gemini_caltype, obs_types, OBSERVATION_TYPES, INSTRUMENTS
+from gemini_obs_db.utils.vocabulary import Vocabulary, get_vocabulary, vocabularies
+
+
+def test_vocabulary():
+    vocab = Vocabulary('test_vocabulary_colors', ['Red', 'Green', 'Blue'], normalize=str.lower,
+                       aliases={'grn': 'Green'})
+    assert 'Red' in vocab
+    assert 'red' not in vocab
+    assert ['x'] not in vocab
+    assert list(vocab) == ['Red', 'Green', 'Blue']
+    assert len(vocab) == 3
+    assert vocab[1] == 'Green'
+    assert vocab.get('Blue') == 'Blue'
+    assert vocab.get('blue') is None
+    assert vocab.get('blue', 'None') == 'None'
+    assert vocab.normalize('RED') == 'Red'
+    assert vocab.normalize('grn') == 'Green'
+    assert vocab.normalize(None) is None
+    assert vocab.normalize('purple') is None
+    assert [vocab.code(v) for v in vocab] == [0, 1, 2]
+    assert vocab.code('purple') is None
+    assert vocab.from_code(2) == 'Blue'
+    assert vocab.from_code(None) is None
+
+
+def test_vocabulary_registry():
+    assert get_vocabulary('obstype') is OBSERVATION_TYPES
+    assert 'instrument' in vocabularies()
+    with pytest.raises(KeyError):
+        get_vocabulary('no_such_vocabulary')
+    # The same values again are fine, different ones are not
+    Vocabulary('test_vocabulary_registry', ['a', 'b'])
+    Vocabulary('test_vocabulary_registry', ['a', 'b'])
+    with pytest.raises(ValueError):
+        Vocabulary('test_vocabulary_registry', ['a', 'c'])
+
+
+def test_vocabulary_enum():
+    enum = OBSERVATION_TYPES.enum()
+    assert isinstance(enum, Enum)
+    assert enum.name == 'obstype'
+    assert tuple(enum.enums) == obs_types
+    assert Vocabulary('test_vocabulary_enum', ['a']).enum('None').enums == ['None', 'a']
+
+
+def test_vocabulary_interned():
+    # Values built at run time come back as the shared copy
+    value = ''.join(['OBJ', 'ECT'])
+    assert gemini_observation_type(value) is OBSERVATION_TYPES.get('OBJECT')
+    assert gemini_caltype('processed_bias') == 'processed_bias'
+    assert gemini_caltype('PROCESSED_BIAS') is None
+
+
+def test_instrument_vocabulary():
+    assert INSTRUMENTS.normalize('gmos-n') == 'GMOS-N'
+    assert INSTRUMENTS.normalize('Michelle') == 'michelle'
+    assert gemini_instrument('TReCS') == 'TReCS'
+    assert gemini_instrument('HokupaaaA+QUIRC') == 'Hokupaa+QUIRC'
+    assert gemini_instrument('gmos') is None
+    assert gemini_instrument('gmos', gmos=True) == 'GMOS'
+    assert gemini_instrument('visitor', other=True) == 'visitor'
+    assert gemini_instrument(None) is None
+
+
+def test_instrument_table_vocabularies():
+    from gemini_obs_db.orm import gnirs, michelle, nici, nifs, niri
+    for module in (gnirs, michelle, nici, nifs, niri):
+        for name, value in vars(module).items():
+            if name.endswith('_ENUM'):
+                # Every enumerated column comes from a registered vocabulary of the same name
+                assert get_vocabulary(value.name).values == tuple(value.enums), (module.__name__, name)